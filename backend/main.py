@@ -1,28 +1,161 @@
-from fastapi import FastAPI
+import asyncio
+import importlib
+import json
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Callable, Optional
 from pathlib import Path
+from time import perf_counter
 import sys
 
 # Add project root to Python path
 root_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(root_dir))
 
-from src.graphs.graphs import get_response_from_rag
-
 load_dotenv()
 
-app = FastAPI()
+# The RAG graph module (and with it langchain, langgraph, Chroma and the OpenAI clients) is
+# loaded in the background after startup, so liveness checks are served immediately
+rag = None
+startup = {"status": "starting", "error": None, "import_ms": None, "build_ms": None}
+
+def load_rag():
+    """Import the RAG graph module and build its model clients, vector store, chains and graph."""
+    start = perf_counter()
+    module = importlib.import_module("src.graphs.graphs")
+    startup["import_ms"] = round((perf_counter() - start) * 1000, 3)
+    startup["build_ms"] = module.warm_rag_graph()
+    return module
+
+async def warm_up():
+    global rag
+    try:
+        rag = await asyncio.to_thread(load_rag)
+        startup["status"] = "ready"
+        print(f"RAG graph ready (import {startup['import_ms']} ms, build times in ms: {startup['build_ms']})")
+    except Exception as e:
+        startup["status"] = "failed"
+        startup["error"] = str(e)
+        print(f"An error occurred while warming up the RAG graph: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+
+app = FastAPI(lifespan=lifespan)
+
+class AdmissionControl:
+    """
+    Bounds the answer endpoints: at most `max_in_flight` requests run at once and at most `max_queued`
+    wait for a turn. Beyond that, requests are refused right away with 429 instead of piling up, and a
+    request that waits longer than `queue_timeout` gets 503. A batch request takes one slot per question
+    it answers concurrently.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self, slots: int = 1) -> Callable[[], None]:
+        """
+        Take `slots` slots (at most `max_in_flight`), or raise HTTPException 429 (queue full) or 503 (waited too long).
+
+        Returns:
+            Callable[[], None]: Releases the slots; safe to call more than once.
+        """
+        slots = max(1, min(slots, self.max_in_flight))
+        if self.in_flight + slots > self.max_in_flight and self.queued >= self.max_queued:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="Too many requests in progress, retry later", headers={"Retry-After": "1"})
+
+        acquired = 0
+
+        async def take_slots() -> None:
+            nonlocal acquired
+            while acquired < slots:
+                await self.semaphore.acquire()
+                acquired += 1
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(take_slots(), timeout=self.queue_timeout)
+        except BaseException as e:
+            # Give back the slots a batch got before timing out or being cancelled
+            for _ in range(acquired):
+                self.semaphore.release()
+            if not isinstance(e, TimeoutError):
+                raise
+            self.timed_out += 1
+            raise HTTPException(status_code=503, detail="Timed out waiting for a free slot, retry later", headers={"Retry-After": "5"}) from None
+        finally:
+            self.queued -= 1
+        self.in_flight += slots
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= slots
+                for _ in range(slots):
+                    self.semaphore.release()
+
+        return release
+
+    def render_metrics(self) -> str:
+        lines = []
+        for name, value in (("in_flight", self.in_flight), ("queued", self.queued), ("rejected", self.rejected), ("timed_out", self.timed_out)):
+            lines += [f"# TYPE rag_admission_{name} gauge", f"rag_admission_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+admission = AdmissionControl(
+    max_in_flight=int(os.getenv("RAG_MAX_IN_FLIGHT_REQUESTS", 64)),
+    max_queued=int(os.getenv("RAG_MAX_QUEUED_REQUESTS", 128)),
+    queue_timeout=float(os.getenv("RAG_QUEUE_TIMEOUT_SECONDS", 10)),
+)
+
+def overload_response(rag_graph, error: Exception) -> Optional[JSONResponse]:
+    """Map LLM scheduler errors to 503 (too many LLM calls queued) or 504 (a node's deadline passed)."""
+    if isinstance(error, rag_graph.LLMOverloaded):
+        return JSONResponse(status_code=503, content={"error": str(error)}, headers={"Retry-After": "2"})
+    if isinstance(error, rag_graph.DeadlineExceeded):
+        return JSONResponse(status_code=504, content={"error": str(error)})
+    return None
+
+def require_rag():
+    """Return the RAG graph module, or answer 503 while it is still loading."""
+    if rag is None:
+        raise HTTPException(status_code=503, detail=f"Service is not ready ({startup['status']})")
+    return rag
 
 class ChatRequest(BaseModel):
     question: str = Field(..., min_length=1, description="User's question about bugs or feedback")
 
+class BatchChatRequest(BaseModel):
+    questions: list[str] = Field(..., min_length=1, max_length=1000, description="Questions to answer in one run")
+    # Capped at RAG_MAX_IN_FLIGHT_REQUESTS by the endpoint, which charges one admission slot per concurrent run
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Maximum number of graph runs in flight")
+
 class ChatResponse(BaseModel):
     question: str
     answer: str
     success: bool
     error: Optional[str] = None
+    timings_ms: Optional[dict[str, float]] = None
 
 @app.get("/")
 async def root():
@@ -30,20 +163,103 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    # Liveness: the process is up and serving, whether or not the graph is loaded yet
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: the graph, chains and vector store are loaded and requests can be answered
+    status_code = 200 if startup["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content=startup)
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format; the RAG metrics are only available once the graph module is loaded
+    ready = int(startup["status"] == "ready")
+    body = f"# TYPE rag_ready gauge\nrag_ready {ready}\n"
+    body += admission.render_metrics()
+    if rag is not None:
+        body += rag.render_metrics()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return require_rag().get_answer_cache_stats()
+
+@app.get("/classifier/stats")
+async def classifier_stats():
+    return require_rag().get_relevance_classifier_stats()
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    return require_rag().get_single_flight_stats()
+
+@app.get("/reports/stats")
+async def report_query_stats():
+    return require_rag().get_report_query_stats()
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return require_rag().get_llm_stats()
+
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
+    rag_graph = require_rag()
+    release = await admission.acquire()
     try:
-        answer = await get_response_from_rag(request.question)
+        with rag_graph.collect_stage_timings() as timings:
+            answer = await rag_graph.get_response_from_rag(request.question)
         return ChatResponse(
             question=request.question,
             answer=answer,
-            success=True
+            success=True,
+            timings_ms=timings
         )
     except Exception as e:
-        return {"error": str(e)}
+        return overload_response(rag_graph, e) or {"error": str(e)}
+    finally:
+        release()
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    rag_graph = require_rag()
+    release = await admission.acquire()
+
+    async def event_stream():
+        # Server-sent events: one event per node transition or generated token, then a final "done"
+        try:
+            async for event in rag_graph.stream_response_from_rag(request.question):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            release()
+
+    # The background task releases the slot even if the stream is never iterated
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release)
+    )
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchChatRequest):
+    rag_graph = require_rag()
+    max_concurrency = request.max_concurrency or rag_graph.BATCH_MAX_CONCURRENCY
+    # Every question answered concurrently counts against the in-flight limit, like a request of its own
+    max_concurrency = max(1, min(max_concurrency, len(request.questions), admission.max_in_flight))
+
+    release = await admission.acquire(max_concurrency)
+
+    async def result_lines():
+        # JSON lines: one result per question as it completes, then a summary line
+        try:
+            async for event in rag_graph.batch_response_from_rag(request.questions, max_concurrency=max_concurrency):
+                yield json.dumps(event) + "\n"
+        finally:
+            release()
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson", background=BackgroundTask(release))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,79 @@
+"""
+Load test for a running backend: fires concurrent /chat requests and reports throughput
+and latency at each concurrency level, to check that throughput scales with concurrency
+instead of serializing on blocking calls.
+
+Run the backend with ANSWER_CACHE_ENABLED=false, otherwise repeated questions are served
+from the answer cache. Against fake_openai_server.py, high concurrency levels show the
+admission control at work: requests beyond the in-flight and queue limits are refused fast
+with 429 or 503 (counted as "refused") instead of slowing every other request down.
+
+Usage:
+    python benchmarks/chat_load_test.py --url http://localhost:8000/chat --concurrency 1 4 16 --requests 32
+"""
+import argparse
+import asyncio
+import statistics
+from time import perf_counter
+import httpx
+
+QUESTIONS = [
+    "Is there any user feedback on being stuck at 99%?",
+    "Any customer feedback about scrollbar related issues?",
+    "Which bugs affect file uploads?",
+    "What do users say about login problems?",
+]
+
+async def run_level(client: httpx.AsyncClient, url: str, concurrency: int, total: int) -> dict:
+    """Send `total` requests with at most `concurrency` in flight and collect the latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+    refused = 0
+
+    async def one(i: int):
+        nonlocal failures, refused
+        async with semaphore:
+            start = perf_counter()
+            response = await client.post(url, json={"question": QUESTIONS[i % len(QUESTIONS)]})
+            if response.status_code in (429, 503):
+                refused += 1
+                return
+            latencies.append((perf_counter() - start) * 1000)
+            if response.status_code != 200 or not response.json().get("success"):
+                failures += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else (latencies or [0.0]) * 99
+    return {
+        "concurrency": concurrency,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentiles[49],
+        "p95_ms": percentiles[94],
+        "failures": failures,
+        "refused": refused,
+    }
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        results = [await run_level(client, args.url, level, args.requests) for level in args.concurrency]
+
+    baseline = results[0]["throughput_rps"]
+    print(f"{'concurrency':>11} {'req/s':>8} {'scaling':>8} {'p50 ms':>9} {'p95 ms':>9} {'failed':>7} {'refused':>8}")
+    for result in results:
+        print(
+            f"{result['concurrency']:>11} {result['throughput_rps']:>8.2f} {result['throughput_rps'] / baseline:>7.1f}x "
+            f"{result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f} {result['failures']:>7} {result['refused']:>8}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/chat")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
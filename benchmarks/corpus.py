@@ -0,0 +1,106 @@
+"""
+Synthetic bug report and user feedback corpus.
+
+Generates markdown in the shape docling produces for the real reports: one "# Bug #N" or
+"# Feedback #N" section per report, which `split_markdown` turns into one chunk each. The
+output is deterministic for a given seed, so runs are comparable across commits.
+
+Usage:
+    python benchmarks/corpus.py --chunks 100000 --files 20 --output-dir /tmp/corpus
+"""
+import argparse
+import random
+from pathlib import Path
+
+COMPONENTS = [
+    "upload", "download", "login", "sign up", "password reset", "dashboard", "search", "export",
+    "notifications", "settings", "profile", "billing", "scrollbar", "file preview", "sync", "sharing",
+]
+PLATFORMS = ["Windows 11", "macOS 14", "Ubuntu 22.04", "Android 14", "iOS 17", "Chrome", "Firefox", "Safari"]
+SYMPTOMS = [
+    "gets stuck at {pct}%", "crashes with error E{code}", "freezes for {sec} seconds", "shows a blank screen",
+    "returns HTTP {http}", "loses unsaved changes", "is missing on small screens", "logs the user out",
+    "times out after {sec} seconds", "duplicates every entry", "ignores the selected filter",
+]
+SEVERITIES = ["Critical", "High", "Medium", "Low"]
+SENTIMENTS = [
+    "I love the new {component} but it {symptom} sometimes.",
+    "The {component} is frustrating: it {symptom}.",
+    "Please improve the {component}, it {symptom} on {platform}.",
+    "Great app overall. The {component} could be faster.",
+    "Since the last update the {component} {symptom}, which makes it hard to use.",
+]
+
+def _symptom(rng: random.Random) -> str:
+    return rng.choice(SYMPTOMS).format(
+        pct=rng.choice([10, 50, 90, 99]),
+        code=rng.randint(100, 999),
+        sec=rng.choice([5, 10, 30, 60]),
+        http=rng.choice([400, 404, 500, 502, 504]),
+    )
+
+def bug_section(number: int, rng: random.Random) -> str:
+    component = rng.choice(COMPONENTS)
+    platform = rng.choice(PLATFORMS)
+    symptom = _symptom(rng)
+    return (
+        f"# Bug #{number}\n"
+        f"**Title:** {component.capitalize()} {symptom}\n\n"
+        f"**Severity:** {rng.choice(SEVERITIES)}\n\n"
+        f"**Environment:** {platform}, version {rng.randint(1, 4)}.{rng.randint(0, 9)}.{rng.randint(0, 20)}\n\n"
+        f"**Steps to reproduce:** Open the {component}, perform the usual action and wait. The {component} {symptom}.\n\n"
+        f"**Expected:** The {component} completes normally.\n"
+    )
+
+def feedback_section(number: int, rng: random.Random) -> str:
+    component = rng.choice(COMPONENTS)
+    text = rng.choice(SENTIMENTS).format(component=component, symptom=_symptom(rng), platform=rng.choice(PLATFORMS))
+    return (
+        f"# Feedback #{number}\n"
+        f"**User:** user{rng.randint(1, 50_000)}@example.com\n\n"
+        f"**Rating:** {rng.randint(1, 5)}/5\n\n"
+        f"**Comment:** {text}\n"
+    )
+
+def generate_corpus(chunks: int, files: int = 2, seed: int = 7) -> dict[str, str]:
+    """
+    Generate a corpus of bug report and user feedback markdown files.
+
+    Args:
+        chunks (int): Total number of report sections (one chunk each), split evenly over the files.
+        files (int): Number of files. Even-numbered files hold bug reports, odd-numbered ones user feedback.
+        seed (int): Random seed.
+
+    Returns:
+        dict[str, str]: Markdown text by file name.
+    """
+    rng = random.Random(seed)
+    corpus = {}
+    for file_index in range(files):
+        is_bug_file = file_index % 2 == 0
+        count = chunks // files + (1 if file_index < chunks % files else 0)
+        name = f"synthetic_{'bug_report' if is_bug_file else 'user_feedback'}_{file_index:03d}.md"
+        section = bug_section if is_bug_file else feedback_section
+        corpus[name] = "\n".join(section(number, rng) for number in range(1, count + 1))
+    return corpus
+
+def write_corpus(corpus: dict[str, str], output_dir: Path) -> list[Path]:
+    """Write the corpus files and return their paths."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, text in corpus.items():
+        path = output_dir / name
+        path.write_text(text, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10_000)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output-dir", type=Path, required=True)
+    args = parser.parse_args()
+
+    paths = write_corpus(generate_corpus(args.chunks, args.files, args.seed), args.output_dir)
+    print(f"Wrote {args.chunks} report sections to {len(paths)} files in {args.output_dir}")
@@ -0,0 +1,74 @@
+"""
+Offline evaluation of the local keyword relevance classifier.
+
+Reports how many questions the local classifier decides on its own (LLM calls saved) and
+how often those decisions agree with the reference: the LLM classifier by default, or the
+labels in the dataset with --labels-only (no OpenAI access needed).
+
+Usage:
+    python benchmarks/eval_relevance_classifier.py
+    python benchmarks/eval_relevance_classifier.py --labels-only
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir / "src"))
+
+from graphs.relevance import KeywordRelevanceClassifier
+
+def load_questions(path: Path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+async def llm_decisions(questions: list[str]) -> list[str]:
+    """Classify the questions with the LLM relevance checker used by the graph."""
+    from graphs.graphs import is_question_bug_or_user_feedback_related
+
+    relevance_checker = is_question_bug_or_user_feedback_related()
+    scores = await relevance_checker.abatch([{"question": q} for q in questions], config={"max_concurrency": 8})
+    return ['yes' if 'yes' in score.binary_score.lower() else 'no' for score in scores]
+
+def main(args: argparse.Namespace) -> None:
+    examples = load_questions(args.dataset)
+    questions = [example["question"] for example in examples]
+
+    if args.labels_only:
+        reference = [example["label"] for example in examples]
+        reference_name = "labels"
+    else:
+        if not os.getenv("OPENAI_API_KEY"):
+            raise SystemExit("OPENAI_API_KEY is not set; use --labels-only to evaluate against the dataset labels")
+        reference = asyncio.run(llm_decisions(questions))
+        reference_name = "LLM"
+
+    classifier = KeywordRelevanceClassifier(threshold=args.threshold)
+    decided = agreed = 0
+    for question, expected in zip(questions, reference):
+        decision = classifier.classify(question)
+        if decision is None:
+            continue
+        decided += 1
+        if decision == expected:
+            agreed += 1
+        elif args.verbose:
+            print(f"disagree: local={decision} {reference_name}={expected} | {question}")
+
+    total = len(questions)
+    print(f"questions:              {total}")
+    print(f"decided locally:        {decided} ({decided / total:.1%}) -> LLM calls saved")
+    print(f"sent to LLM:            {total - decided}")
+    if decided:
+        print(f"agreement with {reference_name + ':':<8} {agreed}/{decided} ({agreed / decided:.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=Path, default=root_dir / "benchmarks" / "data" / "relevance_questions.jsonl")
+    parser.add_argument("--threshold", type=int, default=2)
+    parser.add_argument("--labels-only", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,171 @@
+"""
+Local fake of the OpenAI chat completions and embeddings API, for load and overload tests of the
+real backend without OpenAI access or cost.
+
+It answers /v1/chat/completions (plain, streamed, tool calls and JSON schema responses, which is
+what `with_structured_output` uses) and /v1/embeddings after a configurable latency. A fraction of
+requests can be made slow, to exercise deadlines and hedged grader calls, and a tokens-per-minute
+limit answers 429 like the real API does.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8089 --latency-ms 300 --slow-fraction 0.05 --slow-ms 5000
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=sk-fake uvicorn backend.main:app
+    python benchmarks/chat_load_test.py --concurrency 1 16 64 256
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from fakes import WORDS, estimate_tokens
+
+app = FastAPI()
+config = argparse.Namespace(
+    latency_ms=300.0, structured_latency_ms=100.0, slow_fraction=0.0, slow_ms=5000.0,
+    output_tokens=120, dimensions=1536, tokens_per_minute=0, seed=7,
+)
+stats = {"chat": 0, "embeddings": 0, "slow": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+rng = random.Random()
+bucket = {"tokens": 0.0, "updated": time.monotonic()}
+
+def _rate_limited(tokens: int) -> bool:
+    """Take `tokens` from the tokens-per-minute budget, or return True if it is exhausted."""
+    if not config.tokens_per_minute:
+        return False
+    now = time.monotonic()
+    bucket["tokens"] = min(config.tokens_per_minute, bucket["tokens"] + (now - bucket["updated"]) * config.tokens_per_minute / 60)
+    bucket["updated"] = now
+    if bucket["tokens"] < tokens:
+        stats["rate_limited"] += 1
+        return True
+    bucket["tokens"] -= tokens
+    return False
+
+def _latency(latency_ms: float) -> float:
+    """The latency of one request: `latency_ms`, or --slow-ms for the --slow-fraction of requests."""
+    if config.slow_fraction and rng.random() < config.slow_fraction:
+        stats["slow"] += 1
+        return config.slow_ms
+    return latency_ms
+
+def _fill(schema: dict) -> dict:
+    """A value for every required property of a JSON schema: "yes" for strings, as the fake chat model does."""
+    values = {}
+    for name in schema.get("required", list(schema.get("properties", {}))):
+        kind = schema.get("properties", {}).get(name, {}).get("type", "string")
+        values[name] = {"string": "yes", "boolean": True, "integer": 1, "number": 1.0, "array": [], "object": {}}.get(kind, "yes")
+    return values
+
+def _answer(prompt: str, max_tokens) -> str:
+    generator = np.random.default_rng(int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "little"))
+    count = min(config.output_tokens, max_tokens or config.output_tokens)
+    return " ".join(WORDS[i] for i in generator.integers(0, len(WORDS), count))
+
+def _rate_limit_response() -> JSONResponse:
+    error = {"error": {"message": "Rate limit reached for tokens per min", "type": "tokens", "code": "rate_limit_exceeded"}}
+    return JSONResponse(status_code=429, content=error, headers={"retry-after": "1"})
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["chat"] += 1
+    prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+    prompt_tokens = estimate_tokens(prompt)
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+    if _rate_limited(prompt_tokens + (max_tokens or config.output_tokens)):
+        return _rate_limit_response()
+
+    message = {"role": "assistant", "content": None}
+    response_format = body.get("response_format") or {}
+    if body.get("tools"):
+        function = body["tools"][0]["function"]
+        arguments = json.dumps(_fill(function.get("parameters", {})))
+        message["tool_calls"] = [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": function["name"], "arguments": arguments}}]
+        completion, latency_ms = arguments, config.structured_latency_ms
+    elif response_format.get("type") == "json_schema":
+        completion = json.dumps(_fill(response_format["json_schema"].get("schema", {})))
+        message["content"] = completion
+        latency_ms = config.structured_latency_ms
+    else:
+        completion = _answer(prompt, max_tokens)
+        message["content"] = completion
+        latency_ms = config.latency_ms
+
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": estimate_tokens(completion), "total_tokens": prompt_tokens + estimate_tokens(completion)}
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+    latency_ms = _latency(latency_ms)
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    if not body.get("stream"):
+        try:
+            await asyncio.sleep(latency_ms / 1000)
+        finally:
+            stats["in_flight"] -= 1
+        choice = {"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}
+        return {**base, "object": "chat.completion", "choices": [choice], "usage": usage}
+
+    async def chunks():
+        try:
+            chunk = {**base, "object": "chat.completion.chunk"}
+            words = completion.split(" ")
+            for index, word in enumerate(words):
+                await asyncio.sleep(latency_ms / 1000 / len(words))
+                content = word if index == 0 else " " + word
+                yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]})}\n\n"
+            yield f"data: {json.dumps({**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({**chunk, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    stats["embeddings"] += 1
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dimensions = body.get("dimensions") or config.dimensions
+    data = []
+    for index, text in enumerate(inputs):
+        # Inputs arrive as strings or as token ID lists; either way identical inputs get identical vectors
+        seed = int.from_bytes(hashlib.sha256(json.dumps(text).encode()).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions)
+        data.append({"object": "embedding", "index": index, "embedding": (vector / np.linalg.norm(vector)).tolist()})
+    await asyncio.sleep(config.structured_latency_ms / 1000)
+    return {"object": "list", "data": data, "model": body.get("model", "fake"), "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)}}
+
+@app.get("/stats")
+async def server_stats():
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Latency of a chat completion")
+    parser.add_argument("--structured-latency-ms", type=float, default=100.0, help="Latency of a tool call or JSON schema completion, and of an embedding call")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Fraction of requests that take --slow-ms instead")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--output-tokens", type=int, default=120, help="Words per chat completion, capped by max_tokens")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--tokens-per-minute", type=int, default=0, help="Answer 429 beyond this many tokens per minute (0 for no limit)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    vars(config).update({key: value for key, value in vars(args).items() if key not in ("host", "port")})
+    rng.seed(args.seed)
+    bucket["tokens"] = float(args.tokens_per_minute)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,162 @@
+"""
+Deterministic stand-ins for ChatOpenAI and OpenAIEmbeddings, for benchmarks that must not call OpenAI.
+
+Install them process-wide through the model factory hooks:
+
+    from fakes import install_fakes
+    install_fakes(llm_latency_ms=300, output_tokens=120, embedding_latency_ms=20)
+
+Every chat model and embedding model built afterwards by `LLMModel`/`EmbeddingModel` is a fake.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from utils.llm import EmbeddingModel, LLMModel
+
+WORDS = (
+    "upload stuck progress bar file size users report error retry network timeout scrollbar missing "
+    "layout screen login password reset session expired crash android ios dashboard slow export csv "
+    "notification delayed search results empty feedback request dark mode improvement workaround fix"
+).split()
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that sleeps for a fixed latency and returns a deterministic answer of a fixed length.
+
+    Streaming yields the answer word by word, spread over `latency_ms`. Structured output
+    (`with_structured_output`) returns the schema with every required field set to `structured_answer`.
+    """
+
+    model_name: str = "fake-chat"
+    latency_ms: float = 300.0
+    structured_latency_ms: float = 150.0
+    output_tokens: int = 120
+    structured_answer: str = "yes"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages: list[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = np.random.default_rng(_seed(prompt))
+        return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), self.output_tokens))
+
+    def _message(self, messages: list[BaseMessage], content: str) -> AIMessage:
+        input_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        usage = {"input_tokens": input_tokens, "output_tokens": self.output_tokens, "total_tokens": input_tokens + self.output_tokens}
+        return AIMessage(content=content, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, self._answer(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, self._answer(messages)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        words = self._answer(messages).split(" ")
+        for index, word in enumerate(words):
+            time.sleep(self.latency_ms / 1000 / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else " " + word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._message(messages, "").usage_metadata))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        words = self._answer(messages).split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.latency_ms / 1000 / len(words))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else " " + word))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._message(messages, "").usage_metadata))
+
+    def with_structured_output(self, schema: type[BaseModel], **kwargs: Any):
+        def fill(_) -> BaseModel:
+            fields = {
+                name: self.structured_answer if field.is_required() else field.default
+                for name, field in schema.model_fields.items()
+            }
+            return schema(**fields)
+
+        async def afill(value) -> BaseModel:
+            await asyncio.sleep(self.structured_latency_ms / 1000)
+            return fill(value)
+
+        def sync_fill(value) -> BaseModel:
+            time.sleep(self.structured_latency_ms / 1000)
+            return fill(value)
+
+        return RunnableLambda(sync_fill, afunc=afill)
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings: each word is hashed into a fixed random direction, so
+    texts sharing words are close, and identical texts always get identical vectors.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_ms: float = 20.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9#%]+", text.lower()):
+            seed = _seed(word)
+            vector[seed % self.dimensions] += 1.0 if (seed >> 32) & 1 else -1.0
+            vector[(seed >> 16) % self.dimensions] += 0.5
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency_ms / 1000)
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+def install_fakes(
+    llm_latency_ms: float = 300.0,
+    structured_latency_ms: float = 150.0,
+    output_tokens: int = 120,
+    embedding_latency_ms: float = 20.0,
+    dimensions: int = 256,
+) -> None:
+    """Build every chat and embedding model in this process as a fake from now on."""
+    LLMModel.set_factory(lambda model_name, max_tokens=None: FakeChatModel(
+        model_name=model_name,
+        latency_ms=llm_latency_ms,
+        structured_latency_ms=structured_latency_ms,
+        output_tokens=min(output_tokens, max_tokens or output_tokens),
+    ))
+    EmbeddingModel.set_factory(lambda model_name: FakeEmbeddings(dimensions=dimensions, latency_ms=embedding_latency_ms))
@@ -0,0 +1,202 @@
+"""
+Flat (memory-mapped NumPy) vector index vs Chroma.
+
+Ingests a synthetic corpus with fake embeddings (see load_suite.py), builds float32 and int8 flat
+indexes from the Chroma collection, and compares for each corpus size:
+
+    latency   p50/p99 of `VectorStore.search_by_vector`, one query at a time and filtered to a
+              source partition, plus the per-query cost of batched `search_by_vectors`.
+    recall    recall@k of Chroma (approximate HNSW) and of the int8 index against exact float32 search.
+              Chunks tied with the k-th exact score count as hits.
+    memory    RSS of a fresh worker process after loading the backend and serving queries, split into
+              private (RssAnon) and file-backed (RssFile) memory. The memory-mapped matrix is file-backed,
+              so it is shared by every worker on the host.
+
+Usage:
+    python benchmarks/flat_index.py --sizes 10000 100000 --dimensions 1536
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+import numpy as np
+
+from load_suite import COLLECTION_NAME, QUESTIONS, git_commit, ingest_corpus, percentiles, root_dir
+from corpus import COMPONENTS, PLATFORMS
+from fakes import FakeEmbeddings, install_fakes
+
+BACKENDS = ["chroma", "flat-float32", "flat-int8"]
+
+def query_embeddings(count: int, dimensions: int, seed: int) -> list[list[float]]:
+    """Embed `count` varied questions built from the benchmark questions and corpus vocabulary."""
+    rng = random.Random(seed)
+    questions = [f"{rng.choice(QUESTIONS)} {rng.choice(COMPONENTS)} {rng.choice(PLATFORMS)}" for _ in range(count)]
+    return FakeEmbeddings(dimensions=dimensions, latency_ms=0).embed_documents(questions)
+
+def open_backend(backend: str, persist_dir: Path, flat_dir: Path | None = None):
+    """
+    Create a VectorStore for a backend name: "chroma", "flat-float32" or "flat-int8". Flat
+    variants read their index from `flat_dir`, so that several can be built from one collection.
+    """
+    from utils.vector import VectorStore
+
+    os.environ["CHROMA_PERSIST_DIR"] = str(persist_dir)
+    os.environ["CHROMA_COLLECTION_NAME"] = COLLECTION_NAME
+    os.environ["RETRIEVAL_BACKEND"] = backend.split("-")[0]
+    vector_store = VectorStore()
+    if flat_dir is not None:
+        vector_store.persist_dir = flat_dir
+        vector_store.flat_index_path = flat_dir / "flat_index.json"
+    return vector_store
+
+def memory_status() -> dict[str, int]:
+    """Resident memory of this process in kB, from /proc/self/status (Linux only)."""
+    status = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "RssAnon", "RssFile", "RssShmem"):
+                    status[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return status
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Child process: load one backend, serve queries and report its memory as JSON on stdout."""
+    vector_store = open_backend(args.worker, args.persist_dir, args.flat_dir)
+    for embedding in query_embeddings(args.queries, args.dimensions, args.seed):
+        vector_store.search_by_vector(embedding, k=args.k)
+    print(json.dumps(memory_status()))
+
+def measure_worker_memory(backend: str, persist_dir: Path, flat_dir: Path | None, args: argparse.Namespace) -> dict:
+    command = [
+        sys.executable, __file__, "--worker", backend, "--persist-dir", str(persist_dir),
+        "--dimensions", str(args.dimensions), "--queries", str(args.queries), "--k", str(args.k), "--seed", str(args.seed),
+    ]
+    if flat_dir is not None:
+        command += ["--flat-dir", str(flat_dir)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=root_dir)
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        return {}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def file_size_mb(persist_dir: Path, pattern: str) -> float:
+    return round(sum(path.stat().st_size for path in persist_dir.glob(pattern)) / 1e6, 2)
+
+def run_size(size: int, work_dir: Path, args: argparse.Namespace) -> dict:
+    from utils.flat_index import FlatIndex
+
+    # Ingest for Chroma only; the flat variants are built from the collection below
+    os.environ["RETRIEVAL_BACKEND"] = "chroma"
+    persist_dir, _ = ingest_corpus(size, work_dir, args)
+    results = {"build": {}, "latency": {}, "batched": {}, "recall": {}, "memory": {}}
+
+    flat_dirs = {backend: work_dir / f"{backend}_{size}" for backend in BACKENDS if backend != "chroma"}
+    stores = {}
+    for backend in BACKENDS:
+        flat_dir = flat_dirs.get(backend)
+        vector_store = open_backend(backend, persist_dir, flat_dir)
+        if flat_dir is not None:
+            start = perf_counter()
+            FlatIndex.build_from_collection(flat_dir, vector_store.vector_store._collection, dtype=backend.split("-")[-1])
+            results["build"][backend] = {
+                "seconds": round(perf_counter() - start, 3),
+                "matrix_mb": file_size_mb(flat_dir, "flat_index.*.vectors.npy"),
+                "rows_mb": file_size_mb(flat_dir, "flat_index.*.rows.bin"),
+            }
+        stores[backend] = vector_store
+
+    embeddings = query_embeddings(args.queries, args.dimensions, args.seed)
+    # Exact top k, extended with every chunk tied with the k-th score (the synthetic corpus has duplicate texts)
+    exact_index = stores["flat-float32"].get_flat_index()
+    ground_truth = []
+    for scores in exact_index.scores(embeddings):
+        kth_score = np.partition(scores, -args.k)[-args.k]
+        ground_truth.append(set(exact_index.ids(np.flatnonzero(scores >= kth_score - 1e-6))))
+
+    for backend, vector_store in stores.items():
+        vector_store.search_by_vector(embeddings[0], k=args.k)  # warm up
+
+        latencies, filtered = [], []
+        hits = 0
+        for embedding, expected in zip(embeddings, ground_truth):
+            start = perf_counter()
+            documents = vector_store.search_by_vector(embedding, k=args.k)
+            latencies.append((perf_counter() - start) * 1000)
+            hits += len({doc.id for doc in documents} & expected)
+
+            start = perf_counter()
+            vector_store.search_by_vector(embedding, k=args.k, where={"source_type": "bug"})
+            filtered.append((perf_counter() - start) * 1000)
+
+        start = perf_counter()
+        for offset in range(0, len(embeddings), args.batch_queries):
+            vector_store.search_by_vectors(embeddings[offset:offset + args.batch_queries], k=args.k)
+        batched_ms = (perf_counter() - start) * 1000 / len(embeddings)
+
+        results["latency"][backend] = {"unfiltered": percentiles(latencies), "source_filtered": percentiles(filtered)}
+        results["batched"][backend] = {"batch_size": args.batch_queries, "ms_per_query": round(batched_ms, 3)}
+        results["recall"][backend] = round(hits / (len(embeddings) * args.k), 4)
+
+        print(
+            f"{size:>7} chunks {backend:<13} p50 {results['latency'][backend]['unfiltered']['p50']:>8.3f} ms  "
+            f"p99 {results['latency'][backend]['unfiltered']['p99']:>8.3f} ms  "
+            f"batched {batched_ms:>7.3f} ms/query  recall@{args.k} {results['recall'][backend]:.4f}"
+        )
+
+    for backend in BACKENDS:
+        results["memory"][backend] = measure_worker_memory(backend, persist_dir, flat_dirs.get(backend), args)
+        memory = results["memory"][backend]
+        print(
+            f"{size:>7} chunks {backend:<13} worker RSS {memory.get('VmRSS', 0) / 1024:>8.1f} MB  "
+            f"private {memory.get('RssAnon', 0) / 1024:>8.1f} MB  file-backed {memory.get('RssFile', 0) / 1024:>8.1f} MB"
+        )
+    return results
+
+def main(args: argparse.Namespace) -> None:
+    install_fakes(embedding_latency_ms=0, dimensions=args.dimensions)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "worker", "persist_dir", "flat_dir")},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="rag-flat-index-") as work_dir:
+        for size in args.sizes:
+            report["results"][str(size)] = run_size(size, Path(work_dir), args)
+
+    output = Path(args.output or root_dir / "benchmarks" / "results" / f"{report['timestamp'].replace(':', '')}-{report['commit']}-flat-index.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000], help="Corpus sizes in chunks (up to 100000)")
+    parser.add_argument("--files", type=int, default=2, help="Files per corpus")
+    parser.add_argument("--dimensions", type=int, default=256, help="Fake embedding dimensions (1536 matches text-embedding-3-small)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per measurement")
+    parser.add_argument("--batch-queries", type=int, default=32, help="Queries per batched search")
+    parser.add_argument("--k", type=int, default=3, help="Chunks per query")
+    parser.add_argument("--batch-size", type=int, default=512, help="Chunks per embedding batch during ingestion")
+    parser.add_argument("--embedding-ms", type=float, default=0.0, help="Fake embedding call latency during ingestion")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="JSON results file. Defaults to benchmarks/results/<timestamp>-<commit>-flat-index.json")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--persist-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--flat-dir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        install_fakes(embedding_latency_ms=0, dimensions=args.dimensions)
+        run_worker(args)
+    else:
+        main(args)
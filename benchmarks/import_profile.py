@@ -0,0 +1,62 @@
+"""
+Import-time profiling report.
+
+Imports each module in a fresh interpreter with `python -X importtime` and reports the total
+import time and the slowest imports by cumulative time. The backend module should import in
+a fraction of the time of the RAG graph module, which it only loads after startup.
+
+Usage:
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --module backend.main --module src.graphs.graphs --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+root_dir = Path(__file__).resolve().parent.parent
+
+def profile_import(module: str) -> list[tuple[int, int, str]]:
+    """
+    Import a module in a subprocess and parse the -X importtime output.
+
+    Returns:
+        list[tuple[int, int, str]]: (self us, cumulative us, module name) for every import.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(root_dir), str(root_dir / "src")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def main(args: argparse.Namespace) -> None:
+    for module in args.module:
+        rows = profile_import(module)
+        # Top-level imports are the ones without indentation; their cumulative times add up to the total
+        total_us = sum(cumulative for _, cumulative, name in rows if not name.startswith("  "))
+        print(f"\n{module}: {total_us / 1000:.0f} ms total, {len(rows)} modules imported")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for self_us, cumulative_us, name in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+            print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name.strip()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to profile (repeatable)")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    args.module = args.module or ["backend.main", "src.graphs.graphs"]
+    main(args)
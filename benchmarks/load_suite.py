@@ -0,0 +1,227 @@
+"""
+Offline benchmark and load-test suite.
+
+Runs with deterministic fake chat and embedding models (see fakes.py) against a synthetic
+corpus (see corpus.py), so it needs no OpenAI access and results are comparable across commits.
+
+Scenarios:
+    ingest     Ingestion throughput (chunking, embedding batches, Chroma upserts, BM25 index) per corpus size.
+    retrieval  Retrieval latency per corpus size and retrieval mode (vector, hybrid, lexical).
+    chat       End-to-end /chat latency (p50/p99) and throughput of the in-process backend under N concurrent clients.
+
+Results are written as JSON, tagged with the current git commit.
+
+Usage:
+    python benchmarks/load_suite.py --sizes 1000 10000 100000 --concurrency 1 8 32
+    python benchmarks/load_suite.py --scenario retrieval --sizes 10000 --output /tmp/retrieval.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir / "src"))
+sys.path.insert(0, str(root_dir))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+# Every request should run the full graph, and fake vectors should not be cached on disk
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+from corpus import generate_corpus, write_corpus
+from fakes import FakeEmbeddings, install_fakes
+
+COLLECTION_NAME = "benchmark_reports"
+QUESTIONS = [
+    "Is there any user feedback on being stuck at 99%?",
+    "Which bugs make the upload crash?",
+    "What do users say about the scrollbar on small screens?",
+    "Any critical bugs on Android 14?",
+    "Bug #42 login error",
+    "Does the export time out after 30 seconds?",
+    "What feedback is there about notifications?",
+    "dashboard returns HTTP 502",
+]
+
+def percentiles(latencies_ms: list[float]) -> dict[str, float]:
+    """Summarize latencies in milliseconds."""
+    if len(latencies_ms) < 2:
+        value = latencies_ms[0] if latencies_ms else 0.0
+        return {"p50": value, "p99": value, "mean": value}
+    cuts = statistics.quantiles(latencies_ms, n=100)
+    return {"p50": round(cuts[49], 3), "p99": round(cuts[98], 3), "mean": round(statistics.fmean(latencies_ms), 3)}
+
+def ingest_corpus(size: int, work_dir: Path, args: argparse.Namespace) -> tuple[Path, dict]:
+    """Generate a corpus of `size` chunks and ingest it into a fresh Chroma directory."""
+    from utils.ingest_pipeline import IngestionPipeline
+
+    corpus_dir = work_dir / f"corpus_{size}"
+    persist_dir = work_dir / f"chroma_{size}"
+    paths = write_corpus(generate_corpus(size, files=args.files, seed=args.seed), corpus_dir)
+
+    pipeline = IngestionPipeline(
+        collection_name=COLLECTION_NAME,
+        embedding_model=FakeEmbeddings(dimensions=args.dimensions, latency_ms=args.embedding_ms),
+        persist_dir=str(persist_dir),
+        workers=1,
+        batch_size=args.batch_size,
+    )
+    stats = pipeline.run(paths)
+    return persist_dir, stats
+
+def run_ingest(args: argparse.Namespace, work_dir: Path, persist_dirs: dict[int, Path]) -> dict:
+    results = {}
+    for size in args.sizes:
+        persist_dir, stats = ingest_corpus(size, work_dir, args)
+        persist_dirs[size] = persist_dir
+        results[str(size)] = {
+            "elapsed_seconds": stats["elapsed_seconds"],
+            "chunks": stats["chunks"],
+            "chunks_per_second": stats["chunks_per_second"],
+            "embedding_batches": stats["embedding_batches"],
+        }
+        print(f"ingest {size:>7} chunks: {stats['elapsed_seconds']:.2f}s, {stats['chunks_per_second']:.0f} chunks/s")
+    return results
+
+def run_retrieval(args: argparse.Namespace, work_dir: Path, persist_dirs: dict[int, Path]) -> dict:
+    from utils.vector import VectorStore
+
+    rng = random.Random(args.seed)
+    results = {}
+    for size in args.sizes:
+        if size not in persist_dirs:
+            persist_dirs[size], _ = ingest_corpus(size, work_dir, args)
+        results[str(size)] = {}
+        for mode in args.modes:
+            os.environ["CHROMA_PERSIST_DIR"] = str(persist_dirs[size])
+            os.environ["CHROMA_COLLECTION_NAME"] = COLLECTION_NAME
+            os.environ["RETRIEVAL_MODE"] = mode
+            vector_store = VectorStore()
+            vector_store.search(QUESTIONS[0])  # load the BM25 index and warm up Chroma
+
+            latencies = []
+            for _ in range(args.queries):
+                question = rng.choice(QUESTIONS)
+                start = perf_counter()
+                vector_store.search(question)
+                latencies.append((perf_counter() - start) * 1000)
+            results[str(size)][mode] = percentiles(latencies)
+            stats = results[str(size)][mode]
+            print(f"retrieval {size:>7} chunks {mode:<8} p50 {stats['p50']:>8.2f} ms  p99 {stats['p99']:>8.2f} ms")
+    return results
+
+async def run_chat_level(client, concurrency: int, total: int, rng: random.Random) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def one_request():
+        nonlocal failures
+        async with semaphore:
+            start = perf_counter()
+            response = await client.post("/chat", json={"question": rng.choice(QUESTIONS)})
+            latencies.append((perf_counter() - start) * 1000)
+            if response.status_code != 200 or not response.json().get("success"):
+                failures += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(total)))
+    elapsed = perf_counter() - start
+    return {
+        **percentiles(latencies),
+        "requests": total,
+        "failures": failures,
+        "requests_per_second": round(total / elapsed, 2),
+    }
+
+def run_chat(args: argparse.Namespace, work_dir: Path, persist_dirs: dict[int, Path]) -> dict:
+    import httpx
+
+    size = min(args.sizes)
+    if size not in persist_dirs:
+        persist_dirs[size], _ = ingest_corpus(size, work_dir, args)
+    os.environ["CHROMA_PERSIST_DIR"] = str(persist_dirs[size])
+    os.environ["CHROMA_COLLECTION_NAME"] = COLLECTION_NAME
+    os.environ["RETRIEVAL_MODE"] = args.chat_retrieval_mode
+
+    import backend.main as backend
+    backend.rag = backend.load_rag()
+    backend.startup["status"] = "ready"
+
+    async def run_levels() -> dict:
+        rng = random.Random(args.seed)
+        results = {}
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            for concurrency in args.concurrency:
+                results[str(concurrency)] = await run_chat_level(client, concurrency, max(args.requests, concurrency), rng)
+                stats = results[str(concurrency)]
+                print(
+                    f"chat concurrency {concurrency:>3}: p50 {stats['p50']:>8.1f} ms  p99 {stats['p99']:>8.1f} ms  "
+                    f"{stats['requests_per_second']:>7.2f} req/s  {stats['failures']} failures"
+                )
+        return results
+
+    return {"corpus_chunks": size, "retrieval_mode": args.chat_retrieval_mode, "levels": asyncio.run(run_levels())}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "unknown"
+
+def main(args: argparse.Namespace) -> None:
+    install_fakes(
+        llm_latency_ms=args.llm_ms,
+        structured_latency_ms=args.structured_ms,
+        output_tokens=args.output_tokens,
+        embedding_latency_ms=args.embedding_ms,
+        dimensions=args.dimensions,
+    )
+    scenarios = {"ingest": run_ingest, "retrieval": run_retrieval, "chat": run_chat}
+    selected = list(scenarios) if args.scenario == "all" else [args.scenario]
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": {},
+    }
+    persist_dirs: dict[int, Path] = {}
+    with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as work_dir:
+        for name in selected:
+            report["results"][name] = scenarios[name](args, Path(work_dir), persist_dirs)
+
+    output = args.output or root_dir / "benchmarks" / "results" / f"{report['timestamp'].replace(':', '')}-{report['commit']}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["all", "ingest", "retrieval", "chat"], default="all")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000], help="Corpus sizes in chunks (up to 100000)")
+    parser.add_argument("--files", type=int, default=2, help="Files per corpus")
+    parser.add_argument("--modes", nargs="+", default=["vector", "hybrid", "lexical"], help="Retrieval modes to compare")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per retrieval measurement")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent /chat clients")
+    parser.add_argument("--requests", type=int, default=64, help="/chat requests per concurrency level")
+    parser.add_argument("--chat-retrieval-mode", default="vector")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="Fake chat completion latency")
+    parser.add_argument("--structured-ms", type=float, default=150.0, help="Fake structured output (classifier, grader) latency")
+    parser.add_argument("--output-tokens", type=int, default=120, help="Tokens per fake completion")
+    parser.add_argument("--embedding-ms", type=float, default=20.0, help="Fake embedding call latency")
+    parser.add_argument("--dimensions", type=int, default=256, help="Fake embedding dimensions")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch during ingestion")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="JSON results file. Defaults to benchmarks/results/<timestamp>-<commit>.json")
+    main(parser.parse_args())
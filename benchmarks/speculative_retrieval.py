@@ -0,0 +1,91 @@
+"""
+Benchmark end-to-end latency of the serial graph against speculative retrieval.
+
+The LLM chains and the retriever are replaced by stubs that sleep for a configurable
+delay, so the numbers reflect graph scheduling only and no OpenAI calls are made.
+
+Usage:
+    python benchmarks/speculative_retrieval.py --runs 200 --classifier-ms 600 --retrieve-ms 250
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+from pathlib import Path
+from time import perf_counter
+
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root_dir / "src"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+import graphs.graphs as rag
+from graphs._schema import GradeDocuments, IsItBugOrUserFeedbackRelevant
+
+def install_stubs(args: argparse.Namespace, rng: random.Random) -> None:
+    """Replace the LLM chains and the retriever with delayed stubs."""
+    async def classify(_):
+        await asyncio.sleep(args.classifier_ms / 1000)
+        on_topic = rng.random() < args.on_topic_ratio
+        return IsItBugOrUserFeedbackRelevant(binary_score="yes" if on_topic else "no")
+
+    async def grade(_):
+        await asyncio.sleep(args.grader_ms / 1000)
+        return GradeDocuments(binary_score="yes")
+
+    async def generate(_):
+        await asyncio.sleep(args.generate_ms / 1000)
+        return AIMessage(content="stub answer")
+
+    async def retrieve(_):
+        await asyncio.sleep(args.retrieve_ms / 1000)
+        return [Document(page_content="# Bug #1\nUpload stuck at 99%", metadata={"score": 0.9})]
+
+    rag.registry.override("relevance_checker", RunnableLambda(classify))
+    rag.registry.override("retrieval_grader", RunnableLambda(grade))
+    rag.registry.override("answer_generator", RunnableLambda(generate))
+    rag.retriever_tool = RunnableLambda(retrieve)
+
+async def measure(graph, runs: int) -> list[float]:
+    """Run the graph sequentially and return each run's latency in milliseconds."""
+    latencies = []
+    for _ in range(runs):
+        start = perf_counter()
+        await graph.ainvoke({"question": "Is there any user feedback on being stuck at 99%?"})
+        latencies.append((perf_counter() - start) * 1000)
+    return latencies
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {"p50": percentiles[49], "p95": percentiles[94], "mean": statistics.fmean(latencies)}
+
+async def main(args: argparse.Namespace) -> None:
+    install_stubs(args, random.Random(args.seed))
+
+    results = {}
+    for mode, speculative in (("serial", False), ("speculative", True)):
+        graph = rag.create_rag_graph(speculative=speculative)
+        results[mode] = summarize(await measure(graph, args.runs))
+
+    print(f"{'mode':<12} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    for mode, stats in results.items():
+        print(f"{mode:<12} {stats['p50']:>10.1f} {stats['p95']:>10.1f} {stats['mean']:>10.1f}")
+
+    for key in ("p50", "p95"):
+        saved = results["serial"][key] - results["speculative"][key]
+        print(f"{key} saved: {saved:.1f} ms ({saved / results['serial'][key]:.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--classifier-ms", type=float, default=600)
+    parser.add_argument("--retrieve-ms", type=float, default=250)
+    parser.add_argument("--grader-ms", type=float, default=500)
+    parser.add_argument("--generate-ms", type=float, default=1500)
+    parser.add_argument("--on-topic-ratio", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
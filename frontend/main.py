@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 from dotenv import load_dotenv
 
@@ -10,6 +11,74 @@ st.set_page_config(page_title="Internal QA Tool", layout="centered")
 
 # Define API endpoint
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+STREAM_API_URL = os.getenv("STREAM_API_URL", f"{API_URL.rstrip('/')}/stream")
+
+# Status messages shown while the backend works through the graph
+NODE_STATUS = {
+    "software_question_relevancy": "Checking whether the question is about bugs or user feedback...",
+    "retrieve": "Searching the reports...",
+    "grade": "Grading the retrieved reports...",
+    "generate": "Writing the answer...",
+}
+
+def stream_events(payload: dict):
+    """
+    Post the question to the streaming endpoint and yield the server-sent events as dicts.
+
+    Args:
+        payload (dict): The request body.
+
+    Yields:
+        dict: The decoded event payloads.
+    """
+    with requests.post(STREAM_API_URL, json=payload, stream=True) as response:
+        if response.status_code != 200:
+            yield {"type": "error", "error": f"Request failed with status code {response.status_code}."}
+            return
+
+        for line in response.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                yield json.loads(line[len("data:"):].strip())
+
+def render_streamed_answer(payload: dict):
+    """Render node transitions and answer tokens as they arrive."""
+    status = st.empty()
+    st.subheader("Response:")
+    answer_placeholder = st.empty()
+    answer = ""
+
+    for event in stream_events(payload):
+        if event["type"] == "node":
+            status.info(NODE_STATUS.get(event["node"], event["node"]))
+        elif event["type"] == "token":
+            answer += event["content"]
+            answer_placeholder.markdown(f"**Answer:** {answer}")
+        elif event["type"] == "done":
+            status.empty()
+            answer_placeholder.markdown(f"**Answer:** {event['answer']}")
+        elif event["type"] == "error":
+            status.empty()
+            st.error(event["error"])
+
+def render_answer(payload: dict):
+    """Send the question to the blocking endpoint and render the full answer."""
+    response = requests.post(API_URL, json=payload)
+
+    # Display the response
+    if response.status_code == 200:
+        response_data = response.json()
+
+        # Check for error in response
+        if "error" in response_data and response_data.get("error"):
+            st.error(response_data["error"])
+        elif response_data.get("success"):
+            # Display the answer from ChatResponse model
+            st.subheader("Response:")
+            st.markdown(f"**Answer:** {response_data['answer']}")
+        else:
+            st.warning("No response found in the agent output.")
+    else:
+        st.error(f"Request failed with status code {response.status_code}.")
 
 # Streamlit UI Elements
 st.title("QA Chatbot")
@@ -17,6 +86,7 @@ st.write("Internal QA Tool for questions about known bugs or user feedback.")
 
 # Input box for user messages
 user_input = st.text_area("Message:", height=150, placeholder="Type your message here...")
+stream_response = st.checkbox("Stream response", value=True)
 
 # Button to send the query
 if st.button("Submit"):
@@ -24,25 +94,12 @@ if st.button("Submit"):
         try:
             # Send the input to the FastAPI backend
             payload = {"question": user_input.strip()}
-            response = requests.post(API_URL, json=payload)
-            
-            # Display the response
-            if response.status_code == 200:
-                response_data = response.json()
-                
-                # Check for error in response
-                if "error" in response_data and response_data.get("error"):
-                    st.error(response_data["error"])
-                elif response_data.get("success"):
-                    # Display the answer from ChatResponse model
-                    st.subheader("Response:")
-                    st.markdown(f"**Answer:** {response_data['answer']}")
-                else:
-                    st.warning("No response found in the agent output.")
+            if stream_response:
+                render_streamed_answer(payload)
             else:
-                st.error(f"Request failed with status code {response.status_code}.")
-                
+                render_answer(payload)
+
         except Exception as e:
             st.error(f"An error occurred: {e}")
     else:
-        st.warning("The field can't be empty.")
\ No newline at end of file
+        st.warning("The field can't be empty.")
@@ -1,5 +1,7 @@
-from typing import TypedDict
+from typing import Optional, TypedDict
+from langchain_core.documents import Document
 from pydantic import BaseModel, Field
+from graphs.report_query import ReportQuery
 
 class QaBotState(TypedDict):
     """
@@ -8,16 +10,24 @@ class QaBotState(TypedDict):
     Attributes:
         question: question
         generation: LLM generation
-        documents: list of documents
+        documents: list of retrieved documents, with their similarity score in metadata["score"]
         documents_relevant: relevance score of the documents to the question
         software_bug_or_user_feedback_relevant: relevance score of the question to software bugs or user feedback
+        question_embedding: embedding of the question, when already computed for the answer cache
+        target_source: which reports the question is about, 'bugs', 'feedback' or 'both'
+        report_query: the report table query for counting, listing and filtering questions, None otherwise
+        report_query_route: where the report table query sends the run, 'answered', 'generate' or 'fallback'
     """
 
     question: str
     generation: str
-    documents: list[str]
+    documents: list[Document]
     documents_relevant: str
     software_bug_or_user_feedback_relevant: str
+    question_embedding: list[float]
+    target_source: str
+    report_query: Optional[ReportQuery]
+    report_query_route: str
 
 class IsItBugOrUserFeedbackRelevant(BaseModel):
     """Binary score for relevance check whether the question is about bug reports or user feedback"""
@@ -25,6 +35,10 @@ class IsItBugOrUserFeedbackRelevant(BaseModel):
     binary_score: str = Field(
         description="Is the question related to software bugs or user feedback on the software? 'yes' or 'no'?"
     )
+    target_source: str = Field(
+        default="both",
+        description="Which reports answer the question: 'bugs', 'feedback' or 'both'?"
+    )
 
 class GradeDocuments(BaseModel):
     """Binary score for relevance check on retrieve documents"""
@@ -0,0 +1,76 @@
+"""
+Batch triage runs from the command line.
+
+Answers a file of questions (one per line, or JSON lines with a "question" field) in one batch
+run and writes JSON lines: one result per question, then a summary with throughput and the
+time spent in each stage.
+
+Usage:
+    python src/graphs/batch.py questions.txt --output answers.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Run as a script, the script's own directory (with graphs.py in it) would shadow the graphs package
+src_dir = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(src_dir))
+
+from graphs.graphs import BATCH_MAX_CONCURRENCY, batch_response_from_rag
+
+def read_questions(path: str) -> list[str]:
+    """
+    Read questions from a text or JSON lines file, or from stdin when the path is "-".
+
+    Args:
+        path (str): The questions file.
+
+    Returns:
+        list[str]: The non-empty questions, in file order.
+    """
+    lines = sys.stdin.read().splitlines() if path == "-" else Path(path).read_text().splitlines()
+    questions = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        questions.append(json.loads(line)["question"] if line.startswith("{") else line)
+    return questions
+
+async def run(args: argparse.Namespace) -> dict:
+    questions = read_questions(args.questions)
+    if not questions:
+        raise SystemExit(f"No questions found in {args.questions}")
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    summary = {}
+    try:
+        async for event in batch_response_from_rag(questions, max_concurrency=args.concurrency):
+            output.write(json.dumps(event) + "\n")
+            output.flush()
+            if event["type"] == "summary":
+                summary = event
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return summary
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help='Questions file (text or JSON lines), or "-" for stdin')
+    parser.add_argument("--output", help="JSON lines output file. Defaults to stdout")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="Maximum graph runs in flight")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(
+        f"Answered {summary['questions']} questions ({summary['unique']} unique, {summary['cached']} cached, "
+        f"{summary['generated']} generated, {summary['errors']} failed) in {summary['elapsed_seconds']}s: "
+        f"{summary['questions_per_second']} questions/s. Stage totals in ms: {summary['stage_ms']}",
+        file=sys.stderr,
+    )
+
+if __name__ == "__main__":
+    main()
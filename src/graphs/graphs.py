@@ -1,22 +1,89 @@
+import asyncio
+import os
+from time import perf_counter
+from typing import AsyncIterator, Optional
 from langgraph.graph import StateGraph, END, START
-from utils.llm import LLMModel
-from tools.tools import retriever_tool
+from utils.llm import LLMModel, NODE_MODEL_DEFAULTS, get_node_model_config
+from utils.llm_scheduler import DeadlineExceeded, LLMOverloaded, LLMScheduler, get_node_call_config
+from tools.tools import retriever_tool, embed_question, embed_questions, retrieve_by_embedding, get_vector_store
+from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.schema import Document
 from graphs._schema import QaBotState, GradeDocuments, IsItBugOrUserFeedbackRelevant
+from graphs.registry import registry
+from graphs.relevance import KeywordRelevanceClassifier
+from graphs.report_query import ReportQuery, ReportQueryRouter, render_answer
+from utils.timing import add_stage_timings, collect_stage_timings, stage, timed_node
+from utils.answer_cache import AnswerCache
+from utils.singleflight import SingleFlight
+from utils.context import assemble_context, count_tokens, get_encoding
+from utils.metrics import (
+    generations_skipped, llm_usage, metrics, observe_context, observe_retrieval, observe_skipped_generation,
+    token_usage_handler, track_request,
+)
+
+SPECULATIVE_RETRIEVAL = os.getenv("RAG_SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+# "combined" grades all retrieved chunks in one call, "per_document" grades and filters each chunk
+GRADING_MODE = os.getenv("RAG_GRADING_MODE", "combined").lower()
+GRADING_CONCURRENCY = int(os.getenv("RAG_GRADING_CONCURRENCY", 4))
+# "llm" always asks the LLM whether the question is on topic, "hybrid" tries the local keyword classifier first
+RELEVANCE_CLASSIFIER = os.getenv("RAG_RELEVANCE_CLASSIFIER", "llm").lower()
+# Reports a relevant question can be routed to
+TARGET_SOURCES = ("bugs", "feedback", "both")
+# Completion tokens assumed for the rate limiter when a node has no max_tokens cap
+UNCAPPED_COMPLETION_TOKENS = 1000
+# Answer counting, listing and filtering questions from the structured report table (see graphs.report_query)
+STRUCTURED_QUERIES = os.getenv("RAG_STRUCTURED_QUERIES", "true").lower() == "true"
+# Reports listed in an answer from the table, and matching chunks handed to generate for a filtering question
+STRUCTURED_LIST_LIMIT = int(os.getenv("RAG_STRUCTURED_LIST_LIMIT", 25))
+STRUCTURED_MAX_CHUNKS = int(os.getenv("RAG_STRUCTURED_MAX_CHUNKS", 20))
+# Answer off-topic questions, and questions nothing relevant was found for, from a template instead of the generate LLM call
+TEMPLATED_RESPONSES = os.getenv("RAG_TEMPLATED_RESPONSES", "true").lower() == "true"
+OFF_TOPIC_ANSWER = os.getenv(
+    "RAG_OFF_TOPIC_ANSWER",
+    "Your question does not appear to be related to software bugs or user feedback, so I cannot provide an answer. "
+    "Please ask about the reported bugs or the feedback users have given on the software.",
+)
+NO_INFORMATION_ANSWER = os.getenv(
+    "RAG_NO_INFORMATION_ANSWER",
+    "There is no relevant information available in the bug reports or user feedback regarding your question.",
+)
+
+async def call_llm(node: str, chain, inputs: dict):
+    """
+    Invoke an LLM chain through the shared LLM scheduler, under the concurrency limits, tokens-per-minute
+    budget, deadline and hedging configured for the node.
+
+    Args:
+        node (str): 'relevance', 'grader' or 'generate', which selects the model tier and call settings.
+        chain (Runnable): The prompt and model chain.
+        inputs (dict): The prompt inputs.
 
-llm_instance = LLMModel()
-llm = llm_instance.get_model()
+    Returns:
+        The chain output.
+    """
+    model_name, max_tokens = get_node_model_config(node)
+    scheduler = registry.get("llm_scheduler")
+    estimated_tokens = 0
+    if scheduler.has_token_budget(model_name):
+        # Only a model with a tokens-per-minute budget needs the prompt rendered and counted ahead of the call
+        prompt = getattr(chain, "first", None)
+        prompt_text = prompt.format(**inputs) if isinstance(prompt, ChatPromptTemplate) else " ".join(map(str, inputs.values()))
+        estimated_tokens = count_tokens(prompt_text) + (max_tokens or UNCAPPED_COMPLETION_TOKENS)
+    return await scheduler.run(node, model_name, lambda: chain.ainvoke(inputs), estimated_tokens)
 
 def is_question_bug_or_user_feedback_related():
     """Get whether the question is related to software bug reports or user feedback."""
-    structured_llm_checker = llm.with_structured_output(IsItBugOrUserFeedbackRelevant)
+    structured_llm_checker = registry.get("relevance_llm").with_structured_output(IsItBugOrUserFeedbackRelevant)
     system = """
         Your job is to act as a strict binary classifier.
         You will receive a user question and must respond with only one word: 'yes' or 'no'.
         Do not provide any other text, punctuation, or capitalization.
         'yes' if the question is related to either software bugs or customer feedback about software.
         'no' if the question is NOT related to either software bugs or customer feedback about software.
+
+        Also give the target source, the reports that can answer the question:
+        'bugs' if it is only about bug reports, 'feedback' if it is only about user feedback, 'both' otherwise or when unsure.
     """
     relevance_prompt = ChatPromptTemplate.from_messages(
         [
@@ -47,6 +114,30 @@ def should_generate_or_retrieve(state: QaBotState) -> str:
     else:
         return "generate"
 
+def should_grade(state: QaBotState) -> str:
+    """
+        Determine whether retrieval found anything worth grading
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            str: 'grade', or 'no_documents' when no chunk was found (or none cleared the score threshold)
+    """
+    return "grade" if state.get("documents") else "no_documents"
+
+def should_generate(state: QaBotState) -> str:
+    """
+        Determine whether grading left anything to generate an answer from
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            str: 'generate' when relevant documents were found, 'no_documents' otherwise
+    """
+    return "generate" if state.get("documents") and state.get("documents_relevant") == "yes" else "no_documents"
+
 async def grade_question(state: QaBotState) -> QaBotState:
     """
         Determine whether the question is related to software feedback or bug reports.
@@ -56,22 +147,42 @@ async def grade_question(state: QaBotState) -> QaBotState:
 
         Returns:
             state (dict): Updates software_bug_or_user_feedback_relevant key with question graded for software bug
-            or user feedback relevance
+            or user feedback relevance, and target_source with the reports retrieval should search
     """
 
     question = state["question"]
-    relevance_checker = is_question_bug_or_user_feedback_related()
-    score = await relevance_checker.ainvoke({"question": question})
+
+    if RELEVANCE_CLASSIFIER == "hybrid":
+        # Answer the easy cases locally and only pay for the LLM call when the keywords are inconclusive
+        local_relevance_classifier = registry.get("local_relevance_classifier")
+        grade = local_relevance_classifier.classify(question)
+        if grade is not None:
+            return {
+                "software_bug_or_user_feedback_relevant": grade,
+                "target_source": local_relevance_classifier.target_source(question),
+            }
+
+    relevance_checker = registry.get("relevance_checker")
+    try:
+        score = await call_llm("relevance", relevance_checker, {"question": question})
+    except DeadlineExceeded as e:
+        # Answering from the reports beats failing the request; the grader still filters what is retrieved
+        print(f"{e}, treating the question as relevant")
+        return {"software_bug_or_user_feedback_relevant": "yes", "target_source": "both"}
 
     grade = 'yes' if 'yes' in score.binary_score.lower() else 'no'
+    target_source = score.target_source.strip().lower()
 
-    return {"question": question, "software_bug_or_user_feedback_relevant": grade}
+    return {
+        "software_bug_or_user_feedback_relevant": grade,
+        "target_source": target_source if target_source in TARGET_SOURCES else "both",
+    }
     
 
 def doc_relevance_grader():
     """Get the document relevance grade."""
     # LLM with function call
-    structured_llm_grader = llm.with_structured_output(GradeDocuments)
+    structured_llm_grader = registry.get("grader_llm").with_structured_output(GradeDocuments)
     system = """
         You are a grader assessing the relevance of a retrieved document to a user's question about software bugs or user feedback about software.
 
@@ -97,7 +208,9 @@ def doc_relevance_grader():
     grade_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system),
-            ("human", "Retrieved document: \n\n {document} \n\n User question: {question}")
+            # Static system text first and the question before the chunk, so that the calls grading the chunks
+            # of one question share the longest possible prefix for provider-side prompt caching
+            ("human", "User question: {question} \n\n Retrieved document: \n\n {document}")
         ]
     )
 
@@ -120,19 +233,23 @@ async def grade_documents(state: QaBotState) -> QaBotState:
 
     documents_relevant = "no"
 
-    retrieval_grader = doc_relevance_grader()
+    retrieval_grader = registry.get("retrieval_grader")
     # First, ensure documents is iterable and elements are strings
     if isinstance(documents, str):
         # documents is already a string, no need to join
         document_text = documents
     elif hasattr(documents, '__iter__'):
-        # documents is iterable, convert all elements to strings and join with space
-        document_text = " ".join(str(doc) for doc in documents)
+        # documents is iterable, join the text of every chunk
+        document_text = "\n\n".join(doc.page_content if isinstance(doc, Document) else str(doc) for doc in documents)
     else:
         # documents is neither string nor iterable, convert to string directly
         document_text = str(documents)
 
-    score = await retrieval_grader.ainvoke({"question": question, "document": document_text})
+    try:
+        score = await call_llm("grader", retrieval_grader, {"question": question, "document": document_text})
+    except DeadlineExceeded as e:
+        print(f"{e}, keeping the retrieved documents")
+        return {"documents": documents, "question": question, "documents_relevant": "yes"}
 
     grade = score.binary_score
 
@@ -142,24 +259,184 @@ async def grade_documents(state: QaBotState) -> QaBotState:
         documents_relevant = "no"
     return {"documents": documents, "question": question, "documents_relevant": documents_relevant}
 
+async def grade_documents_individually(state: QaBotState) -> QaBotState:
+    """
+        Grade every retrieved chunk on its own, concurrently, and keep only the relevant ones.
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            state (dict): Updates documents with the relevant chunks only and documents_relevant with
+            whether any chunk was relevant
+    """
+    question = state["question"]
+    chunks = state.get("documents") or []
+
+    if not chunks:
+        return {"documents": [], "documents_relevant": "no"}
+
+    retrieval_grader = registry.get("retrieval_grader")
+    semaphore = asyncio.Semaphore(GRADING_CONCURRENCY)
+
+    async def is_relevant(chunk) -> bool:
+        document = chunk.page_content if isinstance(chunk, Document) else str(chunk)
+        async with semaphore:
+            try:
+                score = await call_llm("grader", retrieval_grader, {"question": question, "document": document})
+            except DeadlineExceeded as e:
+                print(f"{e}, keeping the chunk")
+                return True
+        return 'yes' in score.binary_score.lower()
+
+    grades = await asyncio.gather(*(is_relevant(chunk) for chunk in chunks))
+
+    relevant_chunks = [chunk for chunk, relevant in zip(chunks, grades) if relevant]
+    documents_relevant = "yes" if relevant_chunks else "no"
+
+    return {"documents": relevant_chunks, "documents_relevant": documents_relevant}
+
 async def retrieve_documents(state: QaBotState) -> QaBotState:
     """Retrieve documents based on the question."""
     question = state["question"]
+    question_embedding = state.get("question_embedding")
+    # Speculative retrieval runs before the relevance check has picked a source, so it searches both
+    target_source = state.get("target_source", "both")
 
     try:
-        documents = await retriever_tool.ainvoke(question)
+        if question_embedding:
+            # Reuse the embedding already computed for the answer cache lookup
+            documents = await retrieve_by_embedding(question, question_embedding, target_source)
+        else:
+            documents = await retriever_tool.ainvoke({"query": question, "target_source": target_source})
         
+        observe_retrieval(len(documents or []))
         if not documents:
-            return {"documents": [], "question": question}
+            return {"documents": []}
         
-        return {"documents": documents, "question": question}
+        return {"documents": documents}
     
     except Exception as e:
         print(f"An error occurred during document retrieval: {e}")
-        return {"documents": [], "question": question}
+        return {"documents": []}
+
+def parse_report_query(question: str) -> Optional[ReportQuery]:
+    """
+    Translate a question into a report table query, or return None when it should go through retrieval:
+    it is not a counting, listing or filtering question, or it has a term that no report contains.
+    """
+    if not STRUCTURED_QUERIES:
+        return None
+    try:
+        report_table = get_vector_store().get_report_table()
+        query = registry.get("report_query_router").parse(question, report_table.values())
+        if query is None or not query.terms:
+            return query
+        unmatched = report_table.unmatched_terms(query.terms, query.report_type)
+    except Exception as e:
+        print(f"The report table is unavailable, using retrieval: {e}")
+        return None
+    if unmatched:
+        registry.get("report_query_router").record("fallbacks")
+        return None
+    return query
+
+async def route_question(state: QaBotState) -> QaBotState:
+    """
+        Recognize the counting, listing and filtering questions the report table can answer, before any LLM call
 
+        Args:
+            state(dict): current state of the graph
 
-async def generate(state: QaBotState) -> QaBotState:
+        Returns:
+            state (dict): Updates report_query with the table query, or None when the question goes through retrieval
+    """
+    return {"report_query": await asyncio.to_thread(parse_report_query, state["question"])}
+
+async def query_report_table(state: QaBotState) -> QaBotState:
+    """
+        Answer a counting, listing or filtering question from the structured report table. Counts, breakdowns
+        and lists are written without an LLM call; for other filtering questions the matching chunks go
+        straight to generation, without retrieval or grading. A count or breakdown with no matching report
+        is answered "there are no ..."; a list or lookup with none takes the regular path, since similarity
+        search may still find reports that describe it in other words.
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            state (dict): Updates report_query_route with 'answered' (and generation), 'generate' (and documents),
+            or 'fallback' when a list or lookup matches no report
+    """
+    router = registry.get("report_query_router")
+    query = state["report_query"]
+    report_table = get_vector_store().get_report_table()
+    limit = STRUCTURED_MAX_CHUNKS if query.intent == "prose" else STRUCTURED_LIST_LIMIT
+    total, rows = await asyncio.to_thread(report_table.select, query.report_type, query.filters, query.number, query.terms, limit)
+
+    if not total and query.intent in ("list", "prose"):
+        router.record("fallbacks")
+        return {"report_query_route": "fallback"}
+
+    if query.intent != "prose":
+        groups = None
+        if query.intent == "group" and total:
+            groups = await asyncio.to_thread(report_table.group_counts, query.group_by, query.report_type, query.filters, query.terms)
+        router.record("answered")
+        observe_skipped_generation("report_table")
+        return {
+            "generation": AIMessage(content=render_answer(query, total, rows, groups)),
+            "software_bug_or_user_feedback_relevant": "yes",
+            "report_query_route": "answered",
+        }
+
+    documents = [Document(id=row["id"], page_content=row["text"], metadata={**row["metadata"], "score": 1.0}) for row in rows]
+    observe_retrieval(len(documents))
+    router.record("generated")
+    return {
+        "documents": documents,
+        "documents_relevant": "yes",
+        "software_bug_or_user_feedback_relevant": "yes",
+        "report_query_route": "generate",
+    }
+
+async def discard_speculative_documents(state: QaBotState) -> QaBotState:
+    """
+        Join point of speculative retrieval. Drop the documents retrieved in parallel with the
+        relevance check when the question turned out not to be about bugs or user feedback.
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            state (dict): Clears the documents key for off-topic questions
+    """
+    if should_generate_or_retrieve(state) == "retrieve":
+        return {}
+    return {"documents": []}
+
+async def templated_answer(state: QaBotState) -> QaBotState:
+    """
+        Answer without the generate LLM call when the answer is already known: the question is not about
+        software bugs or user feedback, retrieval found nothing, or the grader found nothing relevant.
+
+        Args:
+            state(dict): current state of the graph
+
+        Returns:
+            state (dict): Updates generation with the templated answer
+    """
+    if should_generate_or_retrieve(state) == "generate":
+        reason, answer = "off_topic", OFF_TOPIC_ANSWER
+    elif "documents_relevant" in state:
+        reason, answer = "not_relevant", NO_INFORMATION_ANSWER
+    else:
+        reason, answer = "no_documents", NO_INFORMATION_ANSWER
+    observe_skipped_generation(reason)
+    return {"generation": AIMessage(content=answer)}
+
+def answer_generator():
+    """Get the answer generation chain."""
     system = """   
         You are an expert in Quality Assurance. Your main task is to generate a detailed answer to the question about
         the software bugs or user feedback on the software. You are talking to a product team or engineering team member
@@ -172,9 +449,9 @@ async def generate(state: QaBotState) -> QaBotState:
         2.  In the case of 'software_bug_or_user_feedback_relevant' is 'yes'. If there is no document is present, then skip 
             straight to generating response informing user that there is no relevant information available in the documents or 
             knowledge base regarding their question.
-        3.  First, determine the source of the documents. If the metadata 'file_name' is 'ai_test_bug_report.docx', that means
-            the document is the bug report in our official documentation. If the metadata 'file_name' is 'ai_test_user_feedback.docx', 
-            that means the document is the user feedback report.
+        3.  First, determine the source of the documents. Each document in the context starts with a '[Source: <file_name>]' line.
+            If the 'file_name' is 'ai_test_bug_report.docx', that means the document is the bug report in our official documentation.
+            If the 'file_name' is 'ai_test_user_feedback.docx', that means the document is the user feedback report.
         4.  Next, generate the answer based on the documents provided, ensuring to reference the source of the information. If no
             relevant information is found in the documents, clearly state that in your response without providing any response
             unrelated to the software bugs or user feedback.
@@ -184,33 +461,42 @@ async def generate(state: QaBotState) -> QaBotState:
                 - Ensure your answer is clear, concise, and directly addresses the user's question about software bugs
                   or user feedback on the software.
 
-        Input:
-            User question: {question}
-            Context: {context}
-            Software question relevant: {software_bug_or_user_feedback_relevant}
-            Documents relevant: {documents_relevant}
+        The retrieved context, the user question and both relevance grades are given in the user message.
         """
     generate_prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system),
-            ("human", "Retrieved document: \n\n Context: {context} \n\n User question: {question} \n\n Software question relevant: {software_bug_or_user_feedback_relevant} \n\n Documents relevant: {documents_relevant} \n\n Generate answer")
+            # Static system text first, then the inputs from the least to the most variable (the grades, the
+            # question, the context), so that provider-side prompt caching can reuse the longest prefix
+            ("human", "Software question relevant: {software_bug_or_user_feedback_relevant} \n\n Documents relevant: {documents_relevant} \n\n User question: {question} \n\n Retrieved document: \n\n Context: {context} \n\n Generate answer")
         ]
     )
+
+    rag_chain = generate_prompt | registry.get("generation_llm")
+
+    return rag_chain
+
+async def generate(state: QaBotState) -> QaBotState:
+    """Generate the final answer from the question, the relevance grades and the retrieved documents."""
     question = state["question"]
     documents = state.get("documents", [])
     software_bug_or_user_feedback_relevant = state.get("software_bug_or_user_feedback_relevant", "no")
     documents_relevant = state.get("documents_relevant", "no")
 
     if isinstance(documents, list) and documents:
-        context_string = "\n\n".join(doc.page_content for doc in documents if isinstance(doc, Document))
-    elif isinstance(documents, str):
-        context_string = documents
+        # Dedupe, order by similarity score, keep the sections relevant to the question and cap to the token budget
+        context_string, context_stats = assemble_context([doc for doc in documents if isinstance(doc, Document)], question=question)
+        print(
+            f"Context: {context_stats['context_tokens']} tokens from {context_stats['chunks_used']}/{context_stats['chunks']} chunks, "
+            f"{context_stats['tokens_saved']} of {context_stats['original_tokens']} tokens saved"
+        )
+        observe_context(context_stats["context_tokens"], context_stats["tokens_saved"])
     else:
-        context_string = ""
+        context_string = documents if isinstance(documents, str) else ""
+        observe_context(count_tokens(context_string))
+    rag_chain = registry.get("answer_generator")
 
-    rag_chain = generate_prompt | llm
-
-    generation = await rag_chain.ainvoke({
+    generation = await call_llm("generate", rag_chain, {
         "context": context_string, 
         "question": question,
         "software_bug_or_user_feedback_relevant": software_bug_or_user_feedback_relevant,
@@ -219,42 +505,439 @@ async def generate(state: QaBotState) -> QaBotState:
 
     return {"documents": documents, "question": question, "generation": generation}
 
-def create_rag_graph():
-    graph = StateGraph(QaBotState)
-
-    graph.add_node("software_question_relevancy", grade_question)
-    graph.add_node("retrieve", retrieve_documents)
-    graph.add_node("grade", grade_documents)
-    graph.add_node("generate", generate)
+def create_rag_graph(speculative: Optional[bool] = None):
+    """
+        Build and compile the RAG graph.
 
-    graph.add_edge(START, "software_question_relevancy")
+        Args:
+            speculative (Optional[bool]): Run retrieval concurrently with the relevance check instead of after it.
+                Defaults to the RAG_SPECULATIVE_RETRIEVAL environment variable.
 
-    graph.add_conditional_edges(
-        "software_question_relevancy",
-        should_generate_or_retrieve,
-        {
-            "retrieve": "retrieve",
-            "generate": "generate"
-        }
-    )
+        Returns:
+            CompiledStateGraph: The compiled graph
+    """
+    if speculative is None:
+        speculative = SPECULATIVE_RETRIEVAL
 
-    graph.add_edge("retrieve", "grade")
-    graph.add_edge("grade", "generate")
+    graph = StateGraph(QaBotState)
+    rag_entry = ["software_question_relevancy", "retrieve"] if speculative else ["software_question_relevancy"]
+
+    graph.add_node("software_question_relevancy", timed_node("software_question_relevancy", grade_question))
+    graph.add_node("retrieve", timed_node("retrieve", retrieve_documents))
+    grade_node = grade_documents_individually if GRADING_MODE == "per_document" else grade_documents
+    graph.add_node("grade", timed_node("grade", grade_node))
+    graph.add_node("generate", timed_node("generate", generate))
+    # Runs whose answer is known without reading any documents end in a templated answer
+    no_answer = "templated_answer" if TEMPLATED_RESPONSES else "generate"
+    if TEMPLATED_RESPONSES:
+        graph.add_node("templated_answer", timed_node("templated_answer", templated_answer))
+        graph.add_edge("templated_answer", END)
+
+    if STRUCTURED_QUERIES:
+        # Counting and filtering questions go to the report table first; everything else, and filtering
+        # questions the table has no chunks for, take the regular path
+        def entry(state: QaBotState) -> list[str]:
+            return ["report_query"] if state.get("report_query") is not None else rag_entry
+
+        def after_report_query(state: QaBotState) -> list[str]:
+            return {"answered": [END], "generate": ["generate"]}.get(state.get("report_query_route"), rag_entry)
+
+        graph.add_node("route_question", timed_node("route_question", route_question))
+        graph.add_node("report_query", timed_node("report_query", query_report_table))
+        graph.add_edge(START, "route_question")
+        graph.add_conditional_edges("route_question", entry, ["report_query", *rag_entry])
+        graph.add_conditional_edges("report_query", after_report_query, [END, "generate", *rag_entry])
+    else:
+        for node in rag_entry:
+            graph.add_edge(START, node)
+
+    if speculative:
+        # Fan out the relevance check and retrieval, then join before grading
+        graph.add_node("relevancy_gate", discard_speculative_documents)
+        graph.add_edge(["software_question_relevancy", "retrieve"], "relevancy_gate")
+
+        def after_relevancy_gate(state: QaBotState) -> str:
+            return should_grade(state) if should_generate_or_retrieve(state) == "retrieve" else "generate"
+
+        graph.add_conditional_edges(
+            "relevancy_gate",
+            after_relevancy_gate,
+            {
+                "grade": "grade",
+                "no_documents": no_answer,
+                "generate": no_answer
+            }
+        )
+    else:
+        graph.add_conditional_edges(
+            "software_question_relevancy",
+            should_generate_or_retrieve,
+            {
+                "retrieve": "retrieve",
+                "generate": no_answer
+            }
+        )
+
+        graph.add_conditional_edges("retrieve", should_grade, {"grade": "grade", "no_documents": no_answer})
+
+    if TEMPLATED_RESPONSES:
+        graph.add_conditional_edges("grade", should_generate, {"generate": "generate", "no_documents": "templated_answer"})
+    else:
+        graph.add_edge("grade", "generate")
     graph.add_edge("generate", END)
     
     return graph.compile()
 
+# Everything expensive is built on first use or by warm_rag_graph(), never at import time
+# Model tiers: see NODE_MODEL_DEFAULTS, overridden per node with RAG_<NODE>_MODEL and RAG_<NODE>_MAX_TOKENS
+registry.register("relevance_llm", lambda: LLMModel.for_node("relevance").get_model())
+registry.register("grader_llm", lambda: LLMModel.for_node("grader").get_model())
+registry.register("generation_llm", lambda: LLMModel.for_node("generate").get_model())
+registry.register("vector_store", get_vector_store)
+registry.register("relevance_checker", is_question_bug_or_user_feedback_related)
+registry.register("local_relevance_classifier", KeywordRelevanceClassifier)
+registry.register("report_query_router", ReportQueryRouter)
+registry.register("retrieval_grader", doc_relevance_grader)
+registry.register("answer_generator", answer_generator)
+registry.register("rag_graph", create_rag_graph)
+registry.register("single_flight", SingleFlight)
+registry.register("llm_scheduler", LLMScheduler.from_env)
+registry.register("tokenizer", get_encoding)
+registry.register("answer_cache", lambda: AnswerCache.from_env(fingerprint_fn=lambda: get_vector_store().get_ingest_generation()))
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+BATCH_MAX_CONCURRENCY = int(os.getenv("RAG_BATCH_MAX_CONCURRENCY", 8))
+# Share one graph run between concurrent requests for the same question
+COALESCE_REQUESTS = os.getenv("RAG_COALESCE_REQUESTS", "true").lower() == "true"
+
+GRAPH_NODES = ("report_query", "software_question_relevancy", "retrieve", "grade", "generate", "templated_answer")
+# Nodes whose output carries the final answer
+ANSWER_NODES = ("report_query", "generate", "templated_answer")
+
+# Attributes the tokens of every LLM call to the graph node that made it
+GRAPH_RUN_CONFIG = {"callbacks": [token_usage_handler]}
+
+def _embedding_cache_stats() -> dict:
+    embedding_model = get_vector_store().embedding_model
+    return embedding_model.stats() if hasattr(embedding_model, "stats") else {}
+
+metrics.register_collector("rag_answer_cache", lambda: registry.get("answer_cache").stats())
+metrics.register_collector("rag_relevance_classifier", lambda: registry.get("local_relevance_classifier").stats())
+metrics.register_collector("rag_embedding_cache", _embedding_cache_stats)
+metrics.register_collector("rag_single_flight", lambda: registry.get("single_flight").stats())
+metrics.register_collector("rag_llm_scheduler", lambda: registry.get("llm_scheduler").stats())
+metrics.register_collector("rag_report_query", lambda: registry.get("report_query_router").stats())
+metrics.register_collector("rag_retrieval", lambda: {"lexical_fast_path_hits": get_vector_store().lexical_fast_path_hits})
+
+def warm_rag_graph() -> dict[str, float]:
+    """
+    Build the prompt chains and compile the RAG graph ahead of the first request.
+
+    Returns:
+        dict[str, float]: Build time in milliseconds for each registry entry.
+    """
+    return registry.warm()
+
+def get_answer_cache_stats() -> dict:
+    """Return hit/miss metrics of the answer cache."""
+    return {"enabled": ANSWER_CACHE_ENABLED, **registry.get("answer_cache").stats()}
+
+def get_relevance_classifier_stats() -> dict:
+    """Return how many relevance checks the local classifier answered without an LLM call."""
+    return {"mode": RELEVANCE_CLASSIFIER, **registry.get("local_relevance_classifier").stats()}
+
+def get_single_flight_stats() -> dict:
+    """Return how many requests shared an in-flight graph run instead of starting their own."""
+    return {"enabled": COALESCE_REQUESTS, **registry.get("single_flight").stats()}
+
+def get_report_query_stats() -> dict:
+    """Return how many questions the report table answered without retrieval, and how many LLM calls that saved."""
+    return {"enabled": STRUCTURED_QUERIES, **registry.get("report_query_router").stats()}
+
+def get_llm_stats() -> dict:
+    """
+    Return the model, max_tokens cap, deadline and hedging delay of every node, the calls, tokens, latency and
+    estimated cost per node and model, and the LLM scheduler's queue, rejections, deadline misses and hedges.
+    """
+    models = {}
+    for node in NODE_MODEL_DEFAULTS:
+        model_name, max_tokens = get_node_model_config(node)
+        timeout, hedge_after = get_node_call_config(node)
+        models[node] = {"model": model_name, "max_tokens": max_tokens, "timeout_seconds": timeout, "hedge_after_seconds": hedge_after}
+    usage = llm_usage.stats()
+    return {
+        "models": models,
+        "usage": usage,
+        "scheduler": registry.get("llm_scheduler").stats(),
+        "generations_skipped": _skipped_generation_stats(usage.get("generate", {})),
+    }
+
+def _skipped_generation_stats(generate_usage: dict) -> dict:
+    """Count the answers given without the generate LLM call, and estimate their saving at the mean generate cost."""
+    by_reason = {reason: int(count) for reason, count in generations_skipped.totals("reason").items()}
+    skipped = sum(by_reason.values())
+    calls = sum(totals["calls"] for totals in generate_usage.values())
+    cost = sum(totals["cost_usd"] for totals in generate_usage.values())
+    return {
+        "enabled": TEMPLATED_RESPONSES,
+        "total": skipped,
+        "by_reason": by_reason,
+        "generate_calls": calls,
+        "estimated_saved_usd": round(skipped * cost / calls, 6) if calls else None,
+    }
+
+def render_metrics() -> str:
+    """Return request, stage, token, retrieval and cache metrics in the Prometheus text format."""
+    return metrics.render()
+
+async def _lookup_answer_cache(question: str) -> tuple[Optional[str], dict]:
+    """
+    Look the question up in the answer cache.
+
+    Args:
+        question (str): The user question.
+
+    Returns:
+        tuple[Optional[str], dict]: The cached answer (None on a miss) and the initial graph input,
+        which carries the question embedding so that retrieval can reuse it.
+    """
+    graph_input = {"question": question}
+    if not ANSWER_CACHE_ENABLED:
+        return None, graph_input
+
+    answer_cache = registry.get("answer_cache")
+    with stage("answer_cache"):
+        await asyncio.to_thread(answer_cache.refresh_fingerprint)
+        cached_answer = answer_cache.get_exact(question)
+    if cached_answer is not None:
+        return cached_answer, graph_input
+
+    with stage("embed_question"):
+        graph_input["question_embedding"] = await embed_question(question)
+    with stage("answer_cache"):
+        cached_answer = answer_cache.get_semantic(graph_input["question_embedding"])
+    return cached_answer, graph_input
+
+def _store_answer(graph_input: dict, answer: str) -> None:
+    """Store a freshly generated answer in the answer cache."""
+    if ANSWER_CACHE_ENABLED and answer:
+        registry.get("answer_cache").put(graph_input["question"], graph_input.get("question_embedding"), answer)
+
 async def get_response_from_rag(question: str) -> str:
-    """Get response from RAG graph based on user question."""
+    """
+    Get response from RAG graph based on user question, serving repeated questions from the answer cache.
+    Concurrent requests for the same normalized question share one graph run.
+    """
+    if not COALESCE_REQUESTS:
+        return await _answer_question(question)
+
+    single_flight = registry.get("single_flight")
+    key = AnswerCache.normalize_question(question)
+    if not single_flight.in_flight(key):
+        answer, timings = await single_flight.do(key, lambda: _answer_question_with_timings(question))
+    else:
+        # The shared run records its metrics once, under the request that started it; this one is counted
+        # as coalesced, and gets the stage timings of the run it waited for
+        with track_request("chat") as request_record:
+            request_record.outcome = "coalesced"
+            answer, timings = await single_flight.do(key, lambda: _answer_question_with_timings(question))
+    add_stage_timings(timings)
+    return answer
+
+async def _answer_question_with_timings(question: str) -> tuple[str, dict[str, float]]:
+    # A shared run collects its own stage timings, which every request that waited for it adds to its own
+    with collect_stage_timings() as timings:
+        return await _answer_question(question), timings
+
+async def _answer_question(question: str) -> str:
     try:
-        rag_graph = create_rag_graph()
-        response = await rag_graph.ainvoke({"question": question})
-        return response["generation"].content
-    
+        with track_request("chat") as request_record:
+            with stage("graph_lookup"):
+                rag_graph = registry.get("rag_graph")
+
+            cached_answer, graph_input = await _lookup_answer_cache(question)
+            if cached_answer is not None:
+                request_record.outcome = "cached"
+                return cached_answer
+
+            response = await rag_graph.ainvoke(graph_input, config=GRAPH_RUN_CONFIG)
+            answer = response["generation"].content
+            _store_answer(graph_input, answer)
+            return answer
+
+    except (LLMOverloaded, DeadlineExceeded):
+        # The backend answers these with 503 and 504 rather than an empty answer
+        raise
     except Exception as e:
         print(f"An error occurred: {e}")
 
-app = create_rag_graph()
+async def stream_response_from_rag(question: str) -> AsyncIterator[dict]:
+    """
+    Stream the RAG graph run for a user question. Concurrent streams for the same normalized question
+    share one graph run, whose events fan out to all of them.
+
+    Yields:
+        dict: Events in order of occurrence. `{"type": "node", "node": ...}` when a graph node starts,
+        `{"type": "token", "content": ...}` for each generated token, and a final
+        `{"type": "done", "answer": ..., "cached": ...}`, or `{"type": "error", "error": ...}` on failure.
+    """
+    if not COALESCE_REQUESTS:
+        async for event in _stream_answer(question):
+            yield event
+        return
+
+    single_flight = registry.get("single_flight")
+    key = AnswerCache.normalize_question(question)
+    if not single_flight.in_flight(key):
+        async for event in single_flight.stream(key, lambda: _stream_answer(question)):
+            yield event
+        return
+
+    with track_request("stream") as request_record:
+        request_record.outcome = "coalesced"
+        async for event in single_flight.stream(key, lambda: _stream_answer(question)):
+            yield event
+
+async def _stream_answer(question: str) -> AsyncIterator[dict]:
+    try:
+        with track_request("stream") as request_record:
+            with stage("graph_lookup"):
+                rag_graph = registry.get("rag_graph")
+
+            cached_answer, graph_input = await _lookup_answer_cache(question)
+            if cached_answer is not None:
+                request_record.outcome = "cached"
+                yield {"type": "token", "content": cached_answer}
+                yield {"type": "done", "answer": cached_answer, "cached": True}
+                return
+
+            tokens = []
+            answer = ""
+            async for event in rag_graph.astream_events(graph_input, config=GRAPH_RUN_CONFIG, version="v2"):
+                node = event.get("metadata", {}).get("langgraph_node")
+
+                if event["event"] == "on_chain_start" and event["name"] in GRAPH_NODES and event["name"] == node:
+                    yield {"type": "node", "node": node}
+
+                elif event["event"] == "on_chat_model_stream" and node == "generate":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        tokens.append(content)
+                        yield {"type": "token", "content": content}
+
+                elif event["event"] == "on_chain_end" and event["name"] in ANSWER_NODES and event["name"] == node:
+                    output = event["data"].get("output") or {}
+                    if "generation" in output:
+                        answer = output["generation"].content
+
+            if not tokens and answer:
+                # The model did not stream (for example, a non-streaming stub), so send the answer as one chunk
+                yield {"type": "token", "content": answer}
+
+            answer = answer or "".join(tokens)
+            _store_answer(graph_input, answer)
+            yield {"type": "done", "answer": answer, "cached": False}
+
+    except Exception as e:
+        print(f"An error occurred while streaming: {e}")
+        yield {"type": "error", "error": str(e)}
+
+async def batch_response_from_rag(questions: list[str], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[dict]:
+    """
+    Answer a list of questions in one batch run.
+
+    Identical questions (after normalization) are answered once. The questions that miss the exact
+    answer cache are embedded in a single embedding call, checked against the semantic cache, and the
+    rest run through the graph with `abatch_as_completed` under a concurrency limit, reusing their
+    embeddings for retrieval.
+
+    Args:
+        questions (list[str]): The user questions.
+        max_concurrency (int): Maximum number of graph runs in flight.
+
+    Yields:
+        dict: One `{"type": "result", "index": ..., "question": ..., "answer": ..., "cached": ..., "error": ...}`
+        per input question, in order of completion, then a final `{"type": "summary", ...}` with throughput
+        and the total milliseconds spent in each stage.
+    """
+    start = perf_counter()
+    summary = {"questions": len(questions), "unique": 0, "cached": 0, "generated": 0, "errors": 0}
+
+    # Map each normalized question to the indexes of its copies in the input
+    copies: dict[str, list[int]] = {}
+    for index, question in enumerate(questions):
+        copies.setdefault(AnswerCache.normalize_question(question), []).append(index)
+    unique = {key: questions[indexes[0]] for key, indexes in copies.items()}
+    summary["unique"] = len(unique)
+
+    def results_for(key: str, answer: Optional[str], cached: bool, error: Optional[str] = None) -> list[dict]:
+        summary["cached" if cached else "errors" if error else "generated"] += 1
+        return [
+            {"type": "result", "index": index, "question": questions[index], "answer": answer, "cached": cached, "error": error}
+            for index in copies[key]
+        ]
+
+    with collect_stage_timings() as timings, track_request("batch") as request_record:
+        try:
+            with stage("graph_lookup"):
+                rag_graph = registry.get("rag_graph")
+
+            pending = dict(unique)
+            graph_inputs = {key: {"question": question} for key, question in unique.items()}
+            if ANSWER_CACHE_ENABLED:
+                answer_cache = registry.get("answer_cache")
+                with stage("answer_cache"):
+                    await asyncio.to_thread(answer_cache.refresh_fingerprint)
+                    exact_hits = {key: answer_cache.get_exact(question) for key, question in unique.items()}
+                for key, cached_answer in exact_hits.items():
+                    if cached_answer is not None:
+                        del pending[key]
+                        for result in results_for(key, cached_answer, cached=True):
+                            yield result
+
+            if pending:
+                # One embedding call for the whole batch, shared by the semantic cache and retrieval
+                with stage("embed_question"):
+                    embeddings = await embed_questions(list(pending.values()))
+                for key, embedding in zip(list(pending), embeddings):
+                    graph_inputs[key]["question_embedding"] = embedding
+                    if ANSWER_CACHE_ENABLED:
+                        with stage("answer_cache"):
+                            cached_answer = answer_cache.get_semantic(embedding)
+                        if cached_answer is not None:
+                            del pending[key]
+                            for result in results_for(key, cached_answer, cached=True):
+                                yield result
+
+            keys = list(pending)
+            runs = rag_graph.abatch_as_completed(
+                [graph_inputs[key] for key in keys],
+                config={**GRAPH_RUN_CONFIG, "max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+            async for position, response in runs:
+                key = keys[position]
+                if isinstance(response, Exception):
+                    print(f"An error occurred while answering '{unique[key]}': {response}")
+                    results = results_for(key, None, cached=False, error=str(response))
+                else:
+                    answer = response["generation"].content
+                    _store_answer(graph_inputs[key], answer)
+                    results = results_for(key, answer, cached=False)
+                for result in results:
+                    yield result
+
+        except Exception as e:
+            print(f"An error occurred during the batch run: {e}")
+            request_record.outcome = "error"
+            summary["error"] = str(e)
+
+    elapsed = perf_counter() - start
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["questions_per_second"] = round(len(questions) / elapsed, 2) if elapsed else 0.0
+    summary["max_concurrency"] = max_concurrency
+    summary["stage_ms"] = timings
+    yield {"type": "summary", **summary}
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,85 @@
+import threading
+from time import perf_counter
+from typing import Any, Callable
+
+class Registry:
+    """
+    Process-wide registry of expensive, reusable objects (prompt chains, compiled graphs).
+
+    Each entry is registered with a factory and built at most once, either lazily on first
+    use or eagerly through `warm()`. Requests then share the same instance.
+    """
+
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._instances: dict[str, Any] = {}
+        self._build_times: dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """
+        Register a factory under a name. Any previously built instance is discarded.
+
+        Args:
+            name (str): The registry key.
+            factory (Callable): Zero-argument callable that builds the object.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+            self._build_times.pop(name, None)
+
+    def override(self, name: str, instance: Any) -> None:
+        """
+        Replace an entry with an already built instance (for example, a stub in benchmarks).
+
+        Args:
+            name (str): The registry key.
+            instance (Any): The object to hand out for this key.
+        """
+        with self._lock:
+            self._factories[name] = lambda: instance
+            self._instances[name] = instance
+            self._build_times[name] = 0.0
+
+    def get(self, name: str) -> Any:
+        """
+        Return the shared instance for a name, building it on first use.
+
+        Args:
+            name (str): The registry key.
+
+        Returns:
+            Any: The built object.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Nothing registered under '{name}'")
+                start = perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._build_times[name] = round((perf_counter() - start) * 1000, 3)
+            return self._instances[name]
+
+    def warm(self) -> dict[str, float]:
+        """
+        Build every registered entry that has not been built yet.
+
+        Returns:
+            dict[str, float]: Build time in milliseconds for each entry.
+        """
+        for name in list(self._factories):
+            self.get(name)
+        return self.build_times()
+
+    def build_times(self) -> dict[str, float]:
+        """Return the build time in milliseconds of each entry built so far."""
+        return dict(self._build_times)
+
+registry = Registry()
+
+__all__ = ["Registry", "registry"]
@@ -0,0 +1,112 @@
+import re
+import threading
+from typing import Optional
+
+# Patterns that point to a question about software bugs or user feedback, with their weights.
+# Strong signals decide on their own, weak ones need company.
+ON_TOPIC_PATTERNS = [
+    (r"\bbugs?\b|\bdefects?\b|\bregressions?\b", 2),
+    (r"\bcrash\w*|\bfreez\w*|\bhangs?\b|\bunresponsive\b|\bglitch\w*", 2),
+    (r"\berrors?\b|\bexceptions?\b|\bstack ?traces?\b", 2),
+    (r"\bfeedback\b|\bcomplain\w*|\bfeature requests?\b|\breviews?\b", 2),
+    (r"\bstuck\b|\bbroken\b|\bnot working\b|\bdoesn'?t work\b|\bfail\w*", 2),
+    (r"\bseverity\b|\bpriority\b|\breproduce\b|\bworkaround\b", 2),
+    (r"\bissues?\b|\bproblems?\b|\bslow\b|\blag\w*|\blatency\b|\bperformance\b", 1),
+    (r"\bupload\w*|\bdownload\w*|\blog ?in\b|\bsign ?in\b|\bscroll ?bars?\b|\bbuttons?\b|\bscreens?\b", 1),
+    (r"\busers?\b|\bcustomers?\b|\bapp\b|\bapplication\b|\bsoftware\b|\bversion\b|\bui\b|\bux\b", 1),
+]
+
+# Patterns that point to a question with nothing to do with the reports.
+OFF_TOPIC_PATTERNS = [
+    (r"\brecipes?\b|\bcook\w*|\bbak(e|ing)\b", 2),
+    (r"\bweather\b|\bforecast\b|\btemperature\b", 2),
+    (r"\bcapital of\b|\bpresident\b|\bhistory of\b|\bwho (won|invented|wrote)\b", 2),
+    (r"\bjokes?\b|\bpoems?\b|\bstory\b|\bsongs?\b|\blyrics\b", 2),
+    (r"\bmovies?\b|\bsports?\b|\bfootball\b|\bsoccer\b|\bstock prices?\b|\bhoroscope\b", 2),
+    (r"^\s*(hi|hello|hey|thanks|thank you)\b", 2),
+]
+
+# Patterns that point to one kind of report, used to route retrieval to that partition.
+BUG_SOURCE_PATTERNS = r"\bbugs?\b|\bdefects?\b|\bcrash\w*|\berrors?\b|\bexceptions?\b|\bseverity\b|\breproduce\b|\bbug reports?\b"
+FEEDBACK_SOURCE_PATTERNS = r"\bfeedback\b|\bcomplain\w*|\bfeature requests?\b|\breviews?\b|\bsuggest\w*|\busers? (say|said|think|want|like)\w*"
+
+class KeywordRelevanceClassifier:
+    """
+    Local keyword/regex classifier for whether a question is about software bugs or user feedback.
+
+    It runs in-process with no network access and only answers when the evidence is one-sided;
+    everything else is left to the LLM classifier.
+    """
+
+    def __init__(self, threshold: int = 2):
+        self.threshold = threshold
+        self._on_topic = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in ON_TOPIC_PATTERNS]
+        self._off_topic = [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in OFF_TOPIC_PATTERNS]
+        self._bug_source = re.compile(BUG_SOURCE_PATTERNS, re.IGNORECASE)
+        self._feedback_source = re.compile(FEEDBACK_SOURCE_PATTERNS, re.IGNORECASE)
+        self._lock = threading.Lock()
+        self._stats = {"local_yes": 0, "local_no": 0, "llm_fallbacks": 0}
+
+    def scores(self, question: str) -> tuple[int, int]:
+        """
+        Score a question against the on-topic and off-topic patterns.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            tuple[int, int]: The on-topic and off-topic scores.
+        """
+        on_topic = sum(weight for pattern, weight in self._on_topic if pattern.search(question))
+        off_topic = sum(weight for pattern, weight in self._off_topic if pattern.search(question))
+        return on_topic, off_topic
+
+    def classify(self, question: str) -> Optional[str]:
+        """
+        Classify a question when the keywords make the answer clear.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            Optional[str]: 'yes' or 'no' when confident, None when the LLM should decide.
+        """
+        on_topic, off_topic = self.scores(question)
+
+        if on_topic >= self.threshold and off_topic == 0:
+            decision = "yes"
+        elif off_topic >= self.threshold and on_topic == 0:
+            decision = "no"
+        else:
+            decision = None
+
+        with self._lock:
+            self._stats[f"local_{decision}" if decision else "llm_fallbacks"] += 1
+        return decision
+
+    def target_source(self, question: str) -> str:
+        """
+        Pick the reports a question is about from its keywords.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            str: 'bugs' or 'feedback' when only one kind of report is mentioned, 'both' otherwise.
+        """
+        about_bugs = bool(self._bug_source.search(question))
+        about_feedback = bool(self._feedback_source.search(question))
+        if about_bugs and not about_feedback:
+            return "bugs"
+        if about_feedback and not about_bugs:
+            return "feedback"
+        return "both"
+
+    def stats(self) -> dict:
+        """Return how many questions were decided locally and how many went to the LLM."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["llm_calls_saved"] = stats["local_yes"] + stats["local_no"]
+        return stats
+
+__all__ = ["KeywordRelevanceClassifier"]
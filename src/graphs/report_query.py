@@ -0,0 +1,229 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+from utils.bm25 import STOPWORDS, tokenize
+
+# Severity words understood even when no report uses them yet, so "how many critical bugs" can answer 0
+SEVERITY_LEVELS = ("blocker", "critical", "major", "high", "medium", "normal", "minor", "low", "trivial")
+
+COUNT_PATTERN = re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b|\bhow often\b", re.IGNORECASE)
+LIST_PATTERN = re.compile(r"^\s*(?:list|show|name|enumerate|which)\b|\b(?:list|show me|enumerate)\b", re.IGNORECASE)
+GROUP_PATTERN = re.compile(
+    r"\b(?:by|per|each|breakdown of|distribution of|grouped by|split by)\s+(?P<column>[a-z]+)\b"
+    r"|\b(?P<column_first>[a-z]+)\s+(?:breakdown|distribution)\b",
+    re.IGNORECASE,
+)
+# Column names as questions say them
+COLUMN_ALIASES = {
+    "severity": "severity", "severities": "severity", "priority": "severity", "priorities": "severity",
+    "status": "status", "statuses": "status", "state": "status",
+    "component": "component", "components": "component", "module": "component", "modules": "component", "area": "component",
+    "platform": "platform", "platforms": "platform", "device": "platform", "devices": "platform", "os": "platform",
+}
+REPORT_TYPE_PATTERNS = {
+    "bug": re.compile(r"\bbugs?\b|\bdefects?\b", re.IGNORECASE),
+    "feedback": re.compile(r"\bfeedbacks?\b|\bcomplain\w*|\breviews?\b|\bcomments?\b", re.IGNORECASE),
+}
+ANY_REPORT_PATTERN = re.compile(r"\breports?\b|\bissues?\b|\btickets?\b|\bentries\b", re.IGNORECASE)
+REPORT_NUMBER_PATTERN = re.compile(r"\b(bug|feedback)\s*(?:#|number\s+|no\.?\s*)?(\d+)\b", re.IGNORECASE)
+
+# Words that shape the query rather than name what the reports must mention
+QUERY_WORDS = STOPWORDS | frozenset(
+    "how many much number count counts total often list show name enumerate give which are is were been being have has "
+    "had there all every each per by breakdown distribution split grouped group across bug bugs defect defects feedback "
+    "feedbacks complaint complaints complain complained complaining review reviews comment comments report reports "
+    "reported issue issues ticket tickets entries severity severities priority priorities status component components "
+    "platform platforms affect affects affecting affected related relate relating regarding mention mentions mentioning "
+    "mentioned involve involves involving concern concerns concerning filed logged raised users user customers customer "
+    "people say says said get gets got getting still also just them they their currently level levels summarize "
+    "summarise summary describe explain tell details detail overview main common key top happen happens happening "
+    "occur occurs occurring appear appears".split()
+)
+
+@dataclass
+class ReportQuery:
+    """A counting, listing or filtering question translated into a query on the report table."""
+
+    # "count", "group" and "list" are answered from the table alone, "prose" hands the matching chunks to generate
+    intent: str
+    report_type: Optional[str] = None
+    filters: dict[str, str] = field(default_factory=dict)
+    number: Optional[int] = None
+    terms: list[str] = field(default_factory=list)
+    group_by: Optional[str] = None
+
+def stem(word: str) -> str:
+    """Strip a plural or verb ending, so that "uploads" also matches "upload" and "uploading" in the report text."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+class ReportQueryRouter:
+    """
+    Local, rule-based router for questions the report table answers better than similarity search:
+    counts ("how many medium severity bugs mention uploads?"), breakdowns ("bugs by severity"),
+    listings ("list the low severity bugs") and lookups by field or number ("what is bug #3 about?").
+
+    Filters are matched against the values actually stored in the table, and the remaining content
+    words of the question become terms the report text must contain. Everything else goes to the
+    regular retrieval path.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"answered": 0, "generated": 0, "fallbacks": 0}
+
+    @staticmethod
+    def _match_filters(question: str, values: dict[str, list[str]]) -> tuple[dict[str, str], str]:
+        """Find the column values a question names; returns them and the question with those words removed."""
+        filters = {}
+        remaining = question
+        for column, column_values in values.items():
+            candidates = set(column_values) | set(SEVERITY_LEVELS) if column == "severity" else set(column_values)
+            # Longest values first, so "search engine" wins over "search"
+            for value in sorted(candidates, key=len, reverse=True):
+                if len(value) < 3:
+                    continue
+                escaped = re.escape(value)
+                if column == "severity":
+                    # A bare "high" or "low" is too ambiguous ("high latency"), so it has to qualify a report or the severity
+                    pattern = (
+                        rf"\b{escaped}[\s-]+(?:severity|priority|bugs?|defects?|issues?|reports?)\b"
+                        rf"|\b(?:severity|priority)\s*(?:is|of|=|:)?\s*{escaped}\b"
+                    )
+                else:
+                    pattern = rf"\b{escaped}\b"
+                match = re.search(pattern, remaining, re.IGNORECASE)
+                if match:
+                    filters[column] = value
+                    remaining = remaining[:match.start()] + " " + re.sub(escaped, " ", match.group(), flags=re.IGNORECASE) + " " + remaining[match.end():]
+                    break
+        return filters, remaining
+
+    def parse(self, question: str, values: dict[str, list[str]]) -> Optional[ReportQuery]:
+        """
+        Translate a question into a report table query when it clearly is one. Words that are neither
+        filter values nor query words are returned as `terms`, which the report text must contain.
+
+        Args:
+            question (str): The user question.
+            values (dict[str, list[str]]): The distinct values of every filter column, see `ReportTable.values`.
+
+        Returns:
+            Optional[ReportQuery]: The query, or None when the question should go through retrieval.
+        """
+        report_types = [report_type for report_type, pattern in REPORT_TYPE_PATTERNS.items() if pattern.search(question)]
+        report_type = report_types[0] if len(report_types) == 1 else None
+        names_reports = bool(report_types) or bool(ANY_REPORT_PATTERN.search(question))
+
+        number = None
+        remaining = question
+        number_match = REPORT_NUMBER_PATTERN.search(question)
+        if number_match:
+            report_type = number_match.group(1).lower()
+            number = int(number_match.group(2))
+            remaining = remaining[:number_match.start()] + " " + remaining[number_match.end():]
+
+        filters, remaining = self._match_filters(remaining, values)
+
+        group_by = next(
+            (
+                COLUMN_ALIASES[column.lower()]
+                for match in GROUP_PATTERN.finditer(question)
+                if (column := match.group("column") or match.group("column_first")).lower() in COLUMN_ALIASES
+            ),
+            None,
+        )
+
+        if group_by and names_reports:
+            intent = "group"
+        elif COUNT_PATTERN.search(question) and names_reports:
+            intent = "count"
+        elif LIST_PATTERN.search(question) and names_reports and number is None:
+            intent = "list"
+        elif (filters or number is not None) and (names_reports or number is not None):
+            intent = "prose"
+        else:
+            return None
+
+        terms = [stem(token) for token in tokenize(remaining) if token not in QUERY_WORDS and len(token) >= 3 and not token.startswith("#")]
+        return ReportQuery(
+            intent=intent,
+            report_type=report_type,
+            filters=filters,
+            number=number,
+            terms=list(dict.fromkeys(terms)),
+            group_by=group_by,
+        )
+
+    def record(self, outcome: str) -> None:
+        """Count a routed question as answered from the table, generated from its chunks, or sent back to retrieval."""
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def stats(self) -> dict:
+        """Return how many questions the report table answered alone, fed to generation, or handed back."""
+        with self._lock:
+            stats = dict(self._stats)
+        # Answered questions skip the relevance check, grading and generation; generated ones skip the first two
+        stats["llm_calls_saved"] = 3 * stats["answered"] + 2 * stats["generated"]
+        return stats
+
+REPORT_TYPE_NAMES = {"bug": ("bug report", "bug reports"), "feedback": ("user feedback entry", "user feedback entries")}
+
+def describe_query(query: ReportQuery, total: int) -> str:
+    """Describe what a query matched, for example '2 bug reports with medium severity mentioning "upload"'."""
+    singular, plural = REPORT_TYPE_NAMES.get(query.report_type, ("report", "reports"))
+    description = f"{total} {singular if total == 1 else plural}" if total else f"no {plural}"
+    conditions = []
+    if query.number is not None:
+        conditions.append(f"numbered #{query.number}")
+    for column, value in query.filters.items():
+        conditions.append(f"with {value} {column}" if column == "severity" else f"with {column} {value}")
+    if query.terms:
+        conditions.append("mentioning " + " and ".join(f'"{term}"' for term in query.terms))
+    return " ".join([description, *conditions])
+
+def report_label(row: dict) -> str:
+    """One line naming a report: "Bug #1: Document Upload Stuck at 99% (severity: medium)"."""
+    if row["title"]:
+        label = f"{row['report_type'].capitalize()} #{row['number']}: {row['title']}" if row["number"] is not None else row["title"]
+    else:
+        # Feedback has no title, so use its first line ("# Feedback #1: I tried uploading ...")
+        label = row["text"].strip().splitlines()[0].lstrip("# ").strip()
+        label = label if len(label) <= 120 else label[:117] + "..."
+    details = [f"{column}: {row[column]}" for column in ("severity", "status", "component", "platform") if row.get(column)]
+    return f"{label} ({', '.join(details)})" if details else label
+
+def render_answer(query: ReportQuery, total: int, rows: list[dict], groups: Optional[list[tuple[Optional[str], int]]] = None) -> str:
+    """
+    Write the answer to a count, group or list query without an LLM call.
+
+    Args:
+        query (ReportQuery): The query.
+        total (int): The number of matching reports.
+        rows (list[dict]): The matching reports to list (possibly fewer than `total`).
+        groups (Optional[list[tuple[Optional[str], int]]]): (value, count) pairs for a group query.
+
+    Returns:
+        str: The answer.
+    """
+    summary = describe_query(query, total)
+    sources = sorted({row["file_name"] for row in rows if row.get("file_name")})
+    source_line = f"\n\nSource: {', '.join(sources)}" if sources else ""
+    if not total:
+        return f"There are {summary} in the ingested reports."
+
+    if query.intent == "group":
+        lines = [f"- {value or 'not specified'}: {count}" for value, count in groups or []]
+        return f"There are {summary}, by {query.group_by}:\n" + "\n".join(lines) + source_line
+
+    lines = [f"- {report_label(row)}" for row in rows]
+    if total > len(rows):
+        lines.append(f"- ... and {total - len(rows)} more")
+    verb = "is" if total == 1 else "are"
+    return f"There {verb} {summary}:\n" + "\n".join(lines) + source_line
+
+__all__ = ["ReportQuery", "ReportQueryRouter", "render_answer", "stem"]
@@ -1,4 +1,6 @@
-from langchain_core.tools import tool
+import threading
+from langchain_core.documents import Document
+from langchain_core.tools import StructuredTool
 from utils.vector import VectorStore
 from dotenv import load_dotenv
 from pathlib import Path
@@ -7,14 +9,45 @@ base_dir = Path(__file__).resolve().parent.parent.parent
 
 load_dotenv()
 
-vector_store_instance = VectorStore()
-retriever = vector_store_instance.get_retriever()
+_vector_store_instance = None
+_vector_store_lock = threading.Lock()
 
-@tool
-def retriever_tool(query: str) -> str:
-    """Tool to retrieve relevant documents based on a query."""
-    docs = retriever.invoke(query)
-    return "\n\n".join([doc.page_content for doc in docs])
+def get_vector_store() -> VectorStore:
+    """Return the shared VectorStore, connecting to Chroma on first use rather than at import time."""
+    global _vector_store_instance
+    if _vector_store_instance is None:
+        with _vector_store_lock:
+            if _vector_store_instance is None:
+                _vector_store_instance = VectorStore()
+    return _vector_store_instance
+
+def _retrieve(query: str, target_source: str = "both") -> list[Document]:
+    """Tool to retrieve relevant documents, with their similarity scores, based on a query."""
+    return get_vector_store().search(query, target_source=target_source)
+
+async def _aretrieve(query: str, target_source: str = "both") -> list[Document]:
+    """Tool to retrieve relevant documents, with their similarity scores, based on a query."""
+    return await get_vector_store().asearch(query, target_source=target_source)
+
+# Sync and async-native implementations, so that ainvoke never blocks the event loop
+retriever_tool = StructuredTool.from_function(
+    func=_retrieve,
+    coroutine=_aretrieve,
+    name="retriever_tool",
+    description="Tool to retrieve relevant documents based on a query, optionally only from bug reports or user feedback."
+)
+
+async def embed_question(question: str) -> list[float]:
+    """Embed a question with the same model used by the retriever."""
+    return await get_vector_store().aembed_query(question)
+
+async def embed_questions(questions: list[str]) -> list[list[float]]:
+    """Embed several questions in one batched embedding call."""
+    return await get_vector_store().embedding_model.aembed_documents(questions)
+
+async def retrieve_by_embedding(question: str, embedding: list[float], target_source: str = "both") -> list[Document]:
+    """Retrieve relevant documents for a question whose embedding is already computed."""
+    return await get_vector_store().asearch(question, embedding=embedding, target_source=target_source)
 
 if __name__ == "__main__":
     sample_query = "Any customer feedback about scrollbar related issues?"
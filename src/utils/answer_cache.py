@@ -0,0 +1,248 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+import numpy as np
+
+@dataclass
+class CachedAnswer:
+    """A cached answer together with the normalized embedding of the question that produced it."""
+
+    answer: str
+    embedding: Optional[np.ndarray]
+    created_at: float
+
+class AnswerCache:
+    """
+    Two-level answer cache placed in front of the RAG pipeline.
+
+    Level one is an exact match on the normalized question. Level two is a semantic match:
+    the cached answer is returned when the cosine similarity between the query embedding and
+    a cached question embedding reaches the configured threshold. Entries expire after a TTL,
+    the least recently used entry is evicted when the cache is full, and the whole cache is
+    dropped when the fingerprint of the ingested reports (for example, an ingestion generation) changes.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_entries: int = 512,
+        similarity_threshold: float = 0.95,
+        fingerprint_fn: Optional[Callable[[], Hashable]] = None,
+        fingerprint_interval_seconds: float = 30,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.fingerprint_fn = fingerprint_fn
+        self.fingerprint_interval_seconds = fingerprint_interval_seconds
+
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+        # Question embeddings, one row per entry that has one, updated in place as entries come and go.
+        # Freed rows are zeroed and reused, so a lookup is a single product over the used rows.
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[Optional[str]] = []
+        self._rows: dict[str, int] = {}
+        self._free_rows: list[int] = []
+        self._fingerprint: Optional[Hashable] = None
+        self._fingerprint_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @classmethod
+    def from_env(cls, fingerprint_fn: Optional[Callable[[], Hashable]] = None) -> "AnswerCache":
+        """Build a cache configured through ANSWER_CACHE_* environment variables."""
+        return cls(
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600)),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 512)),
+            similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95)),
+            fingerprint_fn=fingerprint_fn,
+            fingerprint_interval_seconds=float(os.getenv("ANSWER_CACHE_FINGERPRINT_INTERVAL_SECONDS", 30)),
+        )
+
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """Lowercase the question, collapse whitespace and drop trailing punctuation."""
+        normalized = re.sub(r"\s+", " ", question.strip().lower())
+        return normalized.rstrip("?!. ")
+
+    def refresh_fingerprint(self) -> None:
+        """
+        Drop every entry if the fingerprint of the ingested reports changed since the last check.
+
+        The check runs at most once per `fingerprint_interval_seconds`.
+        """
+        if self.fingerprint_fn is None:
+            return
+
+        now = time.monotonic()
+        if now - self._fingerprint_checked_at < self.fingerprint_interval_seconds:
+            return
+        self._fingerprint_checked_at = now
+
+        try:
+            fingerprint = self.fingerprint_fn()
+        except Exception as e:
+            print(f"An error occurred while reading the collection fingerprint: {e}")
+            return
+
+        with self._lock:
+            if self._fingerprint is not None and fingerprint != self._fingerprint:
+                self._clear()
+                self._stats["invalidations"] += 1
+            self._fingerprint = fingerprint
+
+    def get_exact(self, question: str) -> Optional[str]:
+        """
+        Look up an answer by normalized question. A miss is not counted here: the lookup goes on with
+        `get_semantic`, which counts it once it misses too.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        key = self.normalize_question(question)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return entry.answer
+
+    def get_semantic(self, embedding: list[float]) -> Optional[str]:
+        """
+        Look up an answer by similarity to previously answered questions. This is the last level of a
+        lookup, so it counts the miss of a question that neither level answers.
+
+        Args:
+            embedding (list[float]): The query embedding.
+
+        Returns:
+            Optional[str]: The answer of the most similar unexpired cached question above the threshold, or None.
+        """
+        query = self._normalize_vector(embedding)
+        with self._lock:
+            if self._matrix is not None and query is not None and query.shape == self._matrix.shape[1:]:
+                similarities = self._matrix[:len(self._matrix_keys)] @ query
+                candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+                # Most similar first, skipping entries that have expired since
+                for row in candidates[np.argsort(-similarities[candidates])]:
+                    key = self._matrix_keys[row]
+                    entry = self._live_entry(key) if key is not None else None
+                    if entry is not None:
+                        self._entries.move_to_end(key)
+                        self._stats["semantic_hits"] += 1
+                        return entry.answer
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, question: str, embedding: Optional[list[float]], answer: str) -> None:
+        """
+        Store an answer, evicting the least recently used entry when the cache is full.
+
+        Args:
+            question (str): The user question.
+            embedding (Optional[list[float]]): The query embedding, if one was computed.
+            answer (str): The generated answer.
+        """
+        key = self.normalize_question(question)
+        vector = self._normalize_vector(embedding)
+        with self._lock:
+            self._entries[key] = CachedAnswer(answer=answer, embedding=vector, created_at=time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._remove_row(evicted)
+                self._stats["evictions"] += 1
+            # After evicting, so that the new entry can reuse a freed row
+            if key in self._entries:
+                self._set_row(key, vector)
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters, the hit rate and the current size of the cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _live_entry(self, key: str) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            self._remove_row(key)
+            self._stats["expirations"] += 1
+            return None
+        return entry
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_keys = []
+        self._rows.clear()
+        self._free_rows.clear()
+
+    def _set_row(self, key: str, vector: Optional[np.ndarray]) -> None:
+        """Write an entry's question embedding into its row of the similarity matrix, taking a free row if it has none."""
+        if vector is None:
+            self._remove_row(key)
+            return
+        if self._matrix is None or self._matrix.shape[1] != len(vector):
+            # First embedding, or the embedding model changed: the old rows cannot be compared with the new ones
+            self._matrix = np.zeros((min(16, self.max_entries), len(vector)), dtype=np.float32)
+            self._matrix_keys = []
+            self._rows.clear()
+            self._free_rows.clear()
+
+        row = self._rows.get(key)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = len(self._matrix_keys)
+                if row == len(self._matrix):
+                    # Grow geometrically, up to one row per entry the cache can hold
+                    grown = np.zeros((min(2 * len(self._matrix), self.max_entries), self._matrix.shape[1]), dtype=np.float32)
+                    grown[:row] = self._matrix
+                    self._matrix = grown
+                self._matrix_keys.append(None)
+            self._rows[key] = row
+            self._matrix_keys[row] = key
+        self._matrix[row] = vector
+
+    def _remove_row(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._matrix[row] = 0.0
+            self._matrix_keys[row] = None
+            self._free_rows.append(row)
+
+    @staticmethod
+    def _normalize_vector(embedding: Optional[list[float]]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
@@ -0,0 +1,213 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from langchain_core.documents import Document
+
+BM25_INDEX_FILE = "bm25_index.json"
+
+# Keeps the exact tokens bug reports are full of: "#12", "99%", "err-504", "v2.3"
+TOKEN_PATTERN = re.compile(r"#\d+|\d+(?:\.\d+)*%?|[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+# Query tokens that identify something precisely enough to trust a lexical match on its own
+EXACT_TOKEN_PATTERN = re.compile(r"^(#\d+|\d+(?:\.\d+)*%?|[a-z]+[-_]?\d+[a-z0-9-_]*)$")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the there this to was were "
+    "what when where which who why will with any about do does did can me my we our you your".split()
+)
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase and tokenize text for BM25, keeping identifiers such as "#12", "99%" and error codes intact.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The tokens, without stopwords.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if token.startswith("#"):
+            # "Bug #12" should also match a question about "bug 12"
+            tokens.append(token[1:])
+    return tokens
+
+def exact_tokens(query: str) -> set[str]:
+    """Return the query tokens that look like identifiers (report numbers, percentages, error codes)."""
+    return {token for token in tokenize(query) if EXACT_TOKEN_PATTERN.match(token)}
+
+class BM25Index:
+    """
+    In-memory inverted BM25 index over the ingested chunks.
+
+    Only chunk texts and metadata are persisted (as JSON next to the Chroma database); the
+    postings are rebuilt on load. Chunks can be added and removed incrementally.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: dict[str, dict] = {}
+        self.postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, doc_id: str, text: str, metadata: dict | None = None) -> None:
+        """Add or replace a chunk."""
+        with self._lock:
+            self.remove(doc_id)
+            term_counts = Counter(tokenize(text))
+            for term, count in term_counts.items():
+                self.postings[term][doc_id] = count
+            length = sum(term_counts.values())
+            self.documents[doc_id] = {"text": text, "metadata": metadata or {}, "length": length}
+            self.total_length += length
+
+    def add_documents(self, documents: list[Document]) -> None:
+        """Add or replace chunks that carry their ID in `Document.id`."""
+        for doc in documents:
+            self.add(doc.id, doc.page_content, doc.metadata)
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a chunk if it is indexed."""
+        with self._lock:
+            entry = self.documents.pop(doc_id, None)
+            if entry is None:
+                return
+            for term in set(tokenize(entry["text"])):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= entry["length"]
+
+    def search(self, query: str, k: int = 3, where: dict | None = None) -> list[Document]:
+        """
+        Rank chunks against a query with BM25.
+
+        Args:
+            query (str): The query text.
+            k (int): Number of chunks to return.
+            where (dict | None): Optional exact-match metadata filter, for example {"file_name": "..."}.
+
+        Returns:
+            list[Document]: The best matching chunks, with the BM25 score in metadata["bm25_score"].
+        """
+        with self._lock:
+            n_docs = len(self.documents)
+            if not n_docs:
+                return []
+            average_length = self.total_length / n_docs
+
+            scores: dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    length = self.documents[doc_id]["length"]
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+
+            if where:
+                scores = {
+                    doc_id: score for doc_id, score in scores.items()
+                    if all(self.documents[doc_id]["metadata"].get(key) == value for key, value in where.items())
+                }
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [
+                Document(
+                    id=doc_id,
+                    page_content=self.documents[doc_id]["text"],
+                    metadata={**self.documents[doc_id]["metadata"], "bm25_score": round(score, 4)},
+                )
+                for doc_id, score in ranked
+            ]
+
+    def save(self, path: str | Path) -> None:
+        """Persist the indexed chunks atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with self._lock:
+            payload = {doc_id: {"text": entry["text"], "metadata": entry["metadata"]} for doc_id, entry in self.documents.items()}
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BM25Index":
+        """Load persisted chunks and rebuild the postings."""
+        index = cls()
+        with open(path) as f:
+            for doc_id, entry in json.load(f).items():
+                index.add(doc_id, entry["text"], entry["metadata"])
+        return index
+
+    @classmethod
+    def from_collection(cls, collection) -> "BM25Index":
+        """Build an index over every chunk of a Chroma collection."""
+        index = cls()
+        results = collection.get(include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(results["ids"], results["documents"], results["metadatas"]):
+            index.add(doc_id, text or "", metadata or {})
+        return index
+
+    @classmethod
+    def load_or_build(cls, path: str | Path, collection) -> "BM25Index":
+        """Load the persisted index, or build it from the collection (and persist it) when there is none."""
+        path = Path(path)
+        if path.exists():
+            try:
+                return cls.load(path)
+            except (OSError, ValueError) as e:
+                print(f"Rebuilding unreadable BM25 index {path}: {e}")
+        index = cls.from_collection(collection)
+        index.save(path)
+        return index
+
+def reciprocal_rank_fusion(ranked_lists: list[list[Document]], k: int = 60) -> list[Document]:
+    """
+    Fuse several rankings with reciprocal rank fusion.
+
+    Args:
+        ranked_lists (list[list[Document]]): Rankings of chunks, best first.
+        k (int): RRF damping constant.
+
+    Returns:
+        list[Document]: Chunks ordered by fused score, stored in metadata["rrf_score"] and metadata["score"].
+        Scores from the individual rankings (for example "bm25_score") are merged into the metadata.
+    """
+    fused: dict[str, Document] = {}
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in ranked_lists:
+        for rank, doc in enumerate(ranking):
+            key = doc.id or doc.page_content
+            scores[key] += 1 / (k + rank + 1)
+            if key in fused:
+                fused[key].metadata.update({name: value for name, value in doc.metadata.items() if name not in fused[key].metadata})
+            else:
+                fused[key] = doc
+
+    ordered = sorted(fused, key=lambda key: scores[key], reverse=True)
+    documents = []
+    for key in ordered:
+        doc = fused[key]
+        if "score" in doc.metadata and "vector_score" not in doc.metadata:
+            doc.metadata["vector_score"] = doc.metadata["score"]
+        doc.metadata["rrf_score"] = round(scores[key], 6)
+        doc.metadata["score"] = doc.metadata["rrf_score"]
+        documents.append(doc)
+    return documents
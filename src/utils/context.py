@@ -0,0 +1,216 @@
+import hashlib
+import os
+import re
+import threading
+from langchain_core.documents import Document
+from utils.bm25 import tokenize
+from utils.report_table import FIELD_PATTERN, MAX_LABEL_WORDS
+
+DEFAULT_MAX_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", 3000))
+TOKENIZER_MODEL = os.getenv("RAG_TOKENIZER_MODEL", "gpt-4o")
+SECTION_EXTRACTION = os.getenv("RAG_CONTEXT_SECTION_EXTRACTION", "true").lower() == "true"
+# Sections that identify a report and are kept whatever the question
+ALWAYS_KEEP_SECTIONS = frozenset(
+    label.strip().lower() for label in os.getenv("RAG_CONTEXT_ALWAYS_KEEP", "title,summary,severity").split(",") if label.strip()
+)
+
+# A section starts at a markdown subheader ("## Steps to reproduce") or a bold label at the start of a line ("**Severity:** High"),
+# or at a "Label: value" field line as the converted report files have them ("Severity: Medium", "Steps to Reproduce:")
+SECTION_PATTERN = re.compile(r"^(?:#{2,6}[ \t]+(?P<header>[^\n]+?)[ \t]*$|\*\*(?P<label>[^*\n]+?)\*\*)", re.MULTILINE)
+# Question words too generic to tell sections of a report apart
+GENERIC_QUESTION_TERMS = frozenset(
+    "bug bugs report reports feedback user users customer customers issue issues problem problems any there "
+    "tell show list give know say says said".split()
+)
+
+_encoding = None
+_encoding_unavailable = False
+_encoding_lock = threading.Lock()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the number of tokens in a text (about four characters per token for English).
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return (len(text) + 3) // 4
+
+def get_encoding():
+    """
+    Return the tiktoken encoding of the generation model, loading it on first use (`warm_rag_graph` loads
+    it at startup, so that no request waits for it).
+
+    Returns:
+        tiktoken.Encoding | None: The encoding, or None when tiktoken or its encoding files are unavailable.
+    """
+    global _encoding, _encoding_unavailable
+    if _encoding is None and not _encoding_unavailable:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_unavailable:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+                except Exception as e:
+                    _encoding_unavailable = True
+                    print(f"tiktoken encoding for {TOKENIZER_MODEL} is unavailable, estimating token counts instead: {e}")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the tiktoken encoding of the generation model, falling back to
+    `estimate_tokens` when tiktoken or its encoding files are unavailable (for example, offline).
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The token count.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def split_sections(text: str) -> tuple[str, list[tuple[str, str]]]:
+    """
+    Split a chunk into the text before its first section and its labelled sections.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        tuple[str, list[tuple[str, str]]]: The preamble (usually the "# Bug #N" heading) and
+        (lowercased label, section text) pairs in order.
+    """
+    starts = {match.start(): match.group("header") or match.group("label") for match in SECTION_PATTERN.finditer(text)}
+    for match in FIELD_PATTERN.finditer(text):
+        if len(match.group("label").split()) <= MAX_LABEL_WORDS:
+            starts.setdefault(match.start(), match.group("label"))
+    if not starts:
+        return text, []
+    positions = sorted(starts)
+    sections = []
+    for start, end in zip(positions, positions[1:] + [len(text)]):
+        label = starts[start].strip().rstrip(":").strip().lower()
+        sections.append((label, text[start:end]))
+    return text[:positions[0]], sections
+
+def extract_relevant_sections(text: str, question: str) -> str:
+    """
+    Keep only the sections of a chunk that relate to the question, plus the sections that identify
+    the report (see RAG_CONTEXT_ALWAYS_KEEP). Chunks without sections, or where no section matches
+    the question, are kept whole.
+
+    Args:
+        text (str): The chunk text.
+        question (str): The user question.
+
+    Returns:
+        str: The compressed chunk text.
+    """
+    preamble, sections = split_sections(text)
+    question_terms = set(tokenize(question)) - GENERIC_QUESTION_TERMS
+    if len(sections) < 2 or not question_terms:
+        return text
+
+    kept = []
+    matched = False
+    for label, section in sections:
+        if question_terms & set(tokenize(section)):
+            kept.append(section)
+            matched = True
+        elif label in ALWAYS_KEEP_SECTIONS:
+            kept.append(section)
+    if not matched:
+        return text
+    return (preamble + "".join(kept)).strip()
+
+def _content_key(doc: Document) -> str:
+    normalized = re.sub(r"\s+", " ", doc.page_content).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def dedupe_documents(documents: list[Document]) -> list[Document]:
+    """
+    Drop chunks whose text is identical, keeping the copy with the highest score.
+
+    Args:
+        documents (list[Document]): The retrieved chunks.
+
+    Returns:
+        list[Document]: The unique chunks, in their original order.
+    """
+    best: dict[str, Document] = {}
+    for doc in documents:
+        key = _content_key(doc)
+        if key not in best or doc.metadata.get("score", 0.0) > best[key].metadata.get("score", 0.0):
+            best[key] = doc
+    kept = {id(doc) for doc in best.values()}
+    return [doc for doc in documents if id(doc) in kept]
+
+SOURCE_TYPE_LABELS = {"bug": "bug report", "feedback": "user feedback"}
+
+def format_document(doc: Document) -> str:
+    """Format a chunk together with the source file it came from and the kind of report it is."""
+    source = doc.metadata.get("file_name", "unknown")
+    label = SOURCE_TYPE_LABELS.get(doc.metadata.get("source_type"))
+    if label:
+        source = f"{source}, {label}"
+    return f"[Source: {source}]\n{doc.page_content.strip()}"
+
+def assemble_context(
+    documents: list[Document],
+    question: str | None = None,
+    max_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS,
+) -> tuple[str, dict]:
+    """
+    Build the generation context from retrieved chunks: dedupe them, order them by score, reduce
+    each one to the sections relevant to the question and add them, with their source, until the
+    token budget is used up.
+
+    Args:
+        documents (list[Document]): The retrieved chunks.
+        question (str | None): The user question. Without it, chunks are kept whole.
+        max_tokens (int): Token budget for the whole context.
+
+    Returns:
+        tuple[str, dict]: The context string, and token counts: the full chunks (original_tokens),
+        the context (context_tokens), the difference (tokens_saved) and the chunks used out of the retrieved ones.
+    """
+    ranked = sorted(dedupe_documents(documents), key=lambda doc: doc.metadata.get("score", 0.0), reverse=True)
+
+    blocks = []
+    used_tokens = 0
+    original_tokens = 0
+    for doc in ranked:
+        original_tokens += count_tokens(format_document(doc))
+        if question and SECTION_EXTRACTION:
+            doc = Document(id=doc.id, page_content=extract_relevant_sections(doc.page_content, question), metadata=doc.metadata)
+        block = format_document(doc)
+        block_tokens = count_tokens(block)
+        if used_tokens + block_tokens > max_tokens:
+            continue
+        blocks.append(block)
+        used_tokens += block_tokens
+
+    stats = {
+        "original_tokens": original_tokens,
+        "context_tokens": used_tokens,
+        "tokens_saved": original_tokens - used_tokens,
+        "chunks": len(documents),
+        "chunks_used": len(blocks),
+    }
+    return "\n\n".join(blocks), stats
+
+def build_context(documents: list[Document], max_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS, question: str | None = None) -> str:
+    """
+    Build the generation context from retrieved chunks. See `assemble_context`.
+
+    Returns:
+        str: The context string.
+    """
+    return assemble_context(documents, question=question, max_tokens=max_tokens)[0]
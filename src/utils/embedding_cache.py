@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# SQLite caps the number of bound parameters per statement
+_LOOKUP_BATCH_SIZE = 500
+# Hits update last_used in batches: after this many hits or seconds, whichever comes first
+_TOUCH_BATCH_SIZE = 256
+_TOUCH_INTERVAL_SECONDS = 60.0
+# Other processes add to the same file, so the running entry count is re-read after this many inserts
+_RECOUNT_EVERY = 1_000
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent embedding cache wrapped around another embedding model.
+
+    Vectors are stored as float32 blobs in SQLite, keyed by (model name, SHA-256 of the text).
+    Lookups are batch-aware: only the texts missing from the cache are sent to the wrapped
+    model, in a single batched call. The least recently used vectors are evicted once the
+    cache holds more than `max_entries` vectors.
+
+    Reads stay read-only: the last use of a hit is recorded in memory and written in batches, and the
+    entry count is kept as a running total. A cache file that stays locked for longer than
+    `busy_timeout` seconds is treated as a miss rather than failing the embedding call.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, path: str | Path, max_entries: int = 200_000, busy_timeout: float = 5.0):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=busy_timeout)
+        # WAL lets the ingestion process and the backend workers share the cache file
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._connection.commit()
+        (self._count,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        self._inserts_since_count = 0
+        # text_hash -> time of its last hit, not yet written
+        self._touched: dict[str, float] = {}
+        self._touched_since = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+    @staticmethod
+    def _to_float32(vector: list[float]) -> list[float]:
+        # Fresh vectors are rounded like stored ones, so a text embeds the same way on a hit and a miss
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _flush_touched(self) -> None:
+        # Called with the lock held; the caller commits
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(last_used, self.model_name, text_hash) for text_hash, last_used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_since = time.monotonic()
+
+    def _lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            try:
+                for start in range(0, len(hashes), _LOOKUP_BATCH_SIZE):
+                    batch = hashes[start:start + _LOOKUP_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._connection.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                        [self.model_name, *batch],
+                    ).fetchall()
+                    for text_hash, vector in rows:
+                        found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+                self._touched.update((text_hash, now) for text_hash in found)
+                if len(self._touched) >= _TOUCH_BATCH_SIZE or time.monotonic() - self._touched_since >= _TOUCH_INTERVAL_SECONDS:
+                    self._flush_touched()
+                    self._connection.commit()
+            except sqlite3.OperationalError as e:
+                # A locked or unreadable cache only costs the embedding calls it would have saved
+                self._connection.rollback()
+                self._stats["errors"] += 1
+                print(f"Embedding cache lookup failed, embedding without it: {e}")
+        return found
+
+    def _store(self, vectors: dict[str, list[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                # A text always embeds to the same vector with the same model, so a row another process added wins
+                cursor = self._connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [
+                        (self.model_name, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                        for text_hash, vector in vectors.items()
+                    ],
+                )
+                self._count += max(cursor.rowcount, 0)
+                self._inserts_since_count += max(cursor.rowcount, 0)
+                self._flush_touched()
+                if self._count > self.max_entries or self._inserts_since_count >= _RECOUNT_EVERY:
+                    (self._count,) = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                    self._inserts_since_count = 0
+                if self._count > self.max_entries:
+                    excess = self._count - self.max_entries
+                    self._connection.execute(
+                        """
+                        DELETE FROM embeddings WHERE (model, text_hash) IN (
+                            SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?
+                        )
+                        """,
+                        (excess,),
+                    )
+                    self._count -= excess
+                    self._stats["evictions"] += excess
+                self._connection.commit()
+            except sqlite3.OperationalError as e:
+                self._connection.rollback()
+                self._stats["errors"] += 1
+                print(f"Embedding cache write failed, the vectors are not cached: {e}")
+
+    def _split(self, texts: list[str]) -> tuple[list[str], dict[str, list[float]], list[str]]:
+        """Return the hash of every text, the cached vectors and the unique texts to embed."""
+        hashes = [self._hash(text) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(hashes)))
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+
+        hits = len(texts) - sum(1 for text_hash in hashes if text_hash not in cached)
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(missing)
+        return hashes, cached, list(missing.values())
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, sending only cache misses to the wrapped model in one batch."""
+        hashes, vectors, missing_texts = self._split(texts)
+        if missing_texts:
+            embedded = self.embeddings.embed_documents(missing_texts)
+            fresh = {self._hash(text): self._to_float32(vector) for text, vector in zip(missing_texts, embedded)}
+            self._store(fresh)
+            vectors.update(fresh)
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, serving it from the cache when it was embedded before."""
+        hashes, vectors, missing_texts = self._split([text])
+        if missing_texts:
+            vectors[hashes[0]] = self._to_float32(self.embeddings.embed_query(text))
+            self._store({hashes[0]: vectors[hashes[0]]})
+        return vectors[hashes[0]]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Async version of `embed_documents`; cache reads and writes run off the event loop."""
+        hashes, vectors, missing_texts = await asyncio.to_thread(self._split, texts)
+        if missing_texts:
+            embedded = await self.embeddings.aembed_documents(missing_texts)
+            fresh = {self._hash(text): self._to_float32(vector) for text, vector in zip(missing_texts, embedded)}
+            await asyncio.to_thread(self._store, fresh)
+            vectors.update(fresh)
+        return [vectors[text_hash] for text_hash in hashes]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Async version of `embed_query`."""
+        hashes, vectors, missing_texts = await asyncio.to_thread(self._split, [text])
+        if missing_texts:
+            vectors[hashes[0]] = self._to_float32(await self.embeddings.aembed_query(text))
+            await asyncio.to_thread(self._store, {hashes[0]: vectors[hashes[0]]})
+        return vectors[hashes[0]]
+
+    def stats(self) -> dict:
+        """Return cache hit/miss/eviction/error counters and the number of cached vectors."""
+        with self._lock:
+            return {**self._stats, "entries": self._count}
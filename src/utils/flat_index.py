@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+load_dotenv()
+
+FLAT_INDEX_FILE = "flat_index.json"
+FLAT_INDEX_VERSION = 1
+# Metadata keys stored as categorical code arrays, so that `where` filters on them are vectorized
+FILTER_COLUMNS = ("source_type", "file_name")
+# Rows scored per block, which bounds the float32 scratch memory for int8 matrices
+SCORE_BLOCK_ROWS = 16_384
+
+class FlatIndex:
+    """
+    Exact (brute-force) cosine similarity index over the chunk embeddings, stored next to the
+    Chroma database as a contiguous float32 or int8 NumPy matrix.
+
+    The matrix and the row store (texts and metadata) are memory-mapped read-only, so every worker
+    process on a host shares one copy through the page cache. Top k uses a matrix product and
+    `argpartition`; several queries can be scored in one product.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        with open(self.directory / FLAT_INDEX_FILE) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FLAT_INDEX_VERSION:
+            raise ValueError(f"Unsupported flat index version {self.meta.get('version')}")
+
+        prefix = self.directory / f"flat_index.{self.meta['generation']}"
+        self.vectors = np.load(f"{prefix}.vectors.npy", mmap_mode="r")
+        self.scales = np.load(f"{prefix}.scales.npy", mmap_mode="r") if self.meta["dtype"] == "int8" else None
+        self.offsets = np.load(f"{prefix}.offsets.npy", mmap_mode="r")
+        self.rows = np.memmap(f"{prefix}.rows.bin", dtype=np.uint8, mode="r") if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+        with np.load(f"{prefix}.columns.npz") as columns:
+            self.columns = {name: columns[name] for name in columns.files}
+        self._masks: dict[tuple, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    @property
+    def dimensions(self) -> int:
+        return self.meta["dimensions"]
+
+    def _row(self, index: int) -> dict:
+        return json.loads(bytes(self.rows[self.offsets[index]:self.offsets[index + 1]]))
+
+    def ids(self, indices) -> list[str]:
+        """Return the chunk IDs of row indices, for example those of `scores` entries."""
+        return [self._row(int(index))["id"] for index in indices]
+
+    def _mask(self, where: dict | None) -> np.ndarray | None:
+        """Boolean mask of the rows matching an exact-match metadata filter."""
+        if not where:
+            return None
+        key = tuple(sorted(where.items()))
+        with self._lock:
+            mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in where.items():
+            if name in self.columns:
+                categories = self.meta["columns"][name]
+                code = categories.index(value) if value in categories else -1
+                mask &= self.columns[name] == code
+            else:
+                # Not a stored column, so decode every row once for this filter
+                mask &= np.array([self._row(i)["metadata"].get(name) == value for i in range(len(self))], dtype=bool)
+        with self._lock:
+            self._masks[key] = mask
+        return mask
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of every row with every query.
+
+        Args:
+            queries (np.ndarray): Query embeddings, shape (n_queries, dimensions).
+
+        Returns:
+            np.ndarray: Scores, shape (n_queries, rows).
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if self.scales is None:
+            return queries @ self.vectors.T
+
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = (queries @ block.T) * self.scales[start:start + len(block)]
+        return scores
+
+    def search(self, queries: np.ndarray | list, k: int = 3, where: dict | None = None) -> list[list[Document]]:
+        """
+        Top-k search for one or more query embeddings.
+
+        Args:
+            queries (np.ndarray | list): Query embeddings, shape (n_queries, dimensions).
+            k (int): Number of chunks per query.
+            where (dict | None): Optional exact-match metadata filter, for example {"source_type": "bug"}.
+
+        Returns:
+            list[list[Document]]: For each query, the best chunks with the cosine similarity in
+            metadata["score"] and 1 - similarity in metadata["distance"].
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not len(self):
+            return [[] for _ in queries]
+
+        scores = self.scores(queries)
+        mask = self._mask(where)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in queries]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-query_scores[candidates])]
+            documents = []
+            for index in ranked:
+                row = self._row(int(index))
+                score = float(query_scores[index])
+                metadata = {**row["metadata"], "score": round(score, 4), "distance": round(1 - score, 6)}
+                documents.append(Document(id=row["id"], page_content=row["text"], metadata=metadata))
+            results.append(documents)
+        return results
+
+    @staticmethod
+    def build(
+        directory: str | Path,
+        ids: list[str],
+        embeddings,
+        documents: list[str],
+        metadatas: list[dict],
+        dtype: str = "float32",
+    ) -> "FlatIndex":
+        """
+        Write a new index generation and switch readers to it atomically. Generations are named in build
+        order, so that concurrent builds (ingestion and the CLI) never switch back to an older generation
+        or delete the files of a newer one that is still being written.
+
+        Args:
+            directory (str | Path): Directory of the index files (the Chroma persist directory).
+            ids (list[str]): Chunk IDs.
+            embeddings: Chunk embeddings, shape (rows, dimensions).
+            documents (list[str]): Chunk texts.
+            metadatas (list[dict]): Chunk metadata.
+            dtype (str): "float32", or "int8" for a quarter of the size with per-row scales.
+
+        Returns:
+            FlatIndex: The new index.
+        """
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported flat index dtype {dtype}")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        generation = f"{time.time_ns():016x}{uuid.uuid4().hex[:6]}"
+        prefix = directory / f"flat_index.{generation}"
+
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if dtype == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1, initial=0.0), 1e-12) / 127
+            np.save(f"{prefix}.scales.npy", scales.astype(np.float32))
+            vectors = np.round(vectors / scales[:, None]).astype(np.int8)
+        np.save(f"{prefix}.vectors.npy", vectors)
+
+        offsets = [0]
+        with open(f"{prefix}.rows.bin", "wb") as f:
+            for chunk_id, text, metadata in zip(ids, documents, metadatas):
+                row = json.dumps({"id": chunk_id, "text": text or "", "metadata": metadata or {}}).encode("utf-8")
+                f.write(row)
+                offsets.append(offsets[-1] + len(row))
+        np.save(f"{prefix}.offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+        categories = {}
+        codes = {}
+        for name in FILTER_COLUMNS:
+            values = [(metadata or {}).get(name) for metadata in metadatas]
+            categories[name] = sorted({value for value in values if value is not None})
+            lookup = {value: code for code, value in enumerate(categories[name])}
+            codes[name] = np.asarray([lookup.get(value, -1) for value in values], dtype=np.int32)
+        np.savez(f"{prefix}.columns.npz", **codes)
+
+        meta = {
+            "version": FLAT_INDEX_VERSION,
+            "generation": generation,
+            "dtype": dtype,
+            "dimensions": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "count": len(ids),
+            "columns": categories,
+        }
+        current = _current_generation(directory)
+        if current is not None and _build_order(current) > _build_order(generation):
+            # A build that started later has already finished, and its index is the newer one
+            _remove_generations(directory, lambda other: other == generation)
+            return FlatIndex(directory)
+
+        tmp_path = directory / f"{FLAT_INDEX_FILE}.{generation}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, directory / FLAT_INDEX_FILE)
+
+        # Readers that still map an older generation keep their open files, so they can be unlinked now
+        _remove_generations(directory, lambda other: _build_order(other) < _build_order(generation))
+        return FlatIndex(directory)
+
+    @classmethod
+    def build_from_collection(cls, directory: str | Path, collection, dtype: str = "float32", page_size: int = 5_000) -> "FlatIndex":
+        """
+        Build the index from every chunk of a Chroma collection, reading it page by page.
+
+        Args:
+            directory (str | Path): Directory of the index files (the Chroma persist directory).
+            collection (chromadb.Collection): The Chroma collection.
+            dtype (str): "float32" or "int8".
+            page_size (int): Chunks read from Chroma per call.
+
+        Returns:
+            FlatIndex: The new index.
+        """
+        ids, embeddings, documents, metadatas = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        return cls.build(directory, ids, embeddings, documents, metadatas, dtype=dtype)
+
+def _build_order(generation: str) -> int:
+    """Build time of a generation in nanoseconds; generations named before they carried it sort first."""
+    try:
+        return int(generation[:16], 16) if len(generation) == 22 else -1
+    except ValueError:
+        return -1
+
+def _current_generation(directory: Path) -> str | None:
+    try:
+        with open(directory / FLAT_INDEX_FILE) as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+
+def _remove_generations(directory: Path, should_remove) -> None:
+    """Unlink the files of every index generation for which `should_remove(generation)` is true."""
+    for path in directory.glob("flat_index.*.*"):
+        if path.name.startswith(f"{FLAT_INDEX_FILE}."):
+            continue
+        if should_remove(path.name.split(".")[1]):
+            path.unlink(missing_ok=True)
+
+def refresh_flat_index(directory: str | Path, collection) -> FlatIndex | None:
+    """
+    Rebuild the flat index after ingestion changed the collection, if the flat backend is enabled
+    or an index already exists (which would otherwise go stale). An existing index keeps its dtype.
+
+    Args:
+        directory (str | Path): Directory of the index files (the Chroma persist directory).
+        collection (chromadb.Collection): The Chroma collection.
+
+    Returns:
+        FlatIndex | None: The rebuilt index, or None when there is nothing to keep in step.
+    """
+    meta_path = Path(directory) / FLAT_INDEX_FILE
+    if os.getenv("RETRIEVAL_BACKEND", "chroma").lower() != "flat" and not meta_path.exists():
+        return None
+    dtype = os.getenv("FLAT_INDEX_DTYPE", "float32").lower()
+    if meta_path.exists():
+        with open(meta_path) as f:
+            dtype = json.load(f).get("dtype", dtype)
+    return FlatIndex.build_from_collection(directory, collection, dtype=dtype)
+
+def main() -> None:
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Build the memory-mapped flat vector index from the Chroma collection.")
+    parser.add_argument("--collection", default=os.getenv("CHROMA_COLLECTION_NAME", "bug_and_feedback_reports"))
+    parser.add_argument("--persist-dir", default=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))
+    parser.add_argument("--dtype", choices=["float32", "int8"], default=os.getenv("FLAT_INDEX_DTYPE", "float32"))
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.persist_dir).get_collection(args.collection)
+    index = FlatIndex.build_from_collection(args.persist_dir, collection, dtype=args.dtype)
+    print(f"Built {args.dtype} flat index with {len(index)} chunks of {index.dimensions} dimensions in {args.persist_dir}")
+
+if __name__ == "__main__":
+    main()
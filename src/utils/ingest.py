@@ -1,21 +1,24 @@
 import chromadb
+import os
 import re
 import hashlib
 from langchain_chroma import Chroma
-from utils.llm import EmbeddingModel
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PaginatedPipelineOptions
-from docling.document_converter import DocumentConverter, WordFormatOption
 from dotenv import load_dotenv
 from pathlib import Path
+from typing import TYPE_CHECKING
+from langchain_core.documents import Document
 from langchain_text_splitters import MarkdownHeaderTextSplitter
-from pathlib import Path
-from docling.datamodel.base_models import InputFormat
-from docling.datamodel.pipeline_options import PaginatedPipelineOptions
-from docling.document_converter import DocumentConverter, WordFormatOption
+from utils.bm25 import BM25_INDEX_FILE, BM25Index
+from utils.flat_index import refresh_flat_index
+from utils.report_table import REPORT_HEADER_PATTERN, refresh_report_table
+
+if TYPE_CHECKING:
+    from docling.document_converter import DocumentConverter
 
 load_dotenv()
 
+HASH_BLOCK_SIZE = 1024 * 1024
+
 def get_file_hash(file_path: Path) -> str:
     """
     Generate an MD5 hash of a file's contents.
@@ -28,29 +31,45 @@ def get_file_hash(file_path: Path) -> str:
     """
     hasher = hashlib.md5()
     with open(file_path, "rb") as f:
-        buf = f.read()
-        hasher.update(buf)
+        # Hash in fixed-size blocks so large reports are never fully loaded into memory
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
     return hasher.hexdigest()
 
-def convert_docx_to_markdown(doc_path: Path) -> str:
+def build_docx_converter() -> "DocumentConverter":
+    """
+    Build a docling converter for DOCX files. Building one is expensive, so reuse it across files.
+
+    Returns:
+        DocumentConverter: The converter.
+    """
+    # docling is slow to import, so only load it once there is a file to convert
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PaginatedPipelineOptions
+    from docling.document_converter import DocumentConverter, WordFormatOption
+
+    pipeline_options = PaginatedPipelineOptions()
+    return DocumentConverter(
+        format_options={
+            InputFormat.DOCX: WordFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+def convert_docx_to_markdown(doc_path: Path, converter: "DocumentConverter | None" = None) -> str:
     """
     Convert a DOCX document to a normalized markdown string suitable for
     structured chunking (For example, Bug or Feedback reports).
 
     Args:
         doc_path (Path): Path to the DOCX file.
+        converter (DocumentConverter | None): Converter to reuse. A new one is built when omitted.
 
     Returns:
         str: Clean, markdown-formatted content.
     """
     print(f"Converting DOCX to Markdown: {doc_path}")
 
-    pipeline_options = PaginatedPipelineOptions()
-    converter = DocumentConverter(
-        format_options={
-            InputFormat.DOCX: WordFormatOption(pipeline_options=pipeline_options)
-        }
-    )
+    converter = converter or build_docx_converter()
 
     result = converter.convert(doc_path)
     document = result.document
@@ -67,13 +86,52 @@ def convert_docx_to_markdown(doc_path: Path) -> str:
     return markdown_text
 
 
+def get_chunk_id(chunk: Document) -> str:
+    """
+    Generate a stable, content-addressed ID for a chunk from its source file, header and text.
+
+    Args:
+        chunk (Document): The document chunk.
+
+    Returns:
+        str: The SHA-256 hex digest identifying the chunk.
+    """
+    hasher = hashlib.sha256()
+    for part in (chunk.metadata.get("file_name", ""), chunk.metadata.get("Header 1", ""), chunk.page_content):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+def get_source_type(file_name: str, header: str = "") -> str:
+    """
+    Classify a chunk as a bug report or user feedback, from its header ("Bug #3", "Feedback #7") or else its file name.
+    Only the report header counts, so "Feedback #50: ... the app feels a bit buggy" is feedback.
+
+    Args:
+        file_name (str): The name of the source file.
+        header (str): The chunk's "Header 1" metadata.
+
+    Returns:
+        str: 'bug', 'feedback' or 'other'.
+    """
+    match = REPORT_HEADER_PATTERN.match(header)
+    if match:
+        return match.group(1).lower()
+    file_name = file_name.lower()
+    if "bug" in file_name:
+        return "bug"
+    if "feedback" in file_name:
+        return "feedback"
+    return "other"
+
 def split_markdown(markdown_text: str, file_name: str, file_hash: str):
     """
-    Split markdown into chunks and add file name to metadata.
+    Split markdown into chunks, add file name and source type to metadata and assign stable chunk IDs.
     
     Args:
         markdown_text (str): The markdown content to split.
         file_name (str): The name of the source file.
+        file_hash (str): The hash of the source file.
         
     Returns:
         List[Document]: A list of document chunks with metadata.
@@ -89,67 +147,162 @@ def split_markdown(markdown_text: str, file_name: str, file_hash: str):
     for doc in splits:
         doc.metadata["file_name"] = file_name
         doc.metadata["file_hash"] = file_hash
+        doc.metadata["source_type"] = get_source_type(file_name, doc.metadata.get("Header 1", ""))
+        doc.id = get_chunk_id(doc)
 
     return splits
 
-def ingest_to_chroma(markdown_chunks, collection_name: str, embedding_model, file_hash: str):
+def plan_chunk_changes(collection, markdown_chunks, file_name: str, file_hash: str):
     """
-    Ingests document chunks into a local Chroma collection only if the file hash has changed.
+    Compare a file's chunks with the chunks of that file already stored in a Chroma collection.
 
     Args:
-        markdown_chunks (List[Document]): The document chunks to ingest.
-        collection_name (str): The name of the Chroma collection.
-        embedding_model (EmbeddingFunction): The embedding model to use.
-        persist_directory (str): Directory to persist the local Chroma database.
+        collection (chromadb.Collection): The Chroma collection.
+        markdown_chunks (List[Document]): The file's current chunks, as returned by split_markdown.
+        file_name (str): The name of the source file.
         file_hash (str): The hash of the source file.
+
+    Returns:
+        tuple: The chunks to embed and upsert, the unchanged chunks whose stored metadata (file hash,
+        source type) is outdated, and the IDs of stored chunks that no longer exist in the file.
     """
-    
-    # Initialize local Chroma client
-    chroma_client = chromadb.PersistentClient(path="./chroma_db")
-
-    # Check for an existing collection and the presence of the current file hash
-    try:
-        if collection_name in [c.name for c in chroma_client.list_collections()]:
-            collection = chroma_client.get_collection(name=collection_name)
-            # Use the where clause to find if any document has the current hash
-            results = collection.get(where={"file_hash": file_hash})
-            if results["ids"]:
-                print(f"Collection '{collection_name}' already contains content with this hash. Skipping ingestion.")
-                return
-    except Exception as e:
-        print(f"An error occurred while checking the collection: {e}")
-
-    print(f"Creating or updating collection '{collection_name}'...")
-    Chroma.from_documents(
-        documents=markdown_chunks,
-        embedding=embedding_model,
+    # Identical chunks within a file share an ID, keep one of them
+    chunks_by_id = {}
+    for chunk in markdown_chunks:
+        chunk.id = chunk.id or get_chunk_id(chunk)
+        chunks_by_id[chunk.id] = chunk
+
+    existing = collection.get(where={"file_name": file_name}, include=["metadatas"])
+    existing_metadata = dict(zip(existing["ids"], existing["metadatas"]))
+
+    new_chunks = [chunk for chunk_id, chunk in chunks_by_id.items() if chunk_id not in existing_metadata]
+    outdated_chunks = [
+        chunks_by_id[chunk_id] for chunk_id, metadata in existing_metadata.items()
+        if chunk_id in chunks_by_id and metadata != chunks_by_id[chunk_id].metadata
+    ]
+    stale_ids = [chunk_id for chunk_id in existing_metadata if chunk_id not in chunks_by_id]
+    return new_chunks, outdated_chunks, stale_ids
+
+def apply_chunk_metadata_changes(collection, outdated_chunks, stale_ids) -> None:
+    """
+    Refresh the metadata of unchanged chunks and delete chunks that disappeared, without embedding anything.
+
+    Args:
+        collection (chromadb.Collection): The Chroma collection.
+        outdated_chunks (List[Document]): Unchanged chunks whose metadata must be refreshed.
+        stale_ids (List[str]): IDs of chunks to delete.
+    """
+    if outdated_chunks:
+        # Unchanged chunks keep their embeddings and only get their new metadata
+        collection.update(ids=[chunk.id for chunk in outdated_chunks], metadatas=[chunk.metadata for chunk in outdated_chunks])
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+def refresh_derived_indexes(persist_dir: Path, collection) -> None:
+    """
+    Rebuild the indexes derived from the whole collection (the flat vector index and the report table).
+    They are rebuilt once per ingestion run, after every file is written, not once per file.
+
+    Args:
+        persist_dir (Path): The Chroma persist directory, where the derived indexes live.
+        collection (chromadb.Collection): The Chroma collection.
+    """
+    refresh_flat_index(persist_dir, collection)
+    refresh_report_table(persist_dir, collection)
+
+def _open_vector_store(collection_name: str, embedding_model) -> tuple[Path, Chroma]:
+    persist_dir = Path(os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))
+    chroma_client = chromadb.PersistentClient(path=str(persist_dir))
+    vector_store = Chroma(
+        client=chroma_client,
         collection_name=collection_name,
-        client=chroma_client
+        embedding_function=embedding_model
     )
+    return persist_dir, vector_store
+
+def ingest_to_chroma(markdown_chunks, collection_name: str, embedding_model, file_hash: str, file_name: str | None = None):
+    """
+    Incrementally ingests a file's document chunks into a local Chroma collection.
+
+    Chunks are identified by content-addressed IDs, so only new or changed chunks are embedded
+    and upserted, chunks that disappeared from the file are deleted, and unchanged chunks only
+    get their metadata refreshed. To ingest several files, use `ingest_files_to_chroma`, which
+    saves the BM25 index and rebuilds the derived indexes once for all of them.
+
+    Args:
+        markdown_chunks (List[Document]): The document chunks to ingest, as returned by split_markdown.
+        collection_name (str): The name of the Chroma collection.
+        embedding_model (EmbeddingFunction): The embedding model to use.
+        file_hash (str): The hash of the source file.
+        file_name (str | None): The name of the source file. Defaults to the file name of the chunks.
 
-    print(f"Successfully ingested data into collection '{collection_name}'.")
+    Returns:
+        dict: Number of chunks added, deleted and left unchanged.
+    """
+    return ingest_files_to_chroma([(markdown_chunks, file_hash, file_name)], collection_name, embedding_model)[0]
+
+def ingest_files_to_chroma(files, collection_name: str, embedding_model) -> list[dict]:
+    """
+    Incrementally ingests the chunks of several files into a local Chroma collection, see `ingest_to_chroma`.
+    The BM25 index is updated in memory and saved once, and the derived indexes are rebuilt once at the end.
+
+    Args:
+        files (List[tuple]): (chunks, file hash, file name or None) for every file.
+        collection_name (str): The name of the Chroma collection.
+        embedding_model (EmbeddingFunction): The embedding model to use.
+
+    Returns:
+        list[dict]: Number of chunks added, deleted and left unchanged, per file.
+    """
+    persist_dir, vector_store = _open_vector_store(collection_name, embedding_model)
+    collection = vector_store._collection
+    bm25_index = BM25Index.load_or_build(persist_dir / BM25_INDEX_FILE, collection)
+    summaries = []
+    changed = False
+    for markdown_chunks, file_hash, file_name in files:
+        summary, file_changed = _ingest_file_chunks(vector_store, bm25_index, markdown_chunks, collection_name, file_hash, file_name)
+        summaries.append(summary)
+        changed = changed or file_changed
+
+    if changed:
+        # Keep the BM25 index used for hybrid retrieval, and the indexes built from the collection, in step with it
+        bm25_index.save(persist_dir / BM25_INDEX_FILE)
+        refresh_derived_indexes(persist_dir, collection)
+    return summaries
+
+def _ingest_file_chunks(vector_store: Chroma, bm25_index: BM25Index, markdown_chunks, collection_name: str, file_hash: str, file_name: str | None) -> tuple[dict, bool]:
+    # Returns the file's summary, and whether the collection changed
+    summary = {"added": 0, "deleted": 0, "unchanged": 0}
+    file_name = file_name or (markdown_chunks[0].metadata["file_name"] if markdown_chunks else None)
+    if file_name is None:
+        return summary, False
+
+    collection = vector_store._collection
+    new_chunks, outdated_chunks, stale_ids = plan_chunk_changes(collection, markdown_chunks, file_name, file_hash)
+
+    summary["unchanged"] = len({chunk.id for chunk in markdown_chunks}) - len(new_chunks)
+    if not new_chunks and not stale_ids and not outdated_chunks:
+        print(f"Collection '{collection_name}' is already up to date with '{file_name}'. Skipping ingestion.")
+        return summary, False
+
+    print(f"Updating collection '{collection_name}' with '{file_name}'...")
+    if new_chunks:
+        vector_store.add_documents(new_chunks, ids=[chunk.id for chunk in new_chunks])
+    apply_chunk_metadata_changes(collection, outdated_chunks, stale_ids)
+
+    bm25_index.add_documents(new_chunks + outdated_chunks)
+    for chunk_id in stale_ids:
+        bm25_index.remove(chunk_id)
+
+    summary["added"] = len(new_chunks)
+    summary["deleted"] = len(stale_ids)
+    print(
+        f"Successfully ingested '{file_name}' into collection '{collection_name}': "
+        f"{summary['added']} added, {summary['deleted']} deleted, {summary['unchanged']} unchanged."
+    )
+    return summary, True
 
 if __name__ == "__main__":
-    base_dir = Path(__file__).resolve().parent.parent.parent
-    # Path to the DOCX file
-    docx_path = base_dir / "data"
-    docx_files = list(docx_path.glob("*.docx"))
+    from utils.ingest_pipeline import main
 
-    if not docx_files:
-        raise FileNotFoundError(f"No DOCX files found in {docx_path}")
-    
-    for docx_path in docx_files:
-        print(f"Processing file: {docx_path}")
-        file_hash = get_file_hash(docx_path)
-    
-        # Convert DOCX to markdown
-        markdown_content = convert_docx_to_markdown(docx_path)
-
-        ingest_to_chroma(
-            markdown_chunks=split_markdown(markdown_content, docx_path.name, file_hash),
-            collection_name="bug_and_feedback_reports",
-            embedding_model=EmbeddingModel().get_embedding_model(),
-            file_hash=file_hash
-        )
-   
-    print("Document ingested successfully.")
+    main()
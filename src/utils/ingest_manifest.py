@@ -0,0 +1,98 @@
+import json
+import os
+from pathlib import Path
+
+# Version 2 added the source_type chunk metadata, version 3 fixed it for feedback headers that mention bugs;
+# older manifests are ignored so files get re-planned once and the stored metadata is refreshed
+MANIFEST_VERSION = 3
+
+class IngestManifest:
+    """
+    Local record of what has been ingested, stored next to the Chroma database.
+
+    For every ingested file it keeps the size, modification time, content hash and chunk IDs,
+    so that unchanged files can be skipped from a `stat()` call alone, before any hashing,
+    docling conversion or Chroma access.
+    """
+
+    def __init__(self, path: str | Path, collection_name: str):
+        self.path = Path(path)
+        self.collection_name = collection_name
+        self.files: dict[str, dict] = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                # A manifest written for another collection or format tells us nothing
+                if data.get("version") == MANIFEST_VERSION and data.get("collection") == collection_name:
+                    self.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable ingest manifest {self.path}: {e}")
+
+    def is_unchanged(self, doc_path: Path) -> bool:
+        """
+        Check whether a file has the same size and modification time as when it was ingested.
+
+        Args:
+            doc_path (Path): The source file.
+
+        Returns:
+            bool: True when the file can be skipped without hashing it.
+        """
+        entry = self.files.get(doc_path.name)
+        if entry is None:
+            return False
+        stat = doc_path.stat()
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def has_hash(self, doc_path: Path, file_hash: str) -> bool:
+        """Check whether a file's content hash matches the ingested one (for example, after a touch or copy)."""
+        entry = self.files.get(doc_path.name)
+        return entry is not None and entry["hash"] == file_hash
+
+    def record(self, doc_path: Path, file_hash: str, chunk_ids: list[str] | None = None) -> None:
+        """
+        Record a file as ingested. Without `chunk_ids` the previously recorded chunk IDs are kept.
+
+        Args:
+            doc_path (Path): The source file.
+            file_hash (str): The hash of the file.
+            chunk_ids (list[str] | None): IDs of the file's chunks in the collection.
+        """
+        stat = doc_path.stat()
+        if chunk_ids is None:
+            chunk_ids = self.files.get(doc_path.name, {}).get("chunk_ids", [])
+        self.files[doc_path.name] = {
+            "path": str(doc_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": file_hash,
+            "chunk_ids": chunk_ids,
+        }
+
+    def forget(self, file_name: str) -> list[str]:
+        """
+        Drop a file from the manifest.
+
+        Args:
+            file_name (str): The name of the source file.
+
+        Returns:
+            list[str]: The chunk IDs that were recorded for it.
+        """
+        entry = self.files.pop(file_name, None)
+        return entry["chunk_ids"] if entry else []
+
+    def missing_files(self, doc_paths: list[Path]) -> list[str]:
+        """Return the names of recorded files that are no longer among the given paths."""
+        present = {doc_path.name for doc_path in doc_paths}
+        return [file_name for file_name in self.files if file_name not in present]
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "collection": self.collection_name, "files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
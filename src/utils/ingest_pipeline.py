@@ -0,0 +1,242 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+import chromadb
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from utils.bm25 import BM25_INDEX_FILE, BM25Index
+from utils.ingest import (
+    apply_chunk_metadata_changes,
+    build_docx_converter,
+    convert_docx_to_markdown,
+    get_file_hash,
+    plan_chunk_changes,
+    refresh_derived_indexes,
+    split_markdown,
+)
+from utils.ingest_manifest import IngestManifest
+from utils.llm import EmbeddingModel
+
+load_dotenv()
+
+# One warm converter per worker process, built by the pool initializer
+_worker_converter = None
+
+def _init_converter_worker() -> None:
+    global _worker_converter
+    _worker_converter = build_docx_converter()
+
+def _convert_in_worker(doc_path: str) -> str:
+    return read_or_convert(Path(doc_path), _worker_converter)
+
+def read_or_convert(doc_path: Path, converter) -> str:
+    """Return a source file as markdown: markdown files are read as is, DOCX files are converted with docling."""
+    if doc_path.suffix.lower() == ".md":
+        return doc_path.read_text(encoding="utf-8")
+    return convert_docx_to_markdown(doc_path, converter=converter)
+
+class IngestionPipeline:
+    """
+    Parallel, streaming DOCX ingestion into one Chroma collection.
+
+    DOCX files are converted in a process pool with one warm docling converter per worker.
+    As each file finishes converting, its chunks are diffed against the collection and the
+    new or changed ones stream into fixed-size embedding batches, which a single Chroma
+    client upserts while the remaining files are still converting.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        embedding_model,
+        persist_dir: str = "./chroma_db",
+        workers: int = 4,
+        batch_size: int = 256,
+    ):
+        self.collection_name = collection_name
+        self.embedding_model = embedding_model
+        self.persist_dir = Path(persist_dir)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.manifest = IngestManifest(self.persist_dir / "ingest_manifest.json", collection_name)
+        self._collection = None
+        self._bm25_index = None
+        self._pending: list[Document] = []
+        self._ingested: dict[Path, tuple[str, list[str]]] = {}
+        self._stats = {"files": 0, "skipped": 0, "chunks": 0, "embedded": 0, "deleted": 0, "embedding_batches": 0}
+
+    @property
+    def collection(self):
+        """The Chroma collection, opened on first use so that no-op runs never touch Chroma."""
+        if self._collection is None:
+            chroma_client = chromadb.PersistentClient(path=str(self.persist_dir))
+            self._collection = chroma_client.get_or_create_collection(name=self.collection_name, embedding_function=None)
+        return self._collection
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        """The BM25 index used for hybrid retrieval, loaded on first use and kept in step with the collection."""
+        if self._bm25_index is None:
+            self._bm25_index = BM25Index.load_or_build(self.persist_dir / BM25_INDEX_FILE, self.collection)
+        return self._bm25_index
+
+    def _files_to_ingest(self, doc_paths: list[Path]) -> dict[Path, str]:
+        """Return the hash of every file that changed since it was last ingested, skipping the others."""
+        changed = {}
+        for doc_path in doc_paths:
+            if self.manifest.is_unchanged(doc_path):
+                self._stats["skipped"] += 1
+                continue
+
+            file_hash = get_file_hash(doc_path)
+            if self.manifest.has_hash(doc_path, file_hash):
+                # Same content with a new modification time, so only refresh the manifest entry
+                self.manifest.record(doc_path, file_hash)
+                self._stats["skipped"] += 1
+                continue
+
+            changed[doc_path] = file_hash
+        return changed
+
+    def _remove_missing_files(self, doc_paths: list[Path]) -> None:
+        """Delete the chunks of files that were ingested before but no longer exist."""
+        for file_name in self.manifest.missing_files(doc_paths):
+            chunk_ids = self.manifest.forget(file_name)
+            if chunk_ids:
+                self.collection.delete(ids=chunk_ids)
+                for chunk_id in chunk_ids:
+                    self.bm25_index.remove(chunk_id)
+            self._stats["deleted"] += len(chunk_ids)
+            print(f"Removed {len(chunk_ids)} chunks of deleted file {file_name}")
+
+    def run(self, doc_paths: list[Path]) -> dict:
+        """
+        Ingest DOCX files, or already converted markdown (.md) files, and report throughput.
+
+        Args:
+            doc_paths (list[Path]): The DOCX or markdown files to ingest.
+
+        Returns:
+            dict: Counters for files, chunks, embedded and deleted chunks, plus elapsed time and throughput.
+        """
+        start = perf_counter()
+        file_hashes = self._files_to_ingest(doc_paths)
+        self._remove_missing_files(doc_paths)
+
+        if not file_hashes:
+            print(f"All {len(doc_paths)} files are unchanged since the last ingestion.")
+        elif self.workers <= 1 or len(file_hashes) == 1:
+            converter = build_docx_converter() if self._needs_converter(file_hashes) else None
+            for doc_path, file_hash in file_hashes.items():
+                markdown_text = read_or_convert(doc_path, converter)
+                self._ingest_file(doc_path, file_hash, markdown_text, start, len(file_hashes))
+        else:
+            workers = min(self.workers, len(file_hashes))
+            initializer = _init_converter_worker if self._needs_converter(file_hashes) else None
+            with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+                futures = {pool.submit(_convert_in_worker, str(doc_path)): doc_path for doc_path in file_hashes}
+                for future in as_completed(futures):
+                    doc_path = futures[future]
+                    try:
+                        markdown_text = future.result()
+                    except Exception as e:
+                        print(f"An error occurred while converting {doc_path}: {e}")
+                        continue
+                    self._ingest_file(doc_path, file_hashes[doc_path], markdown_text, start, len(file_hashes))
+
+        self._flush()
+
+        # Only record files once all of their chunks are written
+        for doc_path, (file_hash, chunk_ids) in self._ingested.items():
+            self.manifest.record(doc_path, file_hash, chunk_ids)
+        self.manifest.save()
+        if self._bm25_index is not None:
+            self._bm25_index.save(self.persist_dir / BM25_INDEX_FILE)
+        if self._collection is not None and (self._stats["chunks"] or self._stats["deleted"]):
+            refresh_derived_indexes(self.persist_dir, self._collection)
+
+        elapsed = perf_counter() - start
+        stats = dict(self._stats, elapsed_seconds=round(elapsed, 2))
+        stats["files_per_second"] = round(stats["files"] / elapsed, 2) if elapsed else 0.0
+        stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+        return stats
+
+    @staticmethod
+    def _needs_converter(doc_paths) -> bool:
+        # Markdown sources are read directly, so docling is only loaded when there is a DOCX file to convert
+        return any(doc_path.suffix.lower() != ".md" for doc_path in doc_paths)
+
+    def _ingest_file(self, doc_path: Path, file_hash: str, markdown_text: str, start: float, total_files: int) -> None:
+        chunks = split_markdown(markdown_text, doc_path.name, file_hash)
+        new_chunks, outdated_chunks, stale_ids = plan_chunk_changes(self.collection, chunks, doc_path.name, file_hash)
+        apply_chunk_metadata_changes(self.collection, outdated_chunks, stale_ids)
+        self.bm25_index.add_documents(outdated_chunks)
+        for chunk_id in stale_ids:
+            self.bm25_index.remove(chunk_id)
+
+        self._ingested[doc_path] = (file_hash, list(dict.fromkeys(chunk.id for chunk in chunks)))
+        self._stats["files"] += 1
+        self._stats["chunks"] += len(chunks)
+        self._stats["deleted"] += len(stale_ids)
+
+        self._pending.extend(new_chunks)
+        while len(self._pending) >= self.batch_size:
+            self._flush(self.batch_size)
+
+        print(
+            f"[{self._stats['files']}/{total_files}] {doc_path.name}: {len(chunks)} chunks, "
+            f"{len(new_chunks)} new, {len(stale_ids)} removed ({perf_counter() - start:.1f}s)"
+        )
+
+    def _flush(self, limit: int | None = None) -> None:
+        """Embed and upsert up to `limit` pending chunks (all of them by default) in one batch."""
+        batch = self._pending[:limit] if limit else self._pending
+        self._pending = self._pending[len(batch):]
+        if not batch:
+            return
+
+        embeddings = self.embedding_model.embed_documents([chunk.page_content for chunk in batch])
+        self.collection.upsert(
+            ids=[chunk.id for chunk in batch],
+            embeddings=embeddings,
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
+        )
+        self.bm25_index.add_documents(batch)
+        self._stats["embedded"] += len(batch)
+        self._stats["embedding_batches"] += 1
+
+def main() -> None:
+    base_dir = Path(__file__).resolve().parent.parent.parent
+
+    parser = argparse.ArgumentParser(description="Ingest DOCX bug and feedback reports into the local Chroma collection.")
+    parser.add_argument("--data-dir", type=Path, default=base_dir / "data", help="Directory containing the DOCX files")
+    parser.add_argument("--collection", default=os.getenv("CHROMA_COLLECTION_NAME", "bug_and_feedback_reports"))
+    parser.add_argument("--persist-dir", default=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Conversion worker processes")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_EMBEDDING_BATCH_SIZE", 256)), help="Chunks per embedding call")
+    args = parser.parse_args()
+
+    docx_files = sorted(args.data_dir.glob("*.docx"))
+    if not docx_files:
+        raise FileNotFoundError(f"No DOCX files found in {args.data_dir}")
+
+    pipeline = IngestionPipeline(
+        collection_name=args.collection,
+        embedding_model=EmbeddingModel().get_embedding_model(),
+        persist_dir=args.persist_dir,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    stats = pipeline.run(docx_files)
+
+    print(
+        f"Ingested {stats['files']} files, skipped {stats['skipped']} unchanged ({stats['chunks']} chunks, {stats['embedded']} embedded in "
+        f"{stats['embedding_batches']} batches, {stats['deleted']} removed) in {stats['elapsed_seconds']}s: "
+        f"{stats['files_per_second']} files/s, {stats['chunks_per_second']} chunks/s."
+    )
+
+if __name__ == "__main__":
+    main()
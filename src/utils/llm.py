@@ -1,22 +1,130 @@
+import os
+from typing import Callable, Optional
+import httpx
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from dotenv import load_dotenv
+from utils.embedding_cache import CachedEmbeddings
 
 load_dotenv()
 
+_http_client = None
+_http_async_client = None
+
+def get_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Return the sync and async HTTP clients shared by every OpenAI client in the process,
+    so that chat and embedding calls reuse pooled keep-alive connections.
+
+    Returns:
+        tuple[httpx.Client, httpx.AsyncClient]: The shared sync and async clients.
+    """
+    global _http_client, _http_async_client
+    if _http_client is None:
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 20)),
+        )
+        timeout = httpx.Timeout(float(os.getenv("OPENAI_HTTP_TIMEOUT_SECONDS", 60)), connect=10.0)
+        _http_client = httpx.Client(limits=limits, timeout=timeout)
+        _http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return _http_client, _http_async_client
+
+# Model tier and completion token cap per graph node: a small, fast model for the yes/no relevance
+# classifier and document grader, whose structured answers are a few tokens long, and the large
+# model only for writing the answer. Override with RAG_<NODE>_MODEL and RAG_<NODE>_MAX_TOKENS.
+NODE_MODEL_DEFAULTS = {
+    "relevance": ("gpt-4o-mini", 64),
+    "grader": ("gpt-4o-mini", 64),
+    "generate": ("gpt-4o", None),
+}
+
+def get_node_model_config(node: str) -> tuple[str, Optional[int]]:
+    """
+    Return the model name and completion token cap configured for a graph node.
+
+    Args:
+        node (str): 'relevance', 'grader' or 'generate'.
+
+    Returns:
+        tuple[str, Optional[int]]: The model name, and the max_tokens cap (None for no cap).
+    """
+    default_model, default_max_tokens = NODE_MODEL_DEFAULTS[node]
+    model_name = os.getenv(f"RAG_{node.upper()}_MODEL") or default_model
+    max_tokens = os.getenv(f"RAG_{node.upper()}_MAX_TOKENS")
+    if max_tokens is None:
+        return model_name, default_max_tokens
+    # An empty value or 0 removes the cap
+    max_tokens = int(max_tokens) if max_tokens.strip() else 0
+    return model_name, max_tokens if max_tokens > 0 else None
+
 class LLMModel:
-    def __init__(self, model_name: str = "gpt-4o"):
+    # Optional hook that builds the chat model from a model name and max_tokens cap instead of
+    # ChatOpenAI, for example a fake model in benchmarks. See `set_factory`.
+    factory: Optional[Callable[[str, Optional[int]], object]] = None
+
+    @classmethod
+    def set_factory(cls, factory: Optional[Callable[[str, Optional[int]], object]]) -> None:
+        """Build every chat model with `factory(model_name, max_tokens)` from now on, or with ChatOpenAI again when None."""
+        cls.factory = factory
+
+    @classmethod
+    def for_node(cls, node: str) -> "LLMModel":
+        """Build the model configured for a graph node. See `get_node_model_config`."""
+        model_name, max_tokens = get_node_model_config(node)
+        return cls(model_name, max_tokens=max_tokens)
+
+    def __init__(self, model_name: str = "gpt-4o", max_tokens: Optional[int] = None):
         if not model_name:
             model_name = "gpt-4o"
-        self.model = ChatOpenAI(model=model_name, temperature=0.0)
+        if LLMModel.factory is not None:
+            self.model = LLMModel.factory(model_name, max_tokens)
+            return
+        http_client, http_async_client = get_http_clients()
+        self.model = ChatOpenAI(
+            model=model_name,
+            temperature=0.0,
+            max_tokens=max_tokens,
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 2)),
+            # Report token usage on streamed responses too, for the per-node token metrics
+            stream_usage=True,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
 
     def get_model(self):
         return self.model
     
 class EmbeddingModel:
+    # Optional hook that builds the embedding model from a model name instead of OpenAIEmbeddings,
+    # for example deterministic fake embeddings in benchmarks. See `set_factory`.
+    factory: Optional[Callable[[str], object]] = None
+
+    @classmethod
+    def set_factory(cls, factory: Optional[Callable[[str], object]]) -> None:
+        """Build every embedding model with `factory(model_name)` from now on, or with OpenAIEmbeddings again when None."""
+        cls.factory = factory
+
     def __init__(self, model_name: str = "text-embedding-3-small"):
         if not model_name:
             model_name = "text-embedding-3-small"
-        self.embedding_model = OpenAIEmbeddings(model=model_name)
+        if EmbeddingModel.factory is not None:
+            self.embedding_model = EmbeddingModel.factory(model_name)
+        else:
+            http_client, http_async_client = get_http_clients()
+            self.embedding_model = OpenAIEmbeddings(
+                model=model_name,
+                http_client=http_client,
+                http_async_client=http_async_client
+            )
+
+        # Identical texts are embedded once and then served from a persistent local cache
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            self.embedding_model = CachedEmbeddings(
+                self.embedding_model,
+                model_name=model_name,
+                path=os.getenv("EMBEDDING_CACHE_PATH", "./chroma_db/embedding_cache.sqlite3"),
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+            )
 
     def get_embedding_model(self):
         return self.embedding_model
@@ -26,4 +134,4 @@ if __name__ == "__main__":
     llm_model = llm_instance.get_model()
     response=llm_model.invoke("How to fix upload stuck at 99%?")
 
-    print(response)
\ No newline at end of file
+    print(response)
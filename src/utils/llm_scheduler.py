@@ -0,0 +1,259 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import Awaitable, Callable, Optional, TypeVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# Deadline per graph node in seconds, covering the wait for a slot and the call itself.
+# Override with RAG_<NODE>_TIMEOUT_SECONDS; RAG_<NODE>_HEDGE_AFTER_SECONDS enables hedging.
+NODE_TIMEOUT_DEFAULTS = {
+    "relevance": 15.0,
+    "grader": 15.0,
+    "generate": 90.0,
+}
+
+class LLMOverloaded(RuntimeError):
+    """Raised instead of queueing an LLM call when too many calls are already waiting for a slot."""
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an LLM call, including its wait for a slot, runs past its node's deadline."""
+
+    def __init__(self, node: str, timeout: float):
+        super().__init__(f"The {node} LLM call did not finish within {timeout:g}s")
+        self.node = node
+        self.timeout = timeout
+
+def parse_limits(value: Optional[str]) -> dict[str, int]:
+    """Parse a "model=limit,model=limit" setting, for example "gpt-4o=16,gpt-4o-mini=32"."""
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.strip().rpartition("=")
+        if name and limit.strip():
+            limits[name.strip()] = int(limit)
+    return limits
+
+def get_node_call_config(node: str) -> tuple[Optional[float], Optional[float]]:
+    """
+    Return the deadline and hedging delay configured for the LLM calls of a graph node.
+
+    Args:
+        node (str): 'relevance', 'grader' or 'generate'.
+
+    Returns:
+        tuple[Optional[float], Optional[float]]: The deadline in seconds (None for none), and the
+        delay after which a second, hedged call is started (None to never hedge).
+    """
+    timeout = os.getenv(f"RAG_{node.upper()}_TIMEOUT_SECONDS")
+    timeout = float(timeout) if timeout else NODE_TIMEOUT_DEFAULTS.get(node)
+    hedge_after = os.getenv(f"RAG_{node.upper()}_HEDGE_AFTER_SECONDS")
+    return (timeout if timeout and timeout > 0 else None), (float(hedge_after) if hedge_after else None)
+
+class TokenBucket:
+    """Token bucket refilled continuously at `tokens_per_minute`, holding at most one minute of tokens."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60
+        self.tokens = self.capacity
+        self.updated = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has_tokens(self, tokens: int) -> bool:
+        """Whether `tokens` could be taken right now without waiting."""
+        with self._lock:
+            self._refill()
+            return self.tokens >= min(float(tokens), self.capacity)
+
+    async def acquire(self, tokens: int) -> float:
+        """
+        Take `tokens` and wait until the bucket has refilled enough to cover them. Tokens are reserved
+        on arrival (the balance can go negative), so waiters are served in arrival order without
+        holding the lock while they sleep. A cancelled wait gives its tokens back.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            delay = max(0.0, -self.tokens / self.rate)
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                with self._lock:
+                    self.tokens += tokens
+                raise
+        return delay
+
+class LLMScheduler:
+    """
+    Shared gate for every LLM call of the graph nodes.
+
+    Calls wait for a per-model and a global concurrency slot and for their estimated tokens in the
+    model's tokens-per-minute bucket, all within the node's deadline. When `max_queue` calls are
+    already waiting, new calls fail fast with `LLMOverloaded` instead of piling up. Short calls can
+    be hedged: if the first attempt has not answered after `hedge_after` seconds and a slot is free,
+    a second identical attempt starts and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        model_concurrency: Optional[dict[str, int]] = None,
+        tokens_per_minute: Optional[dict[str, int]] = None,
+        max_queue: int = 128,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._models = {model: asyncio.Semaphore(limit) for model, limit in (model_concurrency or {}).items()}
+        self._buckets = {model: TokenBucket(limit) for model, limit in (tokens_per_minute or {}).items()}
+        self._queued = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "rejected": 0, "deadline_exceeded": 0, "hedged": 0, "hedge_wins": 0, "rate_limited_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            max_concurrency=int(os.getenv("RAG_LLM_MAX_CONCURRENCY", 32)),
+            model_concurrency=parse_limits(os.getenv("RAG_LLM_MODEL_CONCURRENCY")),
+            tokens_per_minute=parse_limits(os.getenv("RAG_LLM_TOKENS_PER_MINUTE")),
+            max_queue=int(os.getenv("RAG_LLM_MAX_QUEUE", 128)),
+        )
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def has_token_budget(self, model: str) -> bool:
+        """Whether calls to a model are limited by a tokens-per-minute budget, and so need a token estimate."""
+        return model in self._buckets
+
+    def _semaphores(self, model: str) -> list[asyncio.Semaphore]:
+        # The model's own limit is taken first, so that calls waiting on a busy model do not hold global slots
+        return [self._models[model], self._global] if model in self._models else [self._global]
+
+    @asynccontextmanager
+    async def _slot(self, model: str, estimated_tokens: int = 0):
+        semaphores = self._semaphores(model)
+        bucket = self._buckets.get(model) if estimated_tokens else None
+        if self._queued >= self.max_queue and (
+            (bucket is not None and not bucket.has_tokens(estimated_tokens))
+            or any(semaphore.locked() for semaphore in semaphores)
+        ):
+            self._count("rejected")
+            raise LLMOverloaded(f"{self._queued} LLM calls are already waiting for a slot")
+
+        acquired = []
+        try:
+            self._queued += 1
+            try:
+                # Tokens are taken before the slots, so that a rate-limited call does not hold a slot while it waits
+                if bucket is not None:
+                    waited = await bucket.acquire(estimated_tokens)
+                    if waited:
+                        self._count("rate_limited_seconds", waited)
+                for semaphore in semaphores:
+                    await semaphore.acquire()
+                    acquired.append(semaphore)
+            finally:
+                self._queued -= 1
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    async def _attempt(self, model: str, call: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        async with self._slot(model, estimated_tokens):
+            return await call()
+
+    async def _hedged(self, model: str, call: Callable[[], Awaitable[T]], estimated_tokens: int, hedge_after: float) -> T:
+        attempts = [asyncio.ensure_future(self._attempt(model, call, estimated_tokens))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done and not any(semaphore.locked() for semaphore in self._semaphores(model)):
+                self._count("hedged")
+                attempts.append(asyncio.ensure_future(self._attempt(model, call, estimated_tokens)))
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A successful attempt wins; a failed one only counts when no other attempt can still answer
+                for attempt in sorted(done, key=lambda attempt: attempt.exception() is not None):
+                    if attempt.exception() is None or not pending:
+                        if attempt is not attempts[0]:
+                            self._count("hedge_wins")
+                        return attempt.result()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            # Wait for the losing attempt to release its slot before returning
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+    async def run(
+        self,
+        node: str,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+    ) -> T:
+        """
+        Run one LLM call under the concurrency limits, rate limit and deadline of its node.
+
+        Args:
+            node (str): The node making the call: 'relevance', 'grader' or 'generate'.
+            model (str): The model name, which selects the per-model limit and token bucket.
+            call (Callable[[], Awaitable]): Makes the call; called again for a hedged attempt.
+            estimated_tokens (int): Prompt plus expected completion tokens, taken from the token bucket.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            LLMOverloaded: Too many calls are waiting for a slot.
+            DeadlineExceeded: The call did not finish within the node's deadline.
+        """
+        self._count("calls")
+        timeout, hedge_after = get_node_call_config(node)
+        deadline = asyncio.timeout(timeout)
+        try:
+            async with deadline:
+                if hedge_after is not None:
+                    return await self._hedged(model, call, estimated_tokens, hedge_after)
+                return await self._attempt(model, call, estimated_tokens)
+        except TimeoutError:
+            if not deadline.expired():
+                raise
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(node, timeout) from None
+
+    def stats(self) -> dict:
+        """Return the calls, rejections, deadline misses and hedges so far, and the current queue and in-flight calls."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["rate_limited_seconds"] = round(stats["rate_limited_seconds"], 3)
+        stats["queued"] = self._queued
+        stats["in_flight"] = self._in_flight
+        stats["max_concurrency"] = self.max_concurrency
+        stats["max_queue"] = self.max_queue
+        return stats
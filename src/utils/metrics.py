@@ -0,0 +1,391 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from utils.timing import collect_stage_timings, current_stage_timings
+
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", "false").lower() == "true"
+
+# USD per million tokens: (prompt, cached prompt, completion). Model names match by longest prefix, so
+# dated snapshots ("gpt-4o-mini-2024-07-18") use their family's price. RAG_MODEL_PRICES adds or
+# replaces entries with a JSON object, for example {"gpt-4o": [2.5, 1.25, 10.0]}.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("RAG_MODEL_PRICES") or "{}").items()})
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+CHUNK_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels) + "}"
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def totals(self, label: str) -> dict[str, float]:
+        """Return the counter's total per value of one label."""
+        totals = {}
+        with self._lock:
+            for key, value in self._values.items():
+                name = dict(key).get(label)
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, in the Prometheus format."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count per bucket (plus one for +Inf), sum and count
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-wide metrics: counters and histograms recorded by the graph, plus collectors that
+    export the counters other components already keep (answer cache, relevance classifier, ...).
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: dict[str, Callable[[], dict]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...] = SECONDS_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict]) -> None:
+        """
+        Export the numeric values of a stats dict as gauges named `<prefix>_<key>` on every render.
+
+        Args:
+            prefix (str): Metric name prefix.
+            collect (Callable[[], dict]): Returns the current stats.
+        """
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"An error occurred while collecting {prefix} metrics: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+request_counter = metrics.counter("rag_requests_total", "RAG requests by kind and outcome")
+request_duration = metrics.histogram("rag_request_duration_seconds", "End-to-end RAG request wall time")
+stage_duration = metrics.histogram("rag_stage_duration_seconds", "Wall time per graph node or request stage, per request")
+llm_tokens = metrics.histogram("rag_llm_tokens", "Prompt, cached prompt and completion tokens per LLM call, by graph node", TOKEN_BUCKETS)
+retrieved_chunks = metrics.histogram("rag_retrieved_chunks", "Chunks returned by retrieval per request", CHUNK_BUCKETS)
+context_tokens = metrics.histogram("rag_context_tokens", "Tokens of the generation context per request", TOKEN_BUCKETS)
+context_tokens_saved = metrics.histogram("rag_context_tokens_saved", "Context tokens removed by section extraction and the token budget per request", TOKEN_BUCKETS)
+llm_call_duration = metrics.histogram("rag_llm_call_duration_seconds", "Wall time per LLM call, by graph node and model")
+llm_cost = metrics.counter("rag_llm_cost_usd_total", "Estimated LLM cost in USD, by graph node and model")
+generations_skipped = metrics.counter("rag_generations_skipped_total", "Answers given without the generate LLM call, by reason")
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Estimate the cost of one LLM call from the MODEL_PRICES table.
+
+    Args:
+        model (str): The model name.
+        prompt_tokens (int): Prompt tokens, including the cached ones.
+        completion_tokens (int): Completion tokens.
+        cached_tokens (int): Prompt tokens served from the provider's prompt cache.
+
+    Returns:
+        float: The cost in USD, or 0.0 for a model without a price.
+    """
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, cached_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+class LLMUsage:
+    """Running totals of LLM calls, tokens, latency and cost per graph node and model, for tuning the model tiers."""
+
+    def __init__(self):
+        self._totals: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+
+    def add(self, node: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: float) -> None:
+        with self._lock:
+            totals = self._totals.setdefault((node, model), {
+                "calls": 0, "seconds": 0.0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            })
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["prompt_tokens"] += prompt_tokens
+            totals["cached_prompt_tokens"] += cached_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += cost
+
+    def stats(self) -> dict:
+        """Return the totals per node and model, with the mean latency and cost per call."""
+        with self._lock:
+            items = [(key, dict(totals)) for key, totals in sorted(self._totals.items())]
+        stats = {}
+        for (node, model), totals in items:
+            calls = totals["calls"]
+            stats.setdefault(node, {})[model] = {
+                **totals,
+                "seconds": round(totals["seconds"], 3),
+                "cost_usd": round(totals["cost_usd"], 6),
+                "mean_ms": round(totals["seconds"] * 1000 / calls, 1),
+                "mean_cost_usd": round(totals["cost_usd"] / calls, 6),
+            }
+        return stats
+
+llm_usage = LLMUsage()
+
+class RequestRecord:
+    """Everything measured for one request, logged as one JSON line when METRICS_JSON_LOG is set."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.outcome = "generated"
+        self.stage_ms: dict[str, float] = {}
+        self.tokens: dict[str, dict[str, int]] = {}
+        self.retrieved_chunks: Optional[int] = None
+        self.context_tokens: Optional[int] = None
+        self.context_tokens_saved: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add_tokens(self, node: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0, cost: float = 0.0) -> None:
+        with self._lock:
+            usage = self.tokens.setdefault(node, {"prompt": 0, "cached_prompt": 0, "completion": 0, "cost_usd": 0.0})
+            usage["prompt"] += prompt_tokens
+            usage["cached_prompt"] += cached_tokens
+            usage["completion"] += completion_tokens
+            usage["cost_usd"] = round(usage["cost_usd"] + cost, 6)
+
+    def to_dict(self, total_ms: float) -> dict:
+        return {
+            "event": "rag_request",
+            "kind": self.kind,
+            "outcome": self.outcome,
+            "total_ms": round(total_ms, 3),
+            "stage_ms": self.stage_ms,
+            "tokens": self.tokens,
+            "retrieved_chunks": self.retrieved_chunks,
+            "context_tokens": self.context_tokens,
+            "context_tokens_saved": self.context_tokens_saved,
+        }
+
+_current_request: ContextVar[RequestRecord | None] = ContextVar("current_request", default=None)
+
+def current_request() -> Optional[RequestRecord]:
+    """Return the record of the request being served, if any."""
+    return _current_request.get()
+
+@contextmanager
+def track_request(kind: str):
+    """
+    Measure one RAG request: its total and per-stage wall time, tokens per node, retrieved chunks and
+    context size. The measurements go into the histograms and, with METRICS_JSON_LOG, a JSON log line.
+
+    Args:
+        kind (str): The kind of request, for example "chat", "stream" or "batch".
+
+    Yields:
+        RequestRecord: The record, whose outcome can be set to "cached", "coalesced" or "error".
+    """
+    record = RequestRecord(kind)
+    token = _current_request.set(record)
+    start = perf_counter()
+    with ExitStack() as stack:
+        # Share the caller's stage timings when it already collects them (for example, the /chat endpoint)
+        timings = current_stage_timings()
+        if timings is None:
+            timings = stack.enter_context(collect_stage_timings())
+        try:
+            yield record
+        except Exception:
+            record.outcome = "error"
+            raise
+        finally:
+            _current_request.reset(token)
+            elapsed = perf_counter() - start
+            record.stage_ms = dict(timings)
+            request_counter.inc(kind=kind, outcome=record.outcome)
+            request_duration.observe(elapsed, kind=kind)
+            for stage_name, stage_ms in record.stage_ms.items():
+                stage_duration.observe(stage_ms / 1000, stage=stage_name)
+            if METRICS_JSON_LOG:
+                print(json.dumps(record.to_dict(elapsed * 1000)))
+
+def observe_retrieval(chunk_count: int) -> None:
+    """Record the number of chunks retrieved for the current request."""
+    retrieved_chunks.observe(chunk_count)
+    record = current_request()
+    if record is not None:
+        record.retrieved_chunks = chunk_count
+
+def observe_context(token_count: int, tokens_saved: int = 0) -> None:
+    """Record the size of the generation context, and the tokens saved assembling it, for the current request."""
+    context_tokens.observe(token_count)
+    context_tokens_saved.observe(tokens_saved)
+    record = current_request()
+    if record is not None:
+        record.context_tokens = token_count
+        record.context_tokens_saved = tokens_saved
+
+def observe_skipped_generation(reason: str) -> None:
+    """Record an answer given without the generate LLM call, for example "off_topic" or "no_documents"."""
+    generations_skipped.inc(reason=reason)
+    record = current_request()
+    if record is not None:
+        record.outcome = "templated"
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that attributes the prompt and completion tokens, latency and estimated cost of
+    every chat model call to the graph node and model that made it.
+    """
+
+    # Run in the caller's context, so that the current request record is visible
+    run_inline = True
+
+    def __init__(self):
+        self._runs: dict[UUID, tuple[str, str, float]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self,
+        serialized,
+        messages,
+        *,
+        run_id: UUID,
+        metadata: Optional[dict] = None,
+        invocation_params: Optional[dict] = None,
+        **kwargs,
+    ) -> None:
+        metadata = metadata or {}
+        invocation_params = invocation_params or {}
+        model = metadata.get("ls_model_name") or invocation_params.get("model_name") or invocation_params.get("model") or "unknown"
+        with self._lock:
+            self._runs[run_id] = (metadata.get("langgraph_node", "unknown"), model, perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            node, model, start = self._runs.pop(run_id, ("unknown", "unknown", None))
+        seconds = perf_counter() - start if start is not None else 0.0
+
+        prompt_tokens, completion_tokens, cached_tokens = 0, 0, 0
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if token_usage:
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+            cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        else:
+            # Streamed responses report usage on the message instead
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                    cached_tokens += (usage.get("input_token_details") or {}).get("cache_read") or 0
+
+        if start is not None:
+            llm_call_duration.observe(seconds, node=node, model=model)
+        if not prompt_tokens and not completion_tokens:
+            return
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+        llm_tokens.observe(prompt_tokens, node=node, type="prompt")
+        llm_tokens.observe(cached_tokens, node=node, type="cached_prompt")
+        llm_tokens.observe(completion_tokens, node=node, type="completion")
+        llm_cost.inc(cost, node=node, model=model)
+        llm_usage.add(node, model, seconds, prompt_tokens, completion_tokens, cached_tokens, cost)
+        record = current_request()
+        if record is not None:
+            record.add_tokens(node, prompt_tokens, completion_tokens, cached_tokens, cost)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+token_usage_handler = TokenUsageCallbackHandler()
@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+REPORT_TABLE_FILE = "reports.sqlite3"
+# Bump when parsing changes, so that tables built by an older version are rebuilt
+REPORT_TABLE_VERSION = 2
+# Columns that questions can filter and group on; their values are stored lowercased
+FILTER_COLUMNS = ("severity", "status", "component", "platform")
+# Report field labels that fill each column ("Severity: Medium", "**Priority:** High")
+FIELD_LABELS = {
+    "title": ("title", "summary", "subject"),
+    "severity": ("severity", "priority"),
+    "status": ("status", "state", "resolution"),
+    "component": ("component", "module", "area", "feature"),
+    "environment": ("environment", "platform", "platforms", "device", "os"),
+    "rating": ("rating", "score", "stars"),
+}
+
+# A report's own header, "Bug #3: ..." or "# Feedback #7: ...", and not a header that merely mentions bugs
+REPORT_HEADER_PATTERN = re.compile(r"^[#\s]*(bug|feedback)\s*#(\d+)", re.IGNORECASE | re.MULTILINE)
+# A "Label: value" line; docling output has no bold left, the synthetic corpus writes "**Label:** value"
+FIELD_PATTERN = re.compile(r"^[ \t>*_-]*(?P<label>[A-Za-z][A-Za-z /]{0,30}?)[ \t*_]*:[ \t*_]*(?P<value>[^\n]*)$", re.MULTILINE)
+# Labels are short; a longer "label" is a sentence that happens to contain a colon
+MAX_LABEL_WORDS = 3
+# Platform names an environment field can start with; anything else there is a component ("Backend v1.0.5, Database")
+PLATFORMS = ("web", "mobile", "desktop", "all platforms")
+VERSION_PATTERN = re.compile(r"\s*\b(?:v(?:ersion)?\s*)?\d+(?:\.[\dx]+)+\b.*$", re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE reports (
+    id TEXT PRIMARY KEY,
+    report_type TEXT NOT NULL,
+    number INTEGER,
+    file_name TEXT,
+    title TEXT,
+    severity TEXT,
+    status TEXT,
+    component TEXT,
+    platform TEXT,
+    environment TEXT,
+    rating INTEGER,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX reports_type_severity ON reports (report_type, severity);
+CREATE INDEX reports_type_component ON reports (report_type, component);
+CREATE INDEX reports_type_number ON reports (report_type, number);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+def parse_fields(text: str) -> dict[str, str]:
+    """
+    Parse the "Label: value" lines of a report chunk.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        dict[str, str]: The first value of every label, keyed by the lowercased label.
+    """
+    fields = {}
+    for match in FIELD_PATTERN.finditer(text.replace("**", "")):
+        label = match.group("label").strip().lower()
+        value = match.group("value").strip()
+        if value and len(label.split()) <= MAX_LABEL_WORDS:
+            fields.setdefault(label, value)
+    return fields
+
+def split_environment(environment: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Split an environment field into the platform and the component it names, for example
+    "Web (Chrome 123.x), Backend v1.0.5" into ("web", "backend") and "Backend v1.0.5, Database"
+    into (None, "backend").
+
+    Args:
+        environment (str): The environment field.
+
+    Returns:
+        tuple[Optional[str], Optional[str]]: The lowercased platform and component, None when absent.
+    """
+    parts = [part.strip() for part in re.sub(r"\([^)]*\)", "", environment).split(",") if part.strip()]
+    if not parts:
+        return None, None
+    platform = parts[0].lower() if parts[0].lower() in PLATFORMS else None
+    components = parts[1:] if platform else parts
+    component = VERSION_PATTERN.sub("", components[0]).strip().lower() if components else ""
+    return platform, component or None
+
+def parse_report(text: str, metadata: dict) -> dict:
+    """
+    Extract the structured fields of one report chunk.
+
+    Args:
+        text (str): The chunk text.
+        metadata (dict): The chunk metadata, as stored in Chroma.
+
+    Returns:
+        dict: report_type ('bug', 'feedback' or 'other'), number, file_name, title, severity, status,
+        component, platform, environment and rating. Missing fields are None.
+    """
+    fields = parse_fields(text)
+
+    def field(column: str) -> Optional[str]:
+        return next((fields[label] for label in FIELD_LABELS[column] if label in fields), None)
+
+    header = REPORT_HEADER_PATTERN.search(metadata.get("Header 1", "")) or REPORT_HEADER_PATTERN.search(text)
+    environment = field("environment")
+    platform, component = split_environment(environment) if environment else (None, None)
+    severity = field("severity")
+    rating = re.match(r"\d+", field("rating") or "")
+
+    return {
+        # Only chunks with a "Bug #N" or "Feedback #N" header are reports, not, say, a file's preamble (whose
+        # source_type comes from its file name)
+        "report_type": header.group(1).lower() if header else "other",
+        "number": int(header.group(2)) if header else None,
+        "file_name": metadata.get("file_name"),
+        "title": field("title"),
+        # "High - blocks the release" is a high severity report
+        "severity": re.split(r"[\s,;(-]", severity.strip().lower())[0] if severity else None,
+        "status": (field("status") or "").lower() or None,
+        "component": (field("component") or "").lower() or component,
+        "platform": platform,
+        "environment": environment,
+        "rating": int(rating.group()) if rating else None,
+    }
+
+def term_pattern(term: str) -> str:
+    """
+    Match a search term as a whole word, or with a plural or verb ending: "upload" matches "uploads" and
+    "uploading", but "app" matches neither "happen" nor "application".
+    """
+    return rf"(?i)\b{re.escape(term)}(?:s|es|ed|ing)?\b"
+
+def _regexp(pattern: str, text: Optional[str]) -> bool:
+    # SQLite's REGEXP operator calls regexp(pattern, text); re caches the compiled patterns
+    return text is not None and re.search(pattern, text) is not None
+
+class ReportTable:
+    """
+    Structured fields of every ingested report chunk (type, number, title, severity, status,
+    component, platform, rating) in a SQLite table next to the Chroma database.
+
+    Counting and filtering questions ("how many medium severity bugs are there?") are answered
+    with one indexed query instead of a top-k similarity search. The table is rebuilt from the
+    Chroma collection after every ingestion and replaced atomically, so readers never see a
+    partial table.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._values = None
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A read-only connection per query: they are cheap, and a rebuilt table is picked up by the next one
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        connection.create_function("regexp", 2, _regexp, deterministic=True)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def version(self) -> int:
+        """Return the REPORT_TABLE_VERSION the table was built with (0 when unknown)."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def values(self) -> dict[str, list[str]]:
+        """Return the distinct values of every filter column, which questions are matched against."""
+        if self._values is None:
+            with self._connect() as connection:
+                self._values = {
+                    column: [row[0] for row in connection.execute(f"SELECT DISTINCT {column} FROM reports WHERE {column} IS NOT NULL")]
+                    for column in FILTER_COLUMNS
+                }
+        return self._values
+
+    @staticmethod
+    def _where(report_type: Optional[str], filters: Optional[dict[str, str]], number: Optional[int], terms: list[str]) -> tuple[str, list]:
+        clauses, params = [], []
+        if report_type:
+            clauses.append("report_type = ?")
+            params.append(report_type)
+        else:
+            clauses.append("report_type != 'other'")
+        for column, value in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown report column: {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        if number is not None:
+            clauses.append("number = ?")
+            params.append(number)
+        for term in terms:
+            clauses.append("text REGEXP ?")
+            params.append(term_pattern(term))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def select(
+        self,
+        report_type: Optional[str] = None,
+        filters: Optional[dict[str, str]] = None,
+        number: Optional[int] = None,
+        terms: Optional[list[str]] = None,
+        limit: Optional[int] = None,
+    ) -> tuple[int, list[dict]]:
+        """
+        Find the reports matching every given condition.
+
+        Args:
+            report_type (Optional[str]): 'bug', 'feedback', or None for both.
+            filters (Optional[dict[str, str]]): Exact (lowercased) values of filter columns.
+            number (Optional[int]): The report number ("Bug #3").
+            terms (Optional[list[str]]): Words that must all occur in the report text, see `term_pattern`.
+            limit (Optional[int]): Maximum number of rows to return; the count covers every match.
+
+        Returns:
+            tuple[int, list[dict]]: The number of matching reports, and the matching rows ordered by
+            report type and number, with their metadata decoded.
+        """
+        where, params = self._where(report_type, filters, number, terms or [])
+        with self._connect() as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM reports{where}", params).fetchone()[0]
+            query = f"SELECT * FROM reports{where} ORDER BY report_type, number, id"
+            if limit is not None:
+                query += f" LIMIT {int(limit)}"
+            rows = [dict(row) for row in connection.execute(query, params)]
+        for row in rows:
+            row["metadata"] = json.loads(row["metadata"])
+        return total, rows
+
+    def unmatched_terms(self, terms: list[str], report_type: Optional[str] = None) -> list[str]:
+        """
+        Find the search terms that no report text contains, see `term_pattern`. A question with such a term
+        ("which bugs make the app freeze?" when no report says "freeze") is worded differently from the
+        reports, so it is better answered by similarity search than by an empty result.
+
+        Args:
+            terms (list[str]): The search terms.
+            report_type (Optional[str]): 'bug', 'feedback', or None for both.
+
+        Returns:
+            list[str]: The terms that occur in no report of the type, in the given order.
+        """
+        unmatched = []
+        with self._connect() as connection:
+            for term in terms:
+                where, params = self._where(report_type, None, None, [term])
+                if connection.execute(f"SELECT 1 FROM reports{where} LIMIT 1", params).fetchone() is None:
+                    unmatched.append(term)
+        return unmatched
+
+    def group_counts(
+        self,
+        column: str,
+        report_type: Optional[str] = None,
+        filters: Optional[dict[str, str]] = None,
+        terms: Optional[list[str]] = None,
+    ) -> list[tuple[Optional[str], int]]:
+        """
+        Count the matching reports per value of a filter column, most frequent first.
+
+        Returns:
+            list[tuple[Optional[str], int]]: (value, count) pairs; None counts the reports without the field.
+        """
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown report column: {column}")
+        where, params = self._where(report_type, filters, None, terms or [])
+        with self._connect() as connection:
+            rows = connection.execute(f"SELECT {column}, COUNT(*) FROM reports{where} GROUP BY {column} ORDER BY COUNT(*) DESC, {column}", params)
+            return [(value, count) for value, count in rows]
+
+    @classmethod
+    def build(cls, path: str | Path, ids: list[str], documents: list[str], metadatas: list[dict]) -> "ReportTable":
+        """
+        Parse every chunk and write a new table, then atomically replace the current one.
+
+        Args:
+            path (str | Path): The table file.
+            ids (list[str]): Chunk IDs.
+            documents (list[str]): Chunk texts.
+            metadatas (list[dict]): Chunk metadata.
+
+        Returns:
+            ReportTable: The new table.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.executescript(SCHEMA)
+            rows = []
+            for chunk_id, text, metadata in zip(ids, documents, metadatas):
+                metadata = metadata or {}
+                report = parse_report(text or "", metadata)
+                rows.append((chunk_id, *report.values(), text or "", json.dumps(metadata)))
+            connection.executemany(f"INSERT OR REPLACE INTO reports VALUES ({','.join('?' * 13)})", rows)
+            connection.execute("INSERT INTO meta VALUES ('version', ?)", (str(REPORT_TABLE_VERSION),))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @classmethod
+    def build_from_collection(cls, path: str | Path, collection, page_size: int = 5_000) -> "ReportTable":
+        """
+        Build the table from every chunk of a Chroma collection, reading it page by page.
+
+        Args:
+            path (str | Path): The table file.
+            collection (chromadb.Collection): The Chroma collection.
+            page_size (int): Chunks read from Chroma per call.
+
+        Returns:
+            ReportTable: The new table.
+        """
+        ids, documents, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        return cls.build(path, ids, documents, metadatas)
+
+def refresh_report_table(directory: str | Path, collection) -> ReportTable:
+    """
+    Rebuild the report table after ingestion changed the collection.
+
+    Args:
+        directory (str | Path): Directory of the table file (the Chroma persist directory).
+        collection (chromadb.Collection): The Chroma collection.
+
+    Returns:
+        ReportTable: The rebuilt table.
+    """
+    return ReportTable.build_from_collection(Path(directory) / REPORT_TABLE_FILE, collection)
+
+def main() -> None:
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Build the structured report table from the Chroma collection.")
+    parser.add_argument("--collection", default=os.getenv("CHROMA_COLLECTION_NAME", "bug_and_feedback_reports"))
+    parser.add_argument("--persist-dir", default=os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.persist_dir).get_collection(args.collection)
+    table = refresh_report_table(args.persist_dir, collection)
+    print(f"Built report table with {len(table)} reports in {table.path}")
+    for column, values in table.values().items():
+        print(f"  {column}: {', '.join(sorted(values)) or '-'}")
+
+if __name__ == "__main__":
+    main()
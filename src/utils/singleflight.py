@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+class _Broadcast:
+    """Events of one in-flight stream, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.events: list = []
+        self.error: BaseException | None = None
+        self.done = False
+        self.task: asyncio.Task | None = None
+        self._new_event = asyncio.Event()
+
+    def publish(self, event) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def close(self, error: BaseException | None = None) -> None:
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        # Wake everyone waiting on the current event, and give later waiters a fresh one
+        self._new_event.set()
+        self._new_event = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator:
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._new_event.wait()
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    `do` shares one awaited result between concurrent callers; `stream` shares one async
+    generator, fanning every event out to all subscribers (late joiners get the events so far
+    replayed first). The shared execution runs in its own task, so a caller that disconnects
+    does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced_calls": 0, "streams": 0, "coalesced_streams": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call or stream with this key is running, so that a caller with the key would join it."""
+        return key in self._calls or key in self._streams
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn()` once for all concurrent callers with the same key.
+
+        Args:
+            key (str): The deduplication key.
+            fn (Callable[[], Awaitable]): Produces the result; only called by the first caller.
+
+        Returns:
+            The shared result. An exception raised by `fn` is raised to every caller.
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self._count("coalesced_calls")
+            return await asyncio.shield(future)
+
+        self._count("calls")
+        future = asyncio.ensure_future(fn())
+        self._calls[key] = future
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Iterate `fn()` once for all concurrent subscribers with the same key.
+
+        Args:
+            key (str): The deduplication key.
+            fn (Callable[[], AsyncIterator]): Produces the events; only called by the first subscriber.
+
+        Yields:
+            Every event of the shared stream, from the first one.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self._count("coalesced_streams")
+        else:
+            self._count("streams")
+            broadcast = self._streams[key] = _Broadcast()
+
+            async def produce():
+                async for event in fn():
+                    broadcast.publish(event)
+
+            def finish(task: asyncio.Task) -> None:
+                # Runs however the producer ends, including a cancellation before it started, so subscribers never wait forever
+                self._streams.pop(key, None)
+                broadcast.close(asyncio.CancelledError() if task.cancelled() else task.exception())
+
+            # Keep a reference so that the producer task is not garbage collected mid-stream
+            broadcast.task = asyncio.ensure_future(produce())
+            broadcast.task.add_done_callback(finish)
+
+        async for event in broadcast.subscribe():
+            yield event
+
+    def stats(self) -> dict:
+        """Return how many executions ran and how many requests joined one that was already in flight."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["in_flight"] = len(self._calls) + len(self._streams)
+        stats["coalesced"] = stats["coalesced_calls"] + stats["coalesced_streams"]
+        return stats
@@ -0,0 +1,73 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+_stage_timings: ContextVar[dict[str, float] | None] = ContextVar("stage_timings", default=None)
+
+@contextmanager
+def collect_stage_timings():
+    """
+    Collect per-stage wall times (in milliseconds) for everything run inside the block.
+
+    Yields:
+        dict[str, float]: Mapping of stage name to accumulated milliseconds, filled in as stages finish.
+    """
+    timings: dict[str, float] = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+def current_stage_timings() -> dict[str, float] | None:
+    """Return the stage timings being collected in the current context, if any."""
+    return _stage_timings.get()
+
+def add_stage_timings(timings: dict[str, float]) -> None:
+    """
+    Add stage timings measured elsewhere (for example, by a shared run another request started) to the
+    stage timings being collected in the current context, if any.
+
+    Args:
+        timings (dict[str, float]): Mapping of stage name to milliseconds.
+    """
+    collected = _stage_timings.get()
+    if collected is not None:
+        for name, elapsed_ms in timings.items():
+            collected[name] = round(collected.get(name, 0.0) + elapsed_ms, 3)
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block and add it to the active stage timings, if any are being collected.
+
+    Args:
+        name (str): The stage name to record the elapsed time under.
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings = _stage_timings.get()
+        if timings is not None:
+            elapsed_ms = (perf_counter() - start) * 1000
+            timings[name] = round(timings.get(name, 0.0) + elapsed_ms, 3)
+
+def timed_node(name: str, node):
+    """
+    Wrap an async graph node so that its wall time is recorded as a stage.
+
+    Args:
+        name (str): The node name used as the stage name.
+        node (Callable): The async node function.
+
+    Returns:
+        Callable: The wrapped async node function.
+    """
+    @functools.wraps(node)
+    async def wrapper(state):
+        with stage(name):
+            return await node(state)
+
+    return wrapper
@@ -1,13 +1,28 @@
+import asyncio
+import functools
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import chromadb
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStoreRetriever as LangChainVectorStoreRetriever
 from dotenv import load_dotenv
+from utils.bm25 import BM25_INDEX_FILE, BM25Index, exact_tokens, reciprocal_rank_fusion, tokenize
+from utils.flat_index import FLAT_INDEX_FILE, FlatIndex
 from utils.llm import EmbeddingModel
+from utils.report_table import REPORT_TABLE_FILE, REPORT_TABLE_VERSION, ReportTable
 
 load_dotenv()
 
+# Target sources chosen by the relevance stage, and the `source_type` partitions each one searches
+TARGET_SOURCE_TYPES = {
+    "bugs": ("bug",),
+    "feedback": ("feedback",),
+    "both": ("bug", "feedback", "other"),
+}
+
 class VectorStore:
     """
     Connects to a local Chroma vector store and returns a retriever.
@@ -17,6 +32,19 @@ class VectorStore:
     def __init__(self):
         # Configuration
         self.collection_name = os.getenv("CHROMA_COLLECTION_NAME", "bug_and_feedback_reports")
+        self.top_k = int(os.getenv("RETRIEVER_TOP_K", 3))
+        # "vector" (similarity search only), "hybrid" (BM25 + vector, fused with RRF) or "lexical" (BM25 only)
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "vector").lower()
+        # Search only the bug report or user feedback partition the question is about
+        self.source_routing = os.getenv("RETRIEVAL_SOURCE_ROUTING", "true").lower() == "true"
+        self.top_k_per_source = int(os.getenv("RETRIEVER_TOP_K_PER_SOURCE", 2))
+        # Adaptive retrieval: with a score threshold, every vector hit that clears it is kept (up to max k) instead
+        # of a fixed top k, and nothing is returned when no chunk is similar enough to be worth grading
+        score_threshold = os.getenv("RETRIEVER_SCORE_THRESHOLD", "").strip()
+        self.score_threshold = float(score_threshold) if score_threshold else None
+        self.max_k = int(os.getenv("RETRIEVER_MAX_K", 8))
+        # "chroma" (Chroma's HNSW index) or "flat" (exact search over a memory-mapped matrix, see utils.flat_index)
+        self.retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
 
         # Optional: directory for persistent Chroma database
         chroma_persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
@@ -28,12 +56,41 @@ class VectorStore:
 
         # Initialize local Chroma client
         self.chroma_client = chromadb.PersistentClient(
-            path="./chroma_db"
+            path=str(self.persist_dir)
         )
 
         # Load or create collection
         self.vector_store = self._load_vector_store()
 
+        # Chroma queries are blocking, so async callers run them on a dedicated bounded pool
+        # instead of the event loop's default executor
+        self.query_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("CHROMA_QUERY_WORKERS", 4)),
+            thread_name_prefix="chroma-query"
+        )
+
+        # BM25 index over the same chunks, loaded on first lexical search
+        self.bm25_path = self.persist_dir / BM25_INDEX_FILE
+        self._bm25_index = None
+        self._bm25_mtime = None
+        self._bm25_lock = threading.Lock()
+        # Searches run on worker threads, so the counter is only updated under its lock
+        self.lexical_fast_path_hits = 0
+        self._stats_lock = threading.Lock()
+
+        # Flat vector index over the same chunks, built by ingestion and loaded on first vector search with the flat backend
+        self.flat_index_path = self.persist_dir / FLAT_INDEX_FILE
+        self._flat_index = None
+        self._flat_index_mtime = None
+        self._flat_index_lock = threading.Lock()
+        self._flat_index_missing_reported = False
+
+        # Structured fields of the same chunks, for counting and filtering questions
+        self.report_table_path = self.persist_dir / REPORT_TABLE_FILE
+        self._report_table = None
+        self._report_table_mtime = None
+        self._report_table_lock = threading.Lock()
+
     def _load_vector_store(self):
         """
         Load (or create) a local Chroma collection.
@@ -55,7 +112,281 @@ class VectorStore:
         """
         Return a retriever configured for similarity search.
         """
-        return self.vector_store.as_retriever(search_type="similarity", search_kwargs={"k": 3})
+        return self.vector_store.as_retriever(search_type="similarity", search_kwargs={"k": self.top_k})
+
+    async def aembed_query(self, query: str) -> list[float]:
+        """
+        Embed a query with the async embedding client.
+        """
+        return await self.embedding_model.aembed_query(query)
+
+    def search_by_vector(self, embedding: list[float], k: int | None = None, where: dict | None = None) -> list[Document]:
+        """
+        Run a similarity search for a query embedding.
+
+        Args:
+            embedding (list[float]): The query embedding.
+            k (int | None): Number of documents to return. Defaults to the configured top k.
+            where (dict | None): Optional Chroma metadata filter restricting the search to a partition.
+
+        Returns:
+            list[Document]: Documents ordered by relevance, with the relevance score (higher is better)
+            in metadata["score"] and the raw distance in metadata["distance"].
+        """
+        flat_index = self.get_flat_index() if self.retrieval_backend == "flat" else None
+        if flat_index is not None:
+            return flat_index.search([embedding], k=k or self.top_k, where=where)[0]
+
+        results = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k or self.top_k, filter=where
+        )
+        relevance_score_fn = self.vector_store._select_relevance_score_fn()
+
+        documents = []
+        for doc, distance in results:
+            doc.metadata["distance"] = distance
+            doc.metadata["score"] = round(relevance_score_fn(distance), 4)
+            documents.append(doc)
+        return documents
+
+    def search_by_vectors(self, embeddings: list[list[float]], k: int | None = None, where: dict | None = None) -> list[list[Document]]:
+        """
+        Run `search_by_vector` for several query embeddings. The flat backend scores all of them
+        with one matrix product; Chroma is queried once per embedding.
+        """
+        flat_index = self.get_flat_index() if self.retrieval_backend == "flat" else None
+        if flat_index is not None:
+            return flat_index.search(embeddings, k=k or self.top_k, where=where)
+        return [self.search_by_vector(embedding, k=k, where=where) for embedding in embeddings]
+
+    def get_flat_index(self) -> FlatIndex | None:
+        """
+        Return the flat vector index, reloading it when ingestion has rebuilt it since. The index is only
+        built by ingestion or `python src/utils/flat_index.py`, never by a serving worker: every worker
+        process would build its own copy. Until it exists, vector searches use Chroma.
+        """
+        mtime = self.flat_index_path.stat().st_mtime_ns if self.flat_index_path.exists() else None
+        if mtime is None:
+            if not self._flat_index_missing_reported:
+                self._flat_index_missing_reported = True
+                print(f"No flat index in {self.persist_dir}, searching Chroma until ingestion or `python src/utils/flat_index.py` builds it")
+            return self._flat_index
+        if self._flat_index is None or mtime != self._flat_index_mtime:
+            with self._flat_index_lock:
+                if self._flat_index is None or mtime != self._flat_index_mtime:
+                    self._flat_index = FlatIndex(self.persist_dir)
+                    self._flat_index_mtime = mtime
+        return self._flat_index
+
+    def get_report_table(self) -> ReportTable:
+        """
+        Return the structured report table, reloading it when ingestion has rebuilt it since, and building it
+        from the Chroma collection when it does not exist yet or was built by an older version.
+        """
+        mtime = self.report_table_path.stat().st_mtime_ns if self.report_table_path.exists() else None
+        if self._report_table is None or mtime != self._report_table_mtime:
+            with self._report_table_lock:
+                if self._report_table is None or mtime != self._report_table_mtime:
+                    report_table = ReportTable(self.report_table_path) if mtime is not None else None
+                    if report_table is None or report_table.version() != REPORT_TABLE_VERSION:
+                        print(f"Building report table from collection '{self.collection_name}'")
+                        report_table = ReportTable.build_from_collection(self.report_table_path, self.vector_store._collection)
+                    self._report_table = report_table
+                    self._report_table_mtime = self.report_table_path.stat().st_mtime_ns
+        return self._report_table
+
+    def get_bm25_index(self) -> BM25Index:
+        """
+        Return the BM25 index, reloading it when ingestion has rewritten the index file since.
+        """
+        mtime = self.bm25_path.stat().st_mtime_ns if self.bm25_path.exists() else None
+        if self._bm25_index is None or mtime != self._bm25_mtime:
+            with self._bm25_lock:
+                if self._bm25_index is None or mtime != self._bm25_mtime:
+                    self._bm25_index = BM25Index.load_or_build(self.bm25_path, self.vector_store._collection)
+                    self._bm25_mtime = self.bm25_path.stat().st_mtime_ns
+        return self._bm25_index
+
+    def lexical_search(self, query: str, k: int | None = None, where: dict | None = None) -> list[Document]:
+        """
+        Rank chunks with BM25 only; no embedding call is made.
+        """
+        return self.get_bm25_index().search(query, k=k or self.top_k, where=where)
+
+    def _lexical_match_is_enough(self, query: str, lexical_documents: list[Document]) -> bool:
+        """
+        Decide whether the lexical results can answer on their own: the query names exact identifiers
+        (report numbers, percentages, error codes) and a lexical hit contains all of them.
+        """
+        identifiers = exact_tokens(query)
+        if not identifiers:
+            return False
+        return any(identifiers <= set(tokenize(doc.page_content)) for doc in lexical_documents)
+
+    def _with_lexical_scores(self, documents: list[Document]) -> list[Document]:
+        # Context building orders chunks by metadata["score"]
+        for doc in documents:
+            doc.metadata["score"] = doc.metadata["bm25_score"]
+        return documents
+
+    def _candidate_count(self, k: int) -> int:
+        # Fusion works best with a deeper candidate pool than the final k
+        return max(k * 2, 10)
+
+    def _depth(self, k: int) -> int:
+        # With a score threshold, the chunks that clear it decide how many are returned, up to max k
+        return max(k, self.max_k) if self.score_threshold is not None else k
+
+    def _above_threshold(self, documents: list[Document]) -> list[Document]:
+        """Drop the vector hits whose relevance score is below the score threshold, if one is set."""
+        if self.score_threshold is None:
+            return documents
+        return [doc for doc in documents if doc.metadata.get("score", 0.0) >= self.score_threshold]
+
+    def _partitions(self, target_source: str, k: int) -> list[tuple[dict | None, int]]:
+        """
+        Map a target source to the metadata filters to search and the number of chunks to take from each.
+
+        A single source is searched with the full top k; "both" takes the per-source top k from every partition.
+        Unknown targets, or routing being disabled, fall back to one unfiltered search.
+        """
+        source_types = TARGET_SOURCE_TYPES.get(target_source)
+        if not self.source_routing or not source_types:
+            return [(None, k)]
+        if len(source_types) == 1:
+            return [({"source_type": source_types[0]}, k)]
+        return [({"source_type": source_type}, self.top_k_per_source) for source_type in source_types]
+
+    @staticmethod
+    def _merge_partitions(results: list[list[Document]], rrf_k: int = 60) -> list[Document]:
+        """
+        Merge the rankings of the source partitions by rank. Their scores are not comparable across partitions
+        (vector relevance, BM25 or RRF, depending on the path each took), so the merged chunks are scored with
+        reciprocal rank fusion, and the score within their partition is kept in metadata["partition_score"].
+        """
+        if len(results) == 1:
+            return results[0]
+        merged = []
+        for documents in results:
+            for rank, doc in enumerate(documents):
+                doc.metadata["partition_score"] = doc.metadata.get("score", 0.0)
+                doc.metadata["score"] = round(1 / (rrf_k + rank + 1), 6)
+                merged.append(doc)
+        # A stable sort keeps the partition order among chunks of equal rank
+        return sorted(merged, key=lambda doc: doc.metadata["score"], reverse=True)
+
+    def _search_partition(self, query: str, k: int, where: dict | None, get_embedding) -> list[Document]:
+        if self.retrieval_mode == "vector":
+            return self._above_threshold(self.search_by_vector(get_embedding(), k=self._depth(k), where=where))
+
+        lexical_documents = self.lexical_search(query, k=self._candidate_count(k), where=where)
+        if self.retrieval_mode == "lexical" or self._lexical_match_is_enough(query, lexical_documents):
+            if self.retrieval_mode != "lexical":
+                with self._stats_lock:
+                    self.lexical_fast_path_hits += 1
+            return self._with_lexical_scores(lexical_documents[:k])
+
+        vector_documents = self._above_threshold(self.search_by_vector(get_embedding(), k=self._candidate_count(k), where=where))
+        return reciprocal_rank_fusion([vector_documents, lexical_documents])[:self._depth(k)]
+
+    def search(self, query: str, k: int | None = None, target_source: str = "both") -> list[Document]:
+        """
+        Retrieve chunks for a query according to the retrieval mode and target source. See `asearch`.
+        """
+        k = k or self.top_k
+        get_embedding = functools.cache(lambda: self.embedding_model.embed_query(query))
+
+        partitions = self._partitions(target_source, k)
+        documents = self._merge_partitions([self._search_partition(query, n, where, get_embedding) for where, n in partitions])
+        if not documents and partitions != [(None, k)]:
+            # Chunks ingested before source routing have no source_type metadata
+            documents = self._search_partition(query, k, None, get_embedding)
+        return documents[:self._depth(k)] if self.score_threshold is not None else documents
+
+    async def asearch_by_vector(self, embedding: list[float], k: int | None = None, where: dict | None = None) -> list[Document]:
+        """
+        Run `search_by_vector` on the Chroma query pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.query_executor,
+            functools.partial(self.search_by_vector, embedding, k=k, where=where)
+        )
+
+    async def _asearch_partition(self, query: str, k: int, where: dict | None, get_embedding) -> list[Document]:
+        if self.retrieval_mode == "vector":
+            return self._above_threshold(await self.asearch_by_vector(await get_embedding(), k=self._depth(k), where=where))
+
+        loop = asyncio.get_running_loop()
+        lexical_documents = await loop.run_in_executor(
+            self.query_executor,
+            functools.partial(self.lexical_search, query, k=self._candidate_count(k), where=where)
+        )
+        if self.retrieval_mode == "lexical" or self._lexical_match_is_enough(query, lexical_documents):
+            if self.retrieval_mode != "lexical":
+                with self._stats_lock:
+                    self.lexical_fast_path_hits += 1
+            return self._with_lexical_scores(lexical_documents[:k])
+
+        vector_documents = self._above_threshold(await self.asearch_by_vector(await get_embedding(), k=self._candidate_count(k), where=where))
+        return reciprocal_rank_fusion([vector_documents, lexical_documents])[:self._depth(k)]
+
+    async def asearch(
+        self,
+        query: str,
+        k: int | None = None,
+        embedding: list[float] | None = None,
+        target_source: str = "both",
+    ) -> list[Document]:
+        """
+        Retrieve chunks for a query without blocking the event loop.
+
+        In "vector" mode this is a similarity search. In "hybrid" mode BM25 and vector results are fused with
+        reciprocal rank fusion, except when the query names exact identifiers that a BM25 hit contains, in which
+        case the lexical results are returned without calling the embedding API. "lexical" mode uses BM25 only.
+
+        With source routing, a question about bugs or about feedback only searches that partition of the
+        collection (a `source_type` metadata filter), and "both" searches each partition for its own top k.
+
+        With RETRIEVER_SCORE_THRESHOLD set, vector hits below the threshold are dropped and every hit above
+        it is kept, up to RETRIEVER_MAX_K chunks, so the result can also be empty.
+
+        Args:
+            query (str): The query text.
+            k (int | None): Number of chunks to return. Defaults to the configured top k.
+            embedding (list[float] | None): The query embedding, if already computed.
+            target_source (str): 'bugs', 'feedback' or 'both'.
+
+        Returns:
+            list[Document]: The retrieved chunks, best first.
+        """
+        k = k or self.top_k
+        embedding_task = None
+
+        async def get_embedding() -> list[float]:
+            # Embed at most once, and only if a partition actually needs the vector search
+            nonlocal embedding_task
+            if embedding is not None:
+                return embedding
+            if embedding_task is None:
+                embedding_task = asyncio.ensure_future(self.aembed_query(query))
+            return await embedding_task
+
+        partitions = self._partitions(target_source, k)
+        results = await asyncio.gather(*(self._asearch_partition(query, n, where, get_embedding) for where, n in partitions))
+        documents = self._merge_partitions(results)
+        if not documents and partitions != [(None, k)]:
+            # Chunks ingested before source routing have no source_type metadata
+            documents = await self._asearch_partition(query, k, None, get_embedding)
+        return documents[:self._depth(k)] if self.score_threshold is not None else documents
+
+    def get_ingest_generation(self) -> int | None:
+        """
+        Return a marker that changes whenever ingestion changes the collection, without reading the collection:
+        the modification time of the report table, which every ingestion that adds, updates or deletes chunks
+        rebuilds. None before the first ingestion.
+        """
+        return self.report_table_path.stat().st_mtime_ns if self.report_table_path.exists() else None
 
 if __name__ == "__main__":
     try:
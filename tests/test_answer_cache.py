@@ -0,0 +1,108 @@
+import types
+import pytest
+from utils import answer_cache as answer_cache_module
+from utils.answer_cache import AnswerCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable replacement for the cache's monotonic clock."""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(answer_cache_module, "time", types.SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+def test_exact_match_uses_the_normalized_question():
+    cache = AnswerCache()
+    cache.put("How many bugs are open?", None, "Three.")
+    assert cache.get_exact("  how many bugs   are open ") == "Three."
+    assert cache.get_exact("How many bugs are closed?") is None
+    assert cache.stats()["exact_hits"] == 1
+
+def test_semantic_match_respects_the_threshold():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("Which uploads fail?", [1.0, 0.0, 0.0], "Bug #1.")
+    assert cache.get_semantic([0.99, 0.05, 0.0]) == "Bug #1."
+    assert cache.get_semantic([0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert stats["semantic_hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("first", None, "1")
+    cache.put("second", None, "2")
+    assert cache.get_exact("first") == "1"
+    cache.put("third", None, "3")
+    assert cache.get_exact("second") is None
+    assert cache.get_exact("first") == "1"
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("question", [1.0, 0.0], "answer")
+    clock.value += 30
+    assert cache.get_exact("question") == "answer"
+    clock.value += 31
+    assert cache.get_exact("question") is None
+    assert cache.get_semantic([1.0, 0.0]) is None
+    assert cache.stats()["expirations"] == 1
+
+def test_changed_fingerprint_drops_every_entry(clock):
+    fingerprint = types.SimpleNamespace(value=1)
+    cache = AnswerCache(fingerprint_fn=lambda: fingerprint.value, fingerprint_interval_seconds=30)
+    cache.refresh_fingerprint()
+    cache.put("question", [1.0, 0.0], "answer")
+
+    fingerprint.value = 2
+    cache.refresh_fingerprint()
+    # Checked at most once per interval
+    assert cache.get_exact("question") == "answer"
+
+    clock.value += 31
+    cache.refresh_fingerprint()
+    assert cache.get_exact("question") is None
+    assert cache.get_semantic([1.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_lookup_that_misses_both_levels_counts_one_miss():
+    cache = AnswerCache()
+    assert cache.get_exact("question") is None
+    assert cache.get_semantic([1.0, 0.0]) is None
+    cache.put("question", [1.0, 0.0], "answer")
+    assert cache.get_exact("question") == "answer"
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 0, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_expired_best_match_falls_back_to_a_live_neighbour(clock):
+    cache = AnswerCache(ttl_seconds=60, similarity_threshold=0.9)
+    cache.put("older question", [1.0, 0.0, 0.0], "older answer")
+    clock.value += 30
+    cache.put("newer question", [0.95, 0.31, 0.0], "newer answer")
+    clock.value += 31
+    assert cache.get_semantic([1.0, 0.0, 0.0]) == "newer answer"
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"], stats["expirations"]) == (1, 0, 1)
+
+def test_similarity_rows_follow_replacements_and_evictions():
+    cache = AnswerCache(max_entries=2, similarity_threshold=0.99)
+    cache.put("first", [1.0, 0.0, 0.0], "1")
+    cache.put("second", [0.0, 1.0, 0.0], "2")
+    cache.put("first", [0.0, 0.0, 1.0], "1b")
+    assert cache.get_semantic([1.0, 0.0, 0.0]) is None
+    assert cache.get_semantic([0.0, 0.0, 1.0]) == "1b"
+    # Evicts "second", whose row the new entry reuses
+    cache.put("third", [1.0, 1.0, 0.0], "3")
+    assert cache.get_semantic([0.0, 1.0, 0.0]) is None
+    assert cache.get_semantic([1.0, 1.0, 0.0]) == "3"
+    assert len(cache._matrix_keys) == 2
+    # An answer stored without an embedding is only found by its question
+    cache.put("third", None, "3b")
+    assert cache.get_semantic([1.0, 1.0, 0.0]) is None
+    assert cache.get_exact("third") == "3b"
+
+def test_embeddings_of_another_size_reset_the_matrix():
+    cache = AnswerCache()
+    cache.put("first", [1.0, 0.0], "1")
+    cache.put("second", [0.0, 1.0, 0.0], "2")
+    assert cache.get_semantic([1.0, 0.0]) is None
+    assert cache.get_semantic([0.0, 1.0, 0.0]) == "2"
@@ -0,0 +1,54 @@
+from langchain_core.documents import Document
+from utils.bm25 import BM25Index, exact_tokens, reciprocal_rank_fusion, tokenize
+
+def test_tokenize_keeps_identifiers_and_drops_stopwords():
+    tokens = tokenize("Bug #12: upload stuck at 99% with ERR-504 on v2.3")
+    assert "#12" in tokens and "12" in tokens
+    assert "99%" in tokens
+    assert "err-504" in tokens
+    assert "v2.3" in tokens
+    assert "at" not in tokens and "on" not in tokens
+
+def test_exact_tokens_only_returns_identifiers():
+    assert exact_tokens("why is bug #12 stuck at 99% with err-504?") == {"#12", "12", "99%", "err-504"}
+
+def build_index() -> BM25Index:
+    index = BM25Index()
+    index.add("upload", "Document upload is stuck at 99% on slow connections", {"source_type": "bug"})
+    index.add("login", "Login fails with error err-504 after a password reset", {"source_type": "bug"})
+    index.add("praise", "I love how fast the upload page is", {"source_type": "feedback"})
+    return index
+
+def test_search_ranks_matching_chunks_first():
+    results = build_index().search("upload stuck", k=2)
+    assert [doc.id for doc in results] == ["upload", "praise"]
+    assert results[0].metadata["bm25_score"] > results[1].metadata["bm25_score"]
+
+def test_search_applies_metadata_filter():
+    results = build_index().search("upload", k=3, where={"source_type": "feedback"})
+    assert [doc.id for doc in results] == ["praise"]
+
+def test_replacing_and_removing_chunks_updates_postings():
+    index = build_index()
+    index.add("upload", "Search results are empty", {"source_type": "bug"})
+    assert [doc.id for doc in index.search("stuck")] == []
+    index.remove("login")
+    assert len(index) == 2
+    assert index.search("err-504") == []
+    assert "err-504" not in index.postings
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "bm25_index.json"
+    build_index().save(path)
+    loaded = BM25Index.load(path)
+    assert len(loaded) == 3
+    assert [doc.id for doc in loaded.search("err-504")] == ["login"]
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    vector = [Document(id="a", page_content="a", metadata={"score": 0.9}), Document(id="b", page_content="b", metadata={"score": 0.8})]
+    lexical = [Document(id="b", page_content="b", metadata={"bm25_score": 3.0}), Document(id="c", page_content="c", metadata={"bm25_score": 1.0})]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    assert [doc.id for doc in fused] == ["b", "a", "c"]
+    assert fused[0].metadata["vector_score"] == 0.8
+    assert fused[0].metadata["bm25_score"] == 3.0
+    assert fused[0].metadata["score"] == fused[0].metadata["rrf_score"]
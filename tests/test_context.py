@@ -0,0 +1,85 @@
+import html
+import re
+import zipfile
+from pathlib import Path
+from langchain_core.documents import Document
+from utils.context import assemble_context, count_tokens, dedupe_documents, extract_relevant_sections, format_document, split_sections
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+REPORT = """# Bug #1
+## Title
+Document upload stuck at 99%
+## Steps to reproduce
+Upload a large PDF over a slow connection.
+## Environment
+Web, Chrome 120
+## Severity
+Medium
+"""
+
+def doc(text: str, score: float, doc_id: str | None = None, **metadata) -> Document:
+    return Document(id=doc_id, page_content=text, metadata={"file_name": "ai_test_bug_report.docx", "score": score, **metadata})
+
+def test_relevant_sections_and_identifying_sections_are_kept():
+    extracted = extract_relevant_sections(REPORT, "Which browser does the upload problem happen in? Chrome?")
+    assert "# Bug #1" in extracted
+    assert "Chrome 120" in extracted
+    assert "Document upload stuck" in extracted
+    assert "Medium" in extracted
+
+def test_chunk_is_kept_whole_when_no_section_matches():
+    assert extract_relevant_sections(REPORT, "What about payments?") == REPORT
+    assert extract_relevant_sections("A chunk without sections", "upload") == "A chunk without sections"
+
+def test_dedupe_keeps_the_best_scored_copy_in_order():
+    low = doc("Same   text", 0.2, "a")
+    other = doc("Other text", 0.5, "b")
+    high = doc("same text", 0.9, "c")
+    assert dedupe_documents([low, other, high]) == [other, high]
+
+def test_format_document_names_the_source_and_report_type():
+    assert format_document(doc("Text", 1.0, source_type="bug")) == "[Source: ai_test_bug_report.docx, bug report]\nText"
+
+def test_assemble_context_orders_by_score_and_respects_the_budget():
+    first = doc("Upload stuck at 99% for large files.", 0.9, "a")
+    second = doc("Login fails after a password reset.", 0.5, "b")
+    budget = count_tokens(format_document(first)) + 1
+    context, stats = assemble_context([second, first, first], max_tokens=budget)
+    assert context == format_document(first)
+    assert stats["chunks"] == 3
+    assert stats["chunks_used"] == 1
+    assert stats["context_tokens"] <= budget
+    assert stats["tokens_saved"] == stats["original_tokens"] - stats["context_tokens"]
+
+def test_assemble_context_compresses_chunks_for_the_question():
+    context, stats = assemble_context([doc(REPORT, 0.9, "a")], question="Does it happen in Chrome?")
+    assert "Chrome 120" in context
+    assert "Upload a large PDF" not in context
+    assert stats["tokens_saved"] > 0
+
+def report_chunk(path: Path, header: str) -> str:
+    """
+    One report of a DOCX file in data/, as ingestion chunks it: paragraphs as plain lines (the files use no
+    heading styles or bold labels once converted) under a "# Bug #N" header.
+    """
+    document = zipfile.ZipFile(path).read("word/document.xml").decode("utf-8")
+    paragraphs = [
+        html.unescape("".join(re.findall(r"<w:t(?: [^>]*)?>([^<]*)</w:t>", paragraph)))
+        for paragraph in re.findall(r"<w:p[ >].*?</w:p>", document, re.DOTALL)
+    ]
+    markdown = re.sub(r"(?<!#)(\bBug\s+#\d+)", r"# \1", "\n\n".join(paragraphs))
+    return next(chunk for chunk in re.split(r"(?=^# )", markdown, flags=re.MULTILINE) if chunk.startswith(f"# {header}\n"))
+
+def test_sections_of_a_report_from_the_real_data():
+    chunk = report_chunk(DATA_DIR / "ai_test_bug_report.docx", "Bug #1")
+    preamble, sections = split_sections(chunk)
+    assert preamble.strip() == "# Bug #1"
+    assert [label for label, _ in sections] == ["title", "description", "steps to reproduce", "environment", "severity", "proposed fix"]
+
+    extracted = extract_relevant_sections(chunk, "Which browser and backend version does it happen on?")
+    assert "Environment: Web (Chrome 123.x), Backend v1.0.5" in extracted
+    assert "Title: Document Upload Stuck at 99%" in extracted
+    assert "Severity: Medium" in extracted
+    assert "Steps to Reproduce" not in extracted
+    assert "Proposed Fix" not in extracted
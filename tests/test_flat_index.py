@@ -0,0 +1,68 @@
+import time
+import numpy as np
+import pytest
+from utils import flat_index
+from utils.flat_index import FLAT_INDEX_FILE, FlatIndex
+
+IDS = ["upload", "login", "praise"]
+EMBEDDINGS = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.8, 0.0, 0.6]]
+TEXTS = ["Upload stuck at 99%", "Login fails", "Uploads are fast"]
+METADATAS = [
+    {"source_type": "bug", "file_name": "bugs.docx", "chunk": 1},
+    {"source_type": "bug", "file_name": "bugs.docx", "chunk": 2},
+    {"source_type": "feedback", "file_name": "feedback.docx", "chunk": 1},
+]
+
+def generations(directory) -> set[str]:
+    return {path.name.split(".")[1] for path in directory.glob("flat_index.*.*") if not path.name.startswith(FLAT_INDEX_FILE)}
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_search_returns_the_nearest_chunks(tmp_path, dtype):
+    index = FlatIndex.build(tmp_path, IDS, EMBEDDINGS, TEXTS, METADATAS, dtype=dtype)
+    assert len(index) == 3 and index.dimensions == 3
+
+    [results] = index.search([1.0, 0.0, 0.0], k=2)
+    assert [doc.id for doc in results] == ["upload", "praise"]
+    assert results[0].page_content == "Upload stuck at 99%"
+    assert results[0].metadata["score"] == pytest.approx(1.0, abs=0.01)
+    assert results[1].metadata["score"] == pytest.approx(0.8, abs=0.01)
+    assert results[1].metadata["distance"] == pytest.approx(0.2, abs=0.01)
+
+def test_batched_queries_and_filters(tmp_path):
+    index = FlatIndex.build(tmp_path, IDS, EMBEDDINGS, TEXTS, METADATAS)
+    results = index.search(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]), k=1, where={"source_type": "feedback"})
+    assert [[doc.id for doc in documents] for documents in results] == [["praise"], ["praise"]]
+    # Filters on metadata that is not a stored column decode the rows
+    [results] = index.search([1.0, 0.0, 0.0], k=3, where={"chunk": 2})
+    assert [doc.id for doc in results] == ["login"]
+    [results] = index.search([1.0, 0.0, 0.0], k=3, where={"source_type": "unknown"})
+    assert results == []
+
+def test_rebuild_switches_readers_to_the_new_generation(tmp_path):
+    first = FlatIndex.build(tmp_path, IDS, EMBEDDINGS, TEXTS, METADATAS)
+    second = FlatIndex.build(tmp_path, IDS[:1], EMBEDDINGS[:1], TEXTS[:1], METADATAS[:1])
+    assert second.meta["generation"] != first.meta["generation"]
+    assert len(FlatIndex(tmp_path)) == 1
+    # The old reader keeps its mapped files
+    assert [doc.id for doc in first.search([0.0, 1.0, 0.0], k=1)[0]] == ["login"]
+    assert generations(tmp_path) == {second.meta["generation"]}
+
+def test_build_keeps_the_files_of_a_newer_build_in_progress(tmp_path):
+    newer = f"{time.time_ns() + 10**12:016x}abcdef"
+    (tmp_path / f"flat_index.{newer}.vectors.npy").write_bytes(b"partial")
+    index = FlatIndex.build(tmp_path, IDS, EMBEDDINGS, TEXTS, METADATAS)
+    assert generations(tmp_path) == {index.meta["generation"], newer}
+
+def test_older_build_does_not_replace_a_newer_index(tmp_path, monkeypatch):
+    newer = FlatIndex.build(tmp_path, IDS, EMBEDDINGS, TEXTS, METADATAS)
+    started = time.time_ns() - 10**12
+    monkeypatch.setattr(flat_index.time, "time_ns", lambda: started)
+    index = FlatIndex.build(tmp_path, IDS[:1], EMBEDDINGS[:1], TEXTS[:1], METADATAS[:1])
+    assert index.meta["generation"] == newer.meta["generation"]
+    assert len(index) == 3
+    assert generations(tmp_path) == {newer.meta["generation"]}
+
+def test_empty_index(tmp_path):
+    index = FlatIndex.build(tmp_path, [], [], [], [])
+    assert len(index) == 0
+    assert index.search([[1.0, 0.0, 0.0]], k=3) == [[]]
@@ -0,0 +1,56 @@
+import json
+from utils.ingest_manifest import MANIFEST_VERSION, IngestManifest
+
+def test_unchanged_file_is_recognized_from_stat(tmp_path):
+    doc = tmp_path / "report.docx"
+    doc.write_bytes(b"first version")
+    manifest = IngestManifest(tmp_path / "manifest.json", "reports")
+    assert not manifest.is_unchanged(doc)
+
+    manifest.record(doc, "hash-1", ["chunk-1", "chunk-2"])
+    assert manifest.is_unchanged(doc)
+    assert manifest.has_hash(doc, "hash-1")
+
+    doc.write_bytes(b"second, longer version")
+    assert not manifest.is_unchanged(doc)
+
+def test_record_without_chunk_ids_keeps_the_previous_ones(tmp_path):
+    doc = tmp_path / "report.docx"
+    doc.write_bytes(b"content")
+    manifest = IngestManifest(tmp_path / "manifest.json", "reports")
+    manifest.record(doc, "hash-1", ["chunk-1"])
+    manifest.record(doc, "hash-1")
+    assert manifest.forget("report.docx") == ["chunk-1"]
+    assert manifest.forget("report.docx") == []
+
+def test_save_and_reload(tmp_path):
+    doc = tmp_path / "report.docx"
+    doc.write_bytes(b"content")
+    path = tmp_path / "manifest.json"
+    manifest = IngestManifest(path, "reports")
+    manifest.record(doc, "hash-1", ["chunk-1"])
+    manifest.save()
+
+    reloaded = IngestManifest(path, "reports")
+    assert reloaded.is_unchanged(doc)
+    assert reloaded.missing_files([]) == ["report.docx"]
+    assert reloaded.missing_files([doc]) == []
+
+def test_manifest_of_another_collection_or_version_is_ignored(tmp_path):
+    doc = tmp_path / "report.docx"
+    doc.write_bytes(b"content")
+    path = tmp_path / "manifest.json"
+    manifest = IngestManifest(path, "reports")
+    manifest.record(doc, "hash-1", ["chunk-1"])
+    manifest.save()
+
+    assert IngestManifest(path, "other").files == {}
+    data = json.loads(path.read_text())
+    data["version"] = MANIFEST_VERSION - 1
+    path.write_text(json.dumps(data))
+    assert IngestManifest(path, "reports").files == {}
+
+def test_unreadable_manifest_is_ignored(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+    assert IngestManifest(path, "reports").files == {}
@@ -0,0 +1,167 @@
+import asyncio
+import types
+import pytest
+from utils import llm_scheduler
+from utils.llm_scheduler import DeadlineExceeded, LLMOverloaded, LLMScheduler, TokenBucket, parse_limits
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable replacement for the token bucket's monotonic clock."""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(llm_scheduler, "monotonic", lambda: now.value)
+    return now
+
+def test_parse_limits():
+    assert parse_limits("gpt-4o=16, gpt-4o-mini=32,") == {"gpt-4o": 16, "gpt-4o-mini": 32}
+    assert parse_limits(None) == {}
+
+def test_token_bucket_serves_within_capacity_without_waiting(clock):
+    bucket = TokenBucket(tokens_per_minute=600)
+    assert asyncio.run(bucket.acquire(400)) == 0.0
+    assert bucket.tokens == 200
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(tokens_per_minute=600)
+    asyncio.run(bucket.acquire(600))
+    clock.value += 30
+    assert asyncio.run(bucket.acquire(300)) == 0.0
+    # Never holds more than a minute of tokens
+    clock.value += 600
+    bucket._refill()
+    assert bucket.tokens == 600
+
+def test_token_bucket_reserves_tokens_and_reports_the_wait(clock, monkeypatch):
+    slept = []
+
+    async def sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "sleep", sleep)
+    bucket = TokenBucket(tokens_per_minute=600)
+    asyncio.run(bucket.acquire(600))
+    # 10 tokens a second, so 100 tokens take 10 seconds and the next 100 another 10
+    assert asyncio.run(bucket.acquire(100)) == pytest.approx(10.0)
+    assert asyncio.run(bucket.acquire(100)) == pytest.approx(20.0)
+    assert slept == [pytest.approx(10.0), pytest.approx(20.0)]
+
+def test_cancelled_wait_gives_its_tokens_back(clock):
+    async def scenario():
+        bucket = TokenBucket(tokens_per_minute=600)
+        await bucket.acquire(600)
+        waiter = asyncio.ensure_future(bucket.acquire(100))
+        await asyncio.sleep(0)
+        assert bucket.tokens == -100
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return bucket.tokens
+
+    assert asyncio.run(scenario()) == 0
+
+def test_scheduler_limits_concurrency_per_model():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=8, model_concurrency={"small": 2})
+        running = peak = 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "ok"
+
+        results = await asyncio.gather(*(scheduler.run("grader", "small", call) for _ in range(6)))
+        return results, peak, scheduler.stats()
+
+    results, peak, stats = asyncio.run(scenario())
+    assert results == ["ok"] * 6
+    assert peak == 2
+    assert stats["calls"] == 6 and stats["queued"] == 0 and stats["in_flight"] == 0
+
+def test_scheduler_rejects_when_the_queue_is_full():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "ok"
+
+        running = asyncio.ensure_future(scheduler.run("grader", "model", call))
+        queued = asyncio.ensure_future(scheduler.run("grader", "model", call))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMOverloaded):
+            await scheduler.run("grader", "model", call)
+        release.set()
+        return await asyncio.gather(running, queued), scheduler.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == ["ok", "ok"]
+    assert stats["rejected"] == 1
+
+def test_scheduler_enforces_the_node_deadline(monkeypatch):
+    monkeypatch.setenv("RAG_GRADER_TIMEOUT_SECONDS", "0.01")
+
+    async def scenario():
+        scheduler = LLMScheduler()
+
+        async def call():
+            await asyncio.sleep(1)
+
+        with pytest.raises(DeadlineExceeded):
+            await scheduler.run("grader", "model", call)
+        return scheduler.stats()
+
+    assert asyncio.run(scenario())["deadline_exceeded"] == 1
+
+def test_hedged_call_returns_the_first_answer(monkeypatch):
+    monkeypatch.setenv("RAG_GRADER_HEDGE_AFTER_SECONDS", "0.01")
+
+    async def scenario():
+        scheduler = LLMScheduler()
+        attempts = 0
+
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            # The first attempt is a slow outlier
+            await asyncio.sleep(1 if attempts == 1 else 0.01)
+            return attempts
+
+        return await scheduler.run("grader", "model", call), scheduler.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == 2
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+def test_hedge_waits_for_a_free_model_slot(monkeypatch):
+    monkeypatch.setenv("RAG_GRADER_HEDGE_AFTER_SECONDS", "0.01")
+
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=8, model_concurrency={"small": 1})
+        attempts = 0
+
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.05)
+            return attempts
+
+        return await scheduler.run("grader", "small", call), scheduler.stats()
+
+    result, stats = asyncio.run(scenario())
+    # The model's only slot is taken, so no second attempt is queued behind the first
+    assert result == 1
+    assert stats["hedged"] == 0
+
+def test_queue_check_sees_refilled_tokens(clock):
+    async def scenario():
+        scheduler = LLMScheduler(tokens_per_minute={"model": 600}, max_queue=0)
+        await scheduler.run("grader", "model", lambda: asyncio.sleep(0), estimated_tokens=600)
+        clock.value += 60
+        # The bucket has refilled, although nothing has read it since it was emptied
+        await scheduler.run("grader", "model", lambda: asyncio.sleep(0), estimated_tokens=600)
+        return scheduler.stats()
+
+    assert asyncio.run(scenario())["rejected"] == 0
@@ -0,0 +1,76 @@
+import pytest
+from graphs.report_query import ReportQuery, ReportQueryRouter, render_answer, stem
+
+VALUES = {
+    "severity": ["medium", "low", "high"],
+    "status": ["open", "resolved"],
+    "component": ["upload", "search engine", "search"],
+    "platform": ["web", "mobile"],
+}
+
+@pytest.fixture
+def router() -> ReportQueryRouter:
+    return ReportQueryRouter()
+
+def test_stem_strips_plural_and_verb_endings():
+    assert stem("uploads") == "upload"
+    assert stem("uploading") == "upload"
+    assert stem("crashed") == "crash"
+    assert stem("bus") == "bus"
+
+def test_count_with_a_filter_and_a_term(router):
+    query = router.parse("How many medium severity bugs mention uploads?", VALUES)
+    assert query == ReportQuery(intent="count", report_type="bug", filters={"severity": "medium"}, terms=["upload"])
+
+def test_severity_without_any_report_yet(router):
+    query = router.parse("how many critical bugs are there?", VALUES)
+    assert query.intent == "count"
+    assert query.filters == {"severity": "critical"}
+
+def test_ambiguous_severity_word_is_not_a_filter(router):
+    query = router.parse("how many bugs mention high latency?", VALUES)
+    assert query.filters == {}
+    assert query.terms == ["high", "latency"]
+
+def test_group_list_and_number_questions(router):
+    assert router.parse("bugs by severity", VALUES).group_by == "severity"
+    assert router.parse("bugs by severity", VALUES).intent == "group"
+    listing = router.parse("list the bugs on mobile", VALUES)
+    assert (listing.intent, listing.filters) == ("list", {"platform": "mobile"})
+    lookup = router.parse("what is bug #3 about?", VALUES)
+    assert (lookup.intent, lookup.report_type, lookup.number) == ("prose", "bug", 3)
+
+def test_longest_column_value_wins(router):
+    query = router.parse("how many bugs are in the search engine?", VALUES)
+    assert query.filters == {"component": "search engine"}
+
+def test_other_questions_go_to_retrieval(router):
+    assert router.parse("why is the app slow?", VALUES) is None
+    assert router.parse("What do users think of the new design?", VALUES) is None
+
+def test_stats_estimate_the_llm_calls_saved(router):
+    router.record("answered")
+    router.record("generated")
+    router.record("fallbacks")
+    assert router.stats() == {"answered": 1, "generated": 1, "fallbacks": 1, "llm_calls_saved": 5}
+
+def row(number: int, title: str, severity: str) -> dict:
+    return {
+        "report_type": "bug", "number": number, "title": title, "text": title, "severity": severity,
+        "status": None, "component": None, "platform": None, "file_name": "ai_test_bug_report.docx",
+    }
+
+def test_render_count_and_list_answers():
+    query = ReportQuery(intent="count", report_type="bug", filters={"severity": "medium"}, terms=["upload"])
+    answer = render_answer(query, 2, [row(1, "Upload stuck", "medium")])
+    assert answer.startswith('There are 2 bug reports with medium severity mentioning "upload":')
+    assert "- Bug #1: Upload stuck (severity: medium)" in answer
+    assert "- ... and 1 more" in answer
+    assert answer.endswith("Source: ai_test_bug_report.docx")
+
+def test_render_empty_and_group_answers():
+    query = ReportQuery(intent="count", report_type="bug", filters={"severity": "critical"})
+    assert render_answer(query, 0, []) == "There are no bug reports with critical severity in the ingested reports."
+    group = ReportQuery(intent="group", report_type="bug", group_by="severity")
+    answer = render_answer(group, 3, [], [("medium", 2), (None, 1)])
+    assert answer == "There are 3 bug reports, by severity:\n- medium: 2\n- not specified: 1"
@@ -0,0 +1,108 @@
+import asyncio
+import types
+import pytest
+from graphs import graphs
+from utils.report_table import ReportTable, parse_report, split_environment
+
+# Chunks as docling converts the report DOCX files: plain "Label: value" paragraphs
+CHUNKS = {
+    "bug-1": """# Bug #1
+
+Title: Document Upload Stuck at 99%
+
+Description: When uploading large PDF documents, the progress bar gets stuck at 99%.
+
+Environment: Web (Chrome 123.x), Backend v1.0.5
+
+Severity: Critical
+""",
+    "bug-2": """# Bug #2
+
+Title: Incorrect Search Results for Acronyms
+
+Description: Searching for acronyms returns irrelevant documents.
+
+Environment: All platforms, Search Engine v2.1
+
+Severity: Low
+""",
+    "bug-3": """# Bug #3
+
+Title: Push Notifications Not Received
+
+Description: Uploads finish, but the notification never arrives.
+
+Environment: Mobile (iOS 17), Push Notification Service
+
+Severity: Critical
+""",
+    "feedback-1": "# Feedback #1: I tried uploading a report about a bug and it failed twice.",
+}
+
+@pytest.fixture
+def table(tmp_path) -> ReportTable:
+    metadatas = [{"file_name": "ai_test_bug_report.docx" if chunk_id.startswith("bug") else "ai_test_user_feedback.docx"} for chunk_id in CHUNKS]
+    return ReportTable.build(tmp_path / "reports.sqlite3", list(CHUNKS), list(CHUNKS.values()), metadatas)
+
+def test_parse_report_reads_the_field_lines():
+    report = parse_report(CHUNKS["bug-1"], {"file_name": "ai_test_bug_report.docx"})
+    assert (report["report_type"], report["number"]) == ("bug", 1)
+    assert report["title"] == "Document Upload Stuck at 99%"
+    assert report["severity"] == "critical"
+    assert (report["platform"], report["component"]) == ("web", "backend")
+    assert parse_report(CHUNKS["feedback-1"], {})["report_type"] == "feedback"
+
+def test_split_environment_only_accepts_known_platforms():
+    assert split_environment("Web (Chrome 123.x), Backend v1.0.5") == ("web", "backend")
+    assert split_environment("Backend v1.0.5, Database") == (None, "backend")
+    assert split_environment("All platforms, Search Engine v2.1") == ("all platforms", "search engine")
+
+def test_select_filters_and_matches_terms_as_words(table):
+    total, rows = table.select("bug", {"severity": "critical"}, terms=["upload"])
+    assert total == 2
+    assert [row["number"] for row in rows] == [1, 3]
+    assert table.select("bug", terms=["acronym"])[0] == 1
+    # "app" is a word of its own, not part of "happen" or "application"
+    assert table.select(terms=["app"])[0] == 0
+
+def test_group_counts_and_values(table):
+    assert table.group_counts("severity", "bug") == [("critical", 2), ("low", 1)]
+    assert set(table.values()["platform"]) == {"web", "all platforms", "mobile"}
+
+def test_unmatched_terms(table):
+    assert table.unmatched_terms(["upload", "freeze", "acronym"], "bug") == ["freeze"]
+    assert table.unmatched_terms(["twice"], "bug") == ["twice"]
+    assert table.unmatched_terms(["twice"]) == []
+
+@pytest.fixture
+def report_graph(table, monkeypatch):
+    """The graph's report table nodes, reading the test table."""
+    vector_store = types.SimpleNamespace(get_report_table=lambda: table)
+    monkeypatch.setattr(graphs, "get_vector_store", lambda: vector_store)
+    monkeypatch.setattr(graphs, "STRUCTURED_QUERIES", True)
+
+    async def ask(question: str) -> dict:
+        state = {"question": question, **await graphs.route_question({"question": question})}
+        if state["report_query"] is None:
+            return state
+        return {**state, **await graphs.query_report_table(state)}
+
+    return lambda question: asyncio.run(ask(question))
+
+def test_count_with_a_term_is_answered_from_the_table(report_graph):
+    state = report_graph("How many critical bugs affect uploads?")
+    assert state["report_query_route"] == "answered"
+    assert state["generation"].content.startswith('There are 2 bug reports with critical severity mentioning "upload":')
+
+def test_count_without_matches_is_answered_zero(report_graph):
+    state = report_graph("How many medium severity bugs mention uploads?")
+    assert state["report_query_route"] == "answered"
+    assert state["generation"].content == 'There are no bug reports with medium severity mentioning "upload" in the ingested reports.'
+
+def test_term_no_report_contains_goes_to_retrieval(report_graph):
+    assert report_graph("Which bugs cause the app to freeze?")["report_query"] is None
+
+def test_list_without_matches_goes_to_retrieval(report_graph):
+    state = report_graph("List the low severity bugs about uploads")
+    assert state["report_query"].intent == "list"
+    assert state["report_query_route"] == "fallback"
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from utils.singleflight import SingleFlight
+
+def test_do_runs_concurrent_calls_with_the_same_key_once():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def answer():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("question", answer) for _ in range(5)), flight.do("other", answer))
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == 2
+    assert results == ["answer"] * 6
+    assert stats["coalesced_calls"] == 4
+    assert stats["in_flight"] == 0
+
+def test_do_raises_the_error_to_every_caller():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(flight.do("question", fail), flight.do("question", fail), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_stream_replays_events_to_late_subscribers():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def events():
+            yield 1
+            started.set()
+            await asyncio.sleep(0.01)
+            yield 2
+
+        async def collect():
+            return [event async for event in flight.stream("question", events)]
+
+        first = asyncio.ensure_future(collect())
+        await started.wait()
+        second = await collect()
+        return await first, second, flight.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert first == second == [1, 2]
+    assert stats["streams"] == 1 and stats["coalesced_streams"] == 1
+
+def test_stream_error_reaches_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def events():
+            yield 1
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def collect():
+            return [event async for event in flight.stream("question", events)]
+
+        return await asyncio.gather(collect(), collect(), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_subscriber_that_leaves_does_not_cancel_the_stream():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def events():
+            for event in range(3):
+                await asyncio.sleep(0.01)
+                yield event
+
+        async def first_event():
+            async for event in flight.stream("question", events):
+                return event
+
+        async def collect():
+            return [event async for event in flight.stream("question", events)]
+
+        return await asyncio.gather(first_event(), collect())
+
+    first, everything = asyncio.run(scenario())
+    assert first == 0
+    assert everything == [0, 1, 2]
+
+def test_cancelled_stream_releases_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def events():
+            yield 1
+            started.set()
+            await asyncio.sleep(10)
+            yield 2
+
+        async def collect():
+            return [event async for event in flight.stream("question", events)]
+
+        subscribers = [asyncio.ensure_future(collect()) for _ in range(3)]
+        await started.wait()
+        assert flight.in_flight("question")
+        flight._streams["question"].task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*subscribers, return_exceptions=True), timeout=1)
+        return results, flight.in_flight("question")
+
+    results, in_flight = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert not in_flight
+
+def test_stream_cancelled_before_it_started_releases_its_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def events():
+            yield 1
+
+        stream = flight.stream("question", events)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        flight._streams["question"].task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(first, timeout=1)
+
+    asyncio.run(scenario())